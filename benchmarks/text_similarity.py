@@ -0,0 +1,72 @@
+"""Compares finding similar melding texts with the MinHash LSH index against comparing all pairs of texts.
+
+Run with `python -m benchmarks.text_similarity [number of texts]`.
+"""
+
+import random
+import sys
+import time
+
+from meldingen_core.similarity import MinHashLSHIndex, jaccard, shingles
+
+SUBJECTS = ["lantaarnpaal", "grofvuil", "container", "stoeptegel", "fietswrak", "boomtak", "verkeerslicht", "graffiti"]
+STREETS = ["Amstel", "Kalverstraat", "Damrak", "Rokin", "Spui", "Singel", "Herengracht", "Prinsengracht"]
+WORDS = ["kapot", "al", "dagen", "gevaarlijk", "graag", "snel", "oplossen", "naast", "huis", "weer", "niet", "erg"]
+THRESHOLD = 0.5
+
+
+def generate_texts(count: int, seed: int = 1) -> list[str]:
+    """Generates texts of which about a third are edited copies of an earlier text."""
+    generator = random.Random(seed)
+    texts: list[str] = []
+    for _ in range(count):
+        if texts and generator.random() < 0.3:
+            words = generator.choice(texts).split()
+            words[generator.randrange(len(words))] = generator.choice(WORDS)
+            texts.append(" ".join(words))
+        else:
+            words = [generator.choice(SUBJECTS), "bij", generator.choice(STREETS), str(generator.randint(1, 300))]
+            words += generator.choices(WORDS, k=12)
+            texts.append(" ".join(words))
+
+    return texts
+
+
+def naive(texts: list[str]) -> set[tuple[int, int]]:
+    text_shingles = [shingles(text) for text in texts]
+
+    return {
+        (i, j) for j in range(len(texts)) for i in range(j) if jaccard(text_shingles[i], text_shingles[j]) >= THRESHOLD
+    }
+
+
+def lsh(texts: list[str]) -> set[tuple[int, int]]:
+    index: MinHashLSHIndex[int] = MinHashLSHIndex()
+    pairs: set[tuple[int, int]] = set()
+    for j, text in enumerate(texts):
+        pairs.update((i, j) for i, _ in index.query(text, THRESHOLD))
+        index.add(j, text)
+
+    return pairs
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    texts = generate_texts(count)
+
+    start = time.perf_counter()
+    expected = naive(texts)
+    naive_duration = time.perf_counter() - start
+
+    start = time.perf_counter()
+    found = lsh(texts)
+    lsh_duration = time.perf_counter() - start
+
+    recall = len(found & expected) / len(expected) if expected else 1.0
+    print(f"texts: {count}, similar pairs: {len(expected)}")
+    print(f"naive: {naive_duration:.2f}s")
+    print(f"lsh:   {lsh_duration:.2f}s, recall {recall:.3f}, {len(found - expected)} pairs below the threshold")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,7 @@ from typing import Generic, Sequence, TypeVar
 from meldingen_core.exceptions import NotFoundException
 from meldingen_core.managers import RelationshipManager
 from meldingen_core.models import Asset, Melding
-from meldingen_core.repositories import BaseMeldingRepository
+from meldingen_core.repositories import BaseMeldingRepository, Include
 from meldingen_core.token import TokenVerifier
 
 A = TypeVar("A", bound=Asset)
@@ -11,6 +11,7 @@ M = TypeVar("M", bound=Melding)
 
 
 class MelderListAssetsAction(Generic[A, M]):
+    include: Include = ("assets",)
     _verify_token: TokenVerifier[M]
     _relationship_manager: RelationshipManager[M, A]
 
@@ -19,12 +20,13 @@ class MelderListAssetsAction(Generic[A, M]):
         self._relationship_manager = relationship_manager
 
     async def __call__(self, melding_id: int, token: str) -> Sequence[A]:
-        melding = await self._verify_token(melding_id, token)
+        melding = await self._verify_token(melding_id, token, self.include)
 
         return await self._relationship_manager.get_related(melding)
 
 
 class ListAssetsAction(Generic[A, M]):
+    include: Include = ("assets",)
     _melding_repository: BaseMeldingRepository[M]
     _relationship_manager: RelationshipManager[M, A]
 
@@ -35,7 +37,7 @@ class ListAssetsAction(Generic[A, M]):
         self._relationship_manager = relationship_manager
 
     async def __call__(self, melding_id: int) -> Sequence[A]:
-        melding = await self._melding_repository.retrieve(melding_id)
+        melding = await self._melding_repository.retrieve(melding_id, self.include)
 
         if melding is None:
             raise NotFoundException("Melding not found")
@@ -9,7 +9,7 @@ from meldingen_core.actions.base import (
 from meldingen_core.exceptions import NotFoundException
 from meldingen_core.models import AssetType
 from meldingen_core.repositories import BaseRepository
-from meldingen_core.wfs import BaseWfsProviderValidator
+from meldingen_core.wfs import AssetTypeToWfsProviderConverter, BaseWfsProviderValidator
 
 AT = TypeVar("AT", bound=AssetType)
 
@@ -34,16 +34,28 @@ class AssetTypeListAction(BaseListAction[AT]): ...
 
 class AssetTypeUpdateAction(BaseCRUDAction[AT]):
     _wfs_provider_validator: BaseWfsProviderValidator
-
-    def __init__(self, repository: BaseRepository[AT], wfs_provider_validator: BaseWfsProviderValidator) -> None:
+    _wfs_provider_converter: AssetTypeToWfsProviderConverter | None
+
+    def __init__(
+        self,
+        repository: BaseRepository[AT],
+        wfs_provider_validator: BaseWfsProviderValidator,
+        wfs_provider_converter: AssetTypeToWfsProviderConverter | None = None,
+    ) -> None:
         super().__init__(repository)
         self._wfs_provider_validator = wfs_provider_validator
+        self._wfs_provider_converter = wfs_provider_converter
 
     async def __call__(self, pk: int, values: dict[str, Any]) -> AT:
         obj = await self._repository.retrieve(pk=pk)
         if obj is None:
             raise NotFoundException()
 
+        # The cached provider is keyed on the current class name and arguments, so it has to be invalidated
+        # before they are overwritten
+        if self._wfs_provider_converter is not None and ("class_name" in values or "arguments" in values):
+            self._wfs_provider_converter.invalidate(obj)
+
         for key, value in values.items():
             setattr(obj, key, value)
 
@@ -1,21 +1,33 @@
-from collections.abc import Sequence
+import hashlib
+import logging
+from collections.abc import Callable, Sequence
+from contextlib import AbstractAsyncContextManager
+from dataclasses import dataclass
+from datetime import datetime, timezone
 from enum import StrEnum
-from typing import AsyncIterator, Generic, TypeVar
+from typing import AsyncIterator, Generic, TypeAlias, TypeVar
 
 from plugfs import filesystem
 from plugfs.filesystem import Filesystem
 
-from meldingen_core.exceptions import NotFoundException
+from meldingen_core.exceptions import InvalidInputException, NotFoundException
 from meldingen_core.factories import BaseAttachmentFactory
-from meldingen_core.image import BaseIngestor
-from meldingen_core.models import Attachment, Melding
-from meldingen_core.repositories import BaseAttachmentRepository
+from meldingen_core.image import AttachmentIngestionPipeline, BaseIngestor
+from meldingen_core.jobs import BaseJob, BaseJobQueue
+from meldingen_core.malware import MalwareFoundException
+from meldingen_core.models import Attachment, AttachmentStatus, Melding
+from meldingen_core.repositories import BaseAttachmentRepository, Include
 from meldingen_core.token import TokenVerifier
 from meldingen_core.validators import BaseMediaTypeIntegrityValidator, BaseMediaTypeValidator
 
+log = logging.getLogger(__name__)
+
 A = TypeVar("A", bound=Attachment)
 M = TypeVar("M", bound=Melding)
 
+# Opens a repository that is not bound to a request, for example with its own database session, for background jobs
+AttachmentRepositoryFactory: TypeAlias = Callable[[], AbstractAsyncContextManager[BaseAttachmentRepository[A]]]
+
 
 class UploadAttachmentAction(Generic[A, M]):
     _create_attachment: BaseAttachmentFactory[A, M]
@@ -43,6 +55,16 @@ class UploadAttachmentAction(Generic[A, M]):
         self._validate_media_type_integrity = media_type_integrity_validator
         self._ingest = ingestor
 
+    async def _create(
+        self, melding_id: int, token: str, original_filename: str, media_type: str, data_header: bytes
+    ) -> A:
+        melding = await self._verify_token(melding_id, token)
+
+        self._validate_media_type(media_type)
+        self._validate_media_type_integrity(media_type, data_header)
+
+        return self._create_attachment(original_filename, melding, media_type)
+
     async def __call__(
         self,
         melding_id: int,
@@ -52,16 +74,132 @@ class UploadAttachmentAction(Generic[A, M]):
         data_header: bytes,
         data: AsyncIterator[bytes],
     ) -> A:
-        melding = await self._verify_token(melding_id, token)
+        attachment = await self._create(melding_id, token, original_filename, media_type, data_header)
 
-        self._validate_media_type(media_type)
-        self._validate_media_type_integrity(media_type, data_header)
+        await self._ingest(attachment, data)
 
-        attachment = self._create_attachment(original_filename, melding, media_type)
+        await self._attachment_repository.save(attachment)
 
-        await self._ingest(attachment, data)
+        return attachment
+
+
+class ProcessAttachmentJob(Generic[A], BaseJob):
+    """Job that processes an attachment that was uploaded with `DeferredUploadAttachmentAction`.
+    The job outlives the request, so it only holds the id of the attachment and retrieves it with a repository of its
+    own on every attempt."""
+
+    _pipeline: AttachmentIngestionPipeline[A]
+    _attachment_repository_factory: AttachmentRepositoryFactory[A]
+    _attachment_id: int
+
+    def __init__(
+        self,
+        pipeline: AttachmentIngestionPipeline[A],
+        attachment_repository_factory: AttachmentRepositoryFactory[A],
+        attachment_id: int,
+    ):
+        self._pipeline = pipeline
+        self._attachment_repository_factory = attachment_repository_factory
+        self._attachment_id = attachment_id
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(attachment_id={self._attachment_id})"
+
+    async def __call__(self) -> None:
+        async with self._attachment_repository_factory() as attachment_repository:
+            attachment = await attachment_repository.retrieve(self._attachment_id)
+            if attachment is None:
+                log.info("Attachment %d was deleted before it was processed", self._attachment_id)
+                return
+
+            try:
+                await self._pipeline.process(attachment)
+            except MalwareFoundException:
+                log.warning("Malware found in attachment %d", self._attachment_id)
+                await self._pipeline.delete(attachment)
+                attachment.status = AttachmentStatus.FAILED
+            else:
+                attachment.status = AttachmentStatus.READY
+
+            try:
+                await attachment_repository.save(attachment)
+            except BaseException:
+                # The next attempt starts from the saved attachment and generates the files again
+                await self._pipeline.delete_derived(attachment)
+                raise
+
+    async def failed(self, exception: Exception) -> None:
+        """Deletes the files of the attachment, which cannot be downloaded, and marks it as failed."""
+        async with self._attachment_repository_factory() as attachment_repository:
+            attachment = await attachment_repository.retrieve(self._attachment_id)
+            if attachment is None:
+                return
+
+            await self._pipeline.delete(attachment)
+            await self._pipeline.delete_derived(attachment)
+            attachment.status = AttachmentStatus.FAILED
+            await attachment_repository.save(attachment)
+
+
+class DeferredUploadAttachmentAction(Generic[A, M], UploadAttachmentAction[A, M]):
+    """
+    Upload action that only writes the original and saves the attachment with the processing status before it
+    responds. Scanning, optimizing and generating the thumbnail is done by a job on the job queue, which sets the
+    status to ready or failed. The job retrieves the attachment with a repository from `attachment_repository_factory`,
+    because the repository of the request cannot be used after the response.
+    """
+
+    _pipeline: AttachmentIngestionPipeline[A]
+    _job_queue: BaseJobQueue
+    _attachment_repository_factory: AttachmentRepositoryFactory[A]
+
+    def __init__(
+        self,
+        attachment_factory: BaseAttachmentFactory[A, M],
+        attachment_repository: BaseAttachmentRepository[A],
+        token_verifier: TokenVerifier[M],
+        media_type_validator: BaseMediaTypeValidator,
+        media_type_integrity_validator: BaseMediaTypeIntegrityValidator,
+        pipeline: AttachmentIngestionPipeline[A],
+        job_queue: BaseJobQueue,
+        attachment_repository_factory: AttachmentRepositoryFactory[A],
+    ):
+        super().__init__(
+            attachment_factory,
+            attachment_repository,
+            token_verifier,
+            media_type_validator,
+            media_type_integrity_validator,
+            pipeline,
+        )
+        self._pipeline = pipeline
+        self._job_queue = job_queue
+        self._attachment_repository_factory = attachment_repository_factory
+
+    async def __call__(
+        self,
+        melding_id: int,
+        token: str,
+        original_filename: str,
+        media_type: str,
+        data_header: bytes,
+        data: AsyncIterator[bytes],
+    ) -> A:
+        attachment = await self._create(melding_id, token, original_filename, media_type, data_header)
+
+        if not await self._pipeline.write(attachment, data):
+            await self._attachment_repository.save(attachment)
+            return attachment
 
+        attachment.status = AttachmentStatus.PROCESSING
         await self._attachment_repository.save(attachment)
+        await self._job_queue.enqueue(
+            ProcessAttachmentJob(
+                self._pipeline,
+                self._attachment_repository_factory,
+                self._attachment_repository.get_pk(attachment),
+            )
+        )
 
         return attachment
 
@@ -72,7 +210,97 @@ class AttachmentTypes(StrEnum):
     THUMBNAIL = "thumbnail"
 
 
+class RangeNotSatisfiableException(InvalidInputException): ...
+
+
+@dataclass(frozen=True)
+class ByteRange:
+    """Range of `length` bytes starting at `offset`, without a length the range runs to the end of the file."""
+
+    offset: int
+    length: int | None = None
+
+    def __post_init__(self) -> None:
+        if self.offset < 0:
+            raise InvalidInputException("Range offset must not be negative")
+        if self.length is not None and self.length < 1:
+            raise InvalidInputException("Range length must be positive")
+
+    def resolve(self, size: int) -> "ByteRange":
+        """Returns the range within a file of the size, with its length."""
+        if self.offset >= size:
+            raise RangeNotSatisfiableException(f"Range starts after the end of the file of {size} bytes")
+
+        length = size - self.offset if self.length is None else min(self.length, size - self.offset)
+        return ByteRange(self.offset, length)
+
+
+@dataclass(frozen=True)
+class AttachmentDownload:
+    """
+    A downloaded file with the validators clients use for conditional requests. When the client already has the
+    current file, `data` is None and the file was not opened. With a byte range only that range is returned in `data`
+    and `byte_range` holds the resolved range, `size` is always the size of the whole file.
+    """
+
+    media_type: str
+    etag: str
+    last_modified: datetime | None
+    data: AsyncIterator[bytes] | None = None
+    size: int | None = None
+    byte_range: ByteRange | None = None
+
+    @property
+    def not_modified(self) -> bool:
+        return self.data is None
+
+
+def get_etag(file_path: str, digest: str | None = None) -> str:
+    """Strong entity tag of a file. Files are never changed after they are written, so the tag is derived from the
+    path, or from the digest of the content when it is known."""
+    if digest is not None:
+        return f'"{digest}"'
+
+    return f'"{hashlib.sha256(file_path.encode()).hexdigest()[:32]}"'
+
+
+def _to_http_date(value: datetime) -> datetime:
+    """HTTP dates are in UTC with a resolution of one second, naive datetimes are taken to be in UTC."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+
+    return value.astimezone(timezone.utc).replace(microsecond=0)
+
+
+def is_not_modified(
+    etag: str, last_modified: datetime | None, if_none_match: str | None, if_modified_since: datetime | None
+) -> bool:
+    """Evaluates the If-None-Match and If-Modified-Since conditions, the date is ignored when tags are given."""
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+    if last_modified is None or if_modified_since is None:
+        return False
+
+    return _to_http_date(last_modified) <= _to_http_date(if_modified_since)
+
+
+async def _slice(data: AsyncIterator[bytes], byte_range: ByteRange) -> AsyncIterator[bytes]:
+    """Yields the bytes in the range, the bytes before the range are read and skipped."""
+    position = 0
+    offset = byte_range.offset
+    end = offset + byte_range.length if byte_range.length is not None else None
+    async for chunk in data:
+        chunk_end = position + len(chunk)
+        if chunk_end > offset:
+            yield chunk[max(offset - position, 0) : end - position if end is not None else None]
+        position = chunk_end
+        if end is not None and position >= end:
+            return
+
+
 class BaseDownloadAttachmentAction(Generic[A]):
+    include: Include = ("melding",)
     _attachment_repository: BaseAttachmentRepository[A]
     _filesystem: Filesystem
 
@@ -85,29 +313,35 @@ class BaseDownloadAttachmentAction(Generic[A]):
         self._filesystem = filesystem
 
     async def _get_attachment(self, attachment_id: int) -> A:
-        attachment = await self._attachment_repository.retrieve(attachment_id)
+        attachment = await self._attachment_repository.retrieve(attachment_id, self.include)
         if attachment is None:
             raise NotFoundException("Attachment not found")
 
         return attachment
 
-    async def _get_data(self, attachment: A, _type: AttachmentTypes) -> tuple[AsyncIterator[bytes], str]:
-        file_path = attachment.file_path
-        media_type = attachment.original_media_type
+    def _get_file(self, attachment: A, _type: AttachmentTypes) -> tuple[str, str]:
+        """Returns the path and media type of the requested file of the attachment."""
+        # Files are not served before they are scanned
+        if attachment.status != AttachmentStatus.READY:
+            raise NotFoundException(f"Attachment is {attachment.status}")
+
         if _type == AttachmentTypes.OPTIMIZED:
             if attachment.optimized_path is None:
                 raise NotFoundException("Optimized file not found")
             if attachment.optimized_media_type is None:
                 raise NotFoundException("Optimized media type not found")
-            file_path = attachment.optimized_path
-            media_type = attachment.optimized_media_type
-        elif _type == AttachmentTypes.THUMBNAIL:
+            return attachment.optimized_path, attachment.optimized_media_type
+        if _type == AttachmentTypes.THUMBNAIL:
             if attachment.thumbnail_path is None:
                 raise NotFoundException("Thumbnail file not found")
             if attachment.thumbnail_media_type is None:
                 raise NotFoundException("Thumbnail media type not found")
-            file_path = attachment.thumbnail_path
-            media_type = attachment.thumbnail_media_type
+            return attachment.thumbnail_path, attachment.thumbnail_media_type
+
+        return attachment.file_path, attachment.original_media_type
+
+    async def _get_data(self, attachment: A, _type: AttachmentTypes) -> tuple[AsyncIterator[bytes], str]:
+        file_path, media_type = self._get_file(attachment, _type)
 
         try:
             file = await self._filesystem.get_file(file_path)
@@ -115,6 +349,34 @@ class BaseDownloadAttachmentAction(Generic[A]):
         except filesystem.NotFoundException as exception:
             raise NotFoundException("File not found") from exception
 
+    async def _download(
+        self,
+        attachment: A,
+        _type: AttachmentTypes,
+        byte_range: ByteRange | None,
+        if_none_match: str | None,
+        if_modified_since: datetime | None,
+    ) -> AttachmentDownload:
+        file_path, media_type = self._get_file(attachment, _type)
+        etag = get_etag(file_path, attachment.digest if _type == AttachmentTypes.ORIGINAL else None)
+        last_modified = _to_http_date(attachment.created_at) if attachment.created_at is not None else None
+
+        if is_not_modified(etag, last_modified, if_none_match, if_modified_since):
+            return AttachmentDownload(media_type, etag, last_modified)
+
+        try:
+            file = await self._filesystem.get_file(file_path)
+            size = await file.size
+            data = await file.get_iterator()
+        except filesystem.NotFoundException as exception:
+            raise NotFoundException("File not found") from exception
+
+        if byte_range is None:
+            return AttachmentDownload(media_type, etag, last_modified, data, size)
+
+        byte_range = byte_range.resolve(size)
+        return AttachmentDownload(media_type, etag, last_modified, _slice(data, byte_range), size, byte_range)
+
 
 class MelderDownloadAttachmentAction(Generic[A, M], BaseDownloadAttachmentAction[A]):
     _verify_token: TokenVerifier[M]
@@ -128,22 +390,55 @@ class MelderDownloadAttachmentAction(Generic[A, M], BaseDownloadAttachmentAction
         self._verify_token = token_verifier
         super().__init__(attachment_repository, filesystem)
 
-    async def __call__(
-        self, melding_id: int, attachment_id: int, token: str, _type: AttachmentTypes
-    ) -> tuple[AsyncIterator[bytes], str]:
+    async def _get_melder_attachment(self, melding_id: int, attachment_id: int, token: str) -> A:
         melding = await self._verify_token(melding_id, token)
 
         attachment = await self._get_attachment(attachment_id)
         if attachment.melding != melding:
             raise NotFoundException(f"Melding with id {melding_id} does not have attachment with id {attachment_id}")
 
+        return attachment
+
+    async def __call__(
+        self, melding_id: int, attachment_id: int, token: str, _type: AttachmentTypes
+    ) -> tuple[AsyncIterator[bytes], str]:
+        attachment = await self._get_melder_attachment(melding_id, attachment_id, token)
+
         return await self._get_data(attachment, _type)
 
+    async def download(
+        self,
+        melding_id: int,
+        attachment_id: int,
+        token: str,
+        _type: AttachmentTypes,
+        byte_range: ByteRange | None = None,
+        if_none_match: str | None = None,
+        if_modified_since: datetime | None = None,
+    ) -> AttachmentDownload:
+        """Downloads the file with its validators, see `AttachmentDownload`."""
+        attachment = await self._get_melder_attachment(melding_id, attachment_id, token)
+
+        return await self._download(attachment, _type, byte_range, if_none_match, if_modified_since)
+
 
 class DownloadAttachmentAction(BaseDownloadAttachmentAction[A]):
     async def __call__(self, attachment_id: int, _type: AttachmentTypes) -> tuple[AsyncIterator[bytes], str]:
         return await self._get_data(await self._get_attachment(attachment_id), _type)
 
+    async def download(
+        self,
+        attachment_id: int,
+        _type: AttachmentTypes,
+        byte_range: ByteRange | None = None,
+        if_none_match: str | None = None,
+        if_modified_since: datetime | None = None,
+    ) -> AttachmentDownload:
+        """Downloads the file with its validators, see `AttachmentDownload`."""
+        attachment = await self._get_attachment(attachment_id)
+
+        return await self._download(attachment, _type, byte_range, if_none_match, if_modified_since)
+
 
 class ListAttachmentsAction(Generic[A]):
     _attachment_repository: BaseAttachmentRepository[A]
@@ -170,6 +465,15 @@ class MelderListAttachmentsAction(Generic[A, M]):
 
 
 class DeleteAttachmentAction(Generic[A, M]):
+    """
+    Deletes an attachment and its files. Files that are shared with other attachments, see
+    `ContentAddressedIngestionPipeline`, are deleted together with the last attachment that uses them.
+    The reference count is not locked. When an upload starts sharing the files of an attachment that is deleted at the
+    same moment, the files can be deleted while the new attachment still points to them. Downloading it then fails
+    with a not found error and the melder can upload the file again, which is preferred over locking on every upload.
+    """
+
+    include: Include = ("melding",)
     _verify_token: TokenVerifier[M]
     _attachment_repository: BaseAttachmentRepository[A]
     _filesystem: Filesystem
@@ -187,16 +491,39 @@ class DeleteAttachmentAction(Generic[A, M]):
     async def __call__(self, melding_id: int, attachment_id: int, token: str) -> None:
         melding = await self._verify_token(melding_id, token)
 
-        attachment = await self._attachment_repository.retrieve(attachment_id)
+        attachment = await self._attachment_repository.retrieve(attachment_id, self.include)
         if attachment is None:
             raise NotFoundException("Attachment not found")
 
         if attachment.melding != melding:
             raise NotFoundException(f"Melding with id {melding_id} does not have attachment with id {attachment_id}")
 
-        try:
-            await self._filesystem.delete(attachment.file_path)
-        except filesystem.NotFoundException as exception:
-            raise NotFoundException("File not found") from exception
-
+        # Attachments with the same content share their files, which are deleted with the last attachment
+        if await self._attachment_repository.count_by_file_path(attachment.file_path) > 1:
+            await self._attachment_repository.delete(attachment_id)
+
+            # The other attachments may have been deleted at the same time, each of them counting the others as users
+            # of the files. Counting again after deleting makes sure the files are not left behind.
+            if await self._attachment_repository.count_by_file_path(attachment.file_path) == 0:
+                await self._delete_files(attachment.file_path, attachment.optimized_path, attachment.thumbnail_path)
+            return
+
+        if attachment.status != AttachmentStatus.READY:
+            # Processing deletes the files of attachments that failed, and may still be writing them
+            await self._delete_files(attachment.file_path)
+        else:
+            try:
+                await self._filesystem.delete(attachment.file_path)
+            except filesystem.NotFoundException as exception:
+                raise NotFoundException("File not found") from exception
+
+        await self._delete_files(attachment.optimized_path, attachment.thumbnail_path)
         await self._attachment_repository.delete(attachment_id)
+
+    async def _delete_files(self, *paths: str | None) -> None:
+        for path in paths:
+            if path is not None:
+                try:
+                    await self._filesystem.delete(path)
+                except filesystem.NotFoundException:
+                    pass
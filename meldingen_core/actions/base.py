@@ -4,7 +4,8 @@ from typing import Any, Generic, TypeVar
 from meldingen_core import SortingDirection
 from meldingen_core.exceptions import NotFoundException
 from meldingen_core.filters import NameListFilters
-from meldingen_core.repositories import BaseRepository
+from meldingen_core.pagination import Page, create_page, parse_cursor, validate_limit
+from meldingen_core.repositories import BaseRepository, Include
 
 T = TypeVar("T")
 
@@ -22,8 +23,8 @@ class BaseCreateAction(BaseCRUDAction[T]):
 
 
 class BaseRetrieveAction(BaseCRUDAction[T]):
-    async def __call__(self, pk: int) -> T | None:
-        return await self._repository.retrieve(pk=pk)
+    async def __call__(self, pk: int, include: Include | None = None) -> T | None:
+        return await self._repository.retrieve(pk=pk, include=include)
 
 
 class BaseListAction(BaseCRUDAction[T]):
@@ -35,6 +36,7 @@ class BaseListAction(BaseCRUDAction[T]):
         sort_attribute_name: str | None = None,
         sort_direction: SortingDirection | None = None,
         filters: NameListFilters | None = None,
+        include: Include | None = None,
     ) -> Sequence[T]:
         return await self._repository.list(
             limit=limit,
@@ -42,6 +44,36 @@ class BaseListAction(BaseCRUDAction[T]):
             sort_attribute_name=sort_attribute_name,
             sort_direction=sort_direction,
             filters=filters,
+            include=include,
+        )
+
+
+class BaseKeysetListAction(BaseCRUDAction[T]):
+    """Lists objects page by page using an opaque cursor instead of an offset, so deep pages are as fast as the first.
+    The returned page contains the cursor for the next page, which is None on the last page."""
+
+    async def __call__(
+        self,
+        *,
+        limit: int = 50,
+        cursor: str | None = None,
+        sort_attribute_name: str | None = None,
+        sort_direction: SortingDirection | None = None,
+        filters: NameListFilters | None = None,
+        include: Include | None = None,
+    ) -> Page[T]:
+        validate_limit(limit)
+        items = await self._repository.list(
+            limit=limit + 1,
+            sort_attribute_name=sort_attribute_name,
+            sort_direction=sort_direction,
+            filters=filters,
+            cursor=parse_cursor(cursor, sort_attribute_name, sort_direction),
+            include=include,
+        )
+
+        return create_page(
+            items, limit, lambda obj: self._repository.get_cursor(obj, sort_attribute_name), sort_direction
         )
 
 
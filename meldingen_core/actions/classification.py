@@ -7,6 +7,7 @@ from meldingen_core.actions.base import (
     BaseRetrieveAction,
     BaseUpdateAction,
 )
+from meldingen_core.classification import ClassificationCatalog, ClassificationNameCache
 from meldingen_core.exceptions import NotFoundException
 from meldingen_core.models import AssetType, Classification
 from meldingen_core.repositories import BaseAssetTypeRepository, BaseRepository
@@ -15,13 +16,30 @@ T = TypeVar("T", bound=Classification)
 AT = TypeVar("AT", bound=AssetType)
 
 
+def _invalidate_caches(catalog: ClassificationCatalog[T] | None, name_cache: ClassificationNameCache[T] | None) -> None:
+    if catalog is not None:
+        catalog.invalidate()
+    if name_cache is not None:
+        name_cache.clear()
+
+
 class ClassificationCreateAction(Generic[T, AT], BaseCreateAction[T]):
     _asset_type_repository: BaseAssetTypeRepository[AT]
+    _catalog: ClassificationCatalog[T] | None
+    _name_cache: ClassificationNameCache[T] | None
 
     @override
-    def __init__(self, repository: BaseRepository[T], asset_type_repository: BaseAssetTypeRepository[AT]) -> None:
+    def __init__(
+        self,
+        repository: BaseRepository[T],
+        asset_type_repository: BaseAssetTypeRepository[AT],
+        catalog: ClassificationCatalog[T] | None = None,
+        name_cache: ClassificationNameCache[T] | None = None,
+    ) -> None:
         super().__init__(repository)
         self._asset_type_repository = asset_type_repository
+        self._catalog = catalog
+        self._name_cache = name_cache
 
     @override
     async def __call__(self, obj: T, asset_type_id: int | None = None) -> None:
@@ -34,6 +52,8 @@ class ClassificationCreateAction(Generic[T, AT], BaseCreateAction[T]):
 
         await super().__call__(obj)
 
+        _invalidate_caches(self._catalog, self._name_cache)
+
 
 class ClassificationListAction(BaseListAction[T]): ...
 
@@ -43,11 +63,21 @@ class ClassificationRetrieveAction(BaseRetrieveAction[T]): ...
 
 class ClassificationUpdateAction(Generic[T, AT], BaseUpdateAction[T]):
     _asset_type_repository: BaseAssetTypeRepository[AT]
+    _catalog: ClassificationCatalog[T] | None
+    _name_cache: ClassificationNameCache[T] | None
 
     @override
-    def __init__(self, repository: BaseRepository[T], asset_type_repository: BaseAssetTypeRepository[AT]) -> None:
+    def __init__(
+        self,
+        repository: BaseRepository[T],
+        asset_type_repository: BaseAssetTypeRepository[AT],
+        catalog: ClassificationCatalog[T] | None = None,
+        name_cache: ClassificationNameCache[T] | None = None,
+    ) -> None:
         super().__init__(repository)
         self._asset_type_repository = asset_type_repository
+        self._catalog = catalog
+        self._name_cache = name_cache
 
     @override
     async def __call__(self, pk: int, values: dict[str, Any]) -> T:
@@ -59,7 +89,30 @@ class ClassificationUpdateAction(Generic[T, AT], BaseUpdateAction[T]):
 
             values["asset_type"] = asset_type
 
-        return await super().__call__(pk, values)
+        classification = await super().__call__(pk, values)
+
+        _invalidate_caches(self._catalog, self._name_cache)
+
+        return classification
+
 
+class ClassificationDeleteAction(BaseDeleteAction[T]):
+    _catalog: ClassificationCatalog[T] | None
+    _name_cache: ClassificationNameCache[T] | None
+
+    @override
+    def __init__(
+        self,
+        repository: BaseRepository[T],
+        catalog: ClassificationCatalog[T] | None = None,
+        name_cache: ClassificationNameCache[T] | None = None,
+    ) -> None:
+        super().__init__(repository)
+        self._catalog = catalog
+        self._name_cache = name_cache
+
+    @override
+    async def __call__(self, pk: int) -> None:
+        await super().__call__(pk)
 
-class ClassificationDeleteAction(BaseDeleteAction[T]): ...
+        _invalidate_caches(self._catalog, self._name_cache)
@@ -1,12 +1,16 @@
+import asyncio
 import logging
 from abc import ABCMeta, abstractmethod
-from collections.abc import Sequence
+from collections.abc import AsyncIterator, Sequence
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Any, Generic, TypeVar, cast, override
+from typing import Any, Generic, TypeVar, cast, get_args, override
 
 from meldingen_core import SortingDirection
 from meldingen_core.actions.base import BaseCreateAction, BaseCRUDAction, BaseRetrieveAction, BaseUpdateAction
+from meldingen_core.aggregates import MeldingAggregateCache, MeldingAggregates, MeldingFacet
 from meldingen_core.classification import ClassificationNotFoundException, Classifier
+from meldingen_core.duplicates import DuplicateCandidate, DuplicateCandidateIndex
 from meldingen_core.exceptions import InvalidInputException, LimitReachedException, NotFoundException
 from meldingen_core.factories import BaseAssetFactory
 from meldingen_core.filters import MeldingListFilters
@@ -14,6 +18,8 @@ from meldingen_core.labels import BaseLabelReplacer
 from meldingen_core.mail import BaseMeldingCompleteMailer, BaseMeldingConfirmationMailer
 from meldingen_core.managers import RelationshipManager
 from meldingen_core.models import Answer, Asset, AssetType, Classification, Label, Melding, Source
+from meldingen_core.pagination import Page, chunk, create_page, parse_cursor, validate_limit
+from meldingen_core.projection import MeldingRow, parse_projection
 from meldingen_core.reclassification import BaseReclassification
 from meldingen_core.repositories import (
     BaseAnswerRepository,
@@ -22,9 +28,11 @@ from meldingen_core.repositories import (
     BaseMeldingRepository,
     BaseRepository,
     BaseSourceRepository,
+    Include,
 )
+from meldingen_core.similarity import MinHashLSHIndex, SimilarMelding
 from meldingen_core.statemachine import BaseMeldingStateMachine, MeldingTransitions
-from meldingen_core.token import BaseTokenGenerator, BaseTokenInvalidator, TokenVerifier
+from meldingen_core.token import BaseTokenGenerator, BaseTokenInvalidator, TokenDigester, TokenVerifier
 
 log = logging.getLogger(__name__)
 
@@ -37,12 +45,17 @@ S = TypeVar("S", bound=Source)
 
 
 class MeldingCreateAction(Generic[T, C], BaseCreateAction[T]):
-    """Action that stores a melding."""
+    """Action that stores a melding.
+    When a token digester is provided, only the digest of the token is saved. The plain token is set on the melding
+    after saving it, so it can be returned to the melder once, the melding must not be saved again with it."""
 
     _classify: Classifier[C]
     _state_machine: BaseMeldingStateMachine[T]
     _generate_token: BaseTokenGenerator
     _token_duration: timedelta
+    _digest_token: TokenDigester | None
+    _duplicate_index: DuplicateCandidateIndex[T] | None
+    _text_index: MinHashLSHIndex[int] | None
 
     def __init__(
         self,
@@ -51,19 +64,29 @@ class MeldingCreateAction(Generic[T, C], BaseCreateAction[T]):
         state_machine: BaseMeldingStateMachine[T],
         token_generator: BaseTokenGenerator,
         token_duration: timedelta,
+        token_digester: TokenDigester | None = None,
+        duplicate_index: DuplicateCandidateIndex[T] | None = None,
+        text_index: MinHashLSHIndex[int] | None = None,
     ):
         super().__init__(repository)
         self._classify = classifier
         self._state_machine = state_machine
         self._generate_token = token_generator
         self._token_duration = token_duration
+        self._digest_token = token_digester
+        self._duplicate_index = duplicate_index
+        self._text_index = text_index
 
     @override
     async def __call__(self, obj: T) -> None:
         await super().__call__(obj)
 
-        obj.token = await self._generate_token()
+        token = await self._generate_token()
         obj.token_expires = datetime.now() + self._token_duration
+        if self._digest_token is not None:
+            obj.token_digest = self._digest_token(token)
+        else:
+            obj.token = token
 
         try:
             classification = await self._classify(obj.text)
@@ -73,6 +96,14 @@ class MeldingCreateAction(Generic[T, C], BaseCreateAction[T]):
             log.error("Classifier failed to find classification!")
 
         await self._repository.save(obj)
+        obj.token = token
+
+        if self._duplicate_index is not None or self._text_index is not None:
+            pk = self._repository.get_pk(obj)
+            if self._duplicate_index is not None:
+                self._duplicate_index.add(pk, obj)
+            if self._text_index is not None:
+                self._text_index.add(pk, obj.text)
 
 
 class MeldingListAction(Generic[T]):
@@ -91,6 +122,7 @@ class MeldingListAction(Generic[T]):
         sort_attribute_name: str | None = None,
         sort_direction: SortingDirection | None = None,
         filters: MeldingListFilters | None = None,
+        include: Include | None = None,
     ) -> Sequence[T]:
         return await self._repository.list_meldingen(
             limit=limit,
@@ -98,8 +130,202 @@ class MeldingListAction(Generic[T]):
             sort_attribute_name=sort_attribute_name,
             sort_direction=sort_direction,
             filters=filters,
+            include=include,
+        )
+
+
+class MeldingRowListAction(Generic[T]):
+    """Action that retrieves a list of meldingen as lightweight rows that only contain the requested fields."""
+
+    _repository: BaseMeldingRepository[T]
+
+    def __init__(self, repository: BaseMeldingRepository[T]) -> None:
+        self._repository = repository
+
+    async def __call__(
+        self,
+        *,
+        fields: Sequence[str],
+        limit: int | None = None,
+        offset: int | None = None,
+        sort_attribute_name: str | None = None,
+        sort_direction: SortingDirection | None = None,
+        filters: MeldingListFilters | None = None,
+    ) -> Sequence[MeldingRow]:
+        return await self._repository.list_melding_rows(
+            fields=parse_projection(fields),
+            limit=limit,
+            offset=offset,
+            sort_attribute_name=sort_attribute_name,
+            sort_direction=sort_direction,
+            filters=filters,
+        )
+
+
+class MeldingAggregateAction(Generic[T]):
+    """Action that counts the meldingen matching the filters, in total and per value of the requested facets.
+    When a cache is provided, the aggregates are reused for the time to live of the cache."""
+
+    _repository: BaseMeldingRepository[T]
+    _cache: MeldingAggregateCache | None
+
+    def __init__(self, repository: BaseMeldingRepository[T], cache: MeldingAggregateCache | None = None) -> None:
+        self._repository = repository
+        self._cache = cache
+
+    async def __call__(
+        self, *, filters: MeldingListFilters | None = None, facets: Sequence[str] = ()
+    ) -> MeldingAggregates:
+        unknown = [facet for facet in facets if facet not in get_args(MeldingFacet)]
+        if unknown:
+            raise InvalidInputException(f"Unknown facets: {', '.join(unknown)}")
+
+        melding_facets = cast(Sequence[MeldingFacet], facets)
+        if self._cache is not None:
+            cached = self._cache.get(filters, melding_facets)
+            if cached is not None:
+                return cached
+
+        if melding_facets:
+            # Every melding is counted once per facet, so the total follows from the counts of any facet
+            facet_counts = await self._repository.facet_meldingen(filters, melding_facets)
+            aggregates = MeldingAggregates(sum(facet_counts[melding_facets[0]].values()), facet_counts)
+        else:
+            aggregates = MeldingAggregates(await self._repository.count_meldingen(filters))
+
+        if self._cache is not None:
+            self._cache.set(filters, melding_facets, aggregates)
+
+        return aggregates
+
+
+class MeldingKeysetListAction(Generic[T]):
+    """Action that retrieves a page of meldingen using keyset (cursor) pagination."""
+
+    _repository: BaseMeldingRepository[T]
+
+    def __init__(self, repository: BaseMeldingRepository[T]) -> None:
+        self._repository = repository
+
+    async def __call__(
+        self,
+        *,
+        limit: int = 50,
+        cursor: str | None = None,
+        sort_attribute_name: str | None = None,
+        sort_direction: SortingDirection | None = None,
+        filters: MeldingListFilters | None = None,
+        include: Include | None = None,
+    ) -> Page[T]:
+        validate_limit(limit)
+        meldingen = await self._repository.list_meldingen(
+            limit=limit + 1,
+            sort_attribute_name=sort_attribute_name,
+            sort_direction=sort_direction,
+            filters=filters,
+            cursor=parse_cursor(cursor, sort_attribute_name, sort_direction),
+            include=include,
+        )
+
+        return create_page(
+            meldingen, limit, lambda melding: self._repository.get_cursor(melding, sort_attribute_name), sort_direction
+        )
+
+
+class MeldingStreamAction(Generic[T]):
+    """Action that streams all meldingen matching the filters, for exports that have to run in constant memory."""
+
+    _repository: BaseMeldingRepository[T]
+
+    def __init__(self, repository: BaseMeldingRepository[T]) -> None:
+        self._repository = repository
+
+    def __call__(
+        self,
+        *,
+        sort_attribute_name: str | None = None,
+        sort_direction: SortingDirection | None = None,
+        filters: MeldingListFilters | None = None,
+        batch_size: int = 500,
+        include: Include | None = None,
+    ) -> AsyncIterator[T]:
+        return self._repository.stream_meldingen(
+            sort_attribute_name=sort_attribute_name,
+            sort_direction=sort_direction,
+            filters=filters,
+            batch_size=batch_size,
+            include=include,
+        )
+
+    def chunks(
+        self,
+        *,
+        sort_attribute_name: str | None = None,
+        sort_direction: SortingDirection | None = None,
+        filters: MeldingListFilters | None = None,
+        batch_size: int = 500,
+        include: Include | None = None,
+    ) -> AsyncIterator[list[T]]:
+        """Streams the meldingen in lists of `batch_size` meldingen."""
+        meldingen = self(
+            sort_attribute_name=sort_attribute_name,
+            sort_direction=sort_direction,
+            filters=filters,
+            batch_size=batch_size,
+            include=include,
         )
 
+        return chunk(meldingen, batch_size)
+
+
+class MeldingDuplicatesAction(Generic[T]):
+    """Action that finds the likely duplicates of a melding, so they can be merged instead of processed separately.
+    The index is searched with the current location and classification of the melding, the candidates are retrieved
+    from the repository. The index itself is kept up to date by the actions that create and change meldingen."""
+
+    include: Include = ("classification",)
+    _repository: BaseMeldingRepository[T]
+    _duplicate_index: DuplicateCandidateIndex[T]
+
+    def __init__(self, repository: BaseMeldingRepository[T], duplicate_index: DuplicateCandidateIndex[T]) -> None:
+        self._repository = repository
+        self._duplicate_index = duplicate_index
+
+    async def __call__(self, melding_id: int) -> Sequence[DuplicateCandidate[T]]:
+        melding = await self._repository.retrieve(melding_id, self.include)
+        if melding is None:
+            raise NotFoundException("Melding not found")
+
+        candidates = self._duplicate_index.find(melding_id, melding)
+        meldingen = await self._repository.retrieve_many([pk for pk, _ in candidates], self.include)
+
+        return [DuplicateCandidate(pk, meldingen[pk], distance) for pk, distance in candidates if pk in meldingen]
+
+
+class MeldingSimilarTextAction(Generic[T]):
+    """Action that finds the recent meldingen with a text similar to the text of a melding."""
+
+    _repository: BaseMeldingRepository[T]
+    _text_index: MinHashLSHIndex[int]
+
+    def __init__(self, repository: BaseMeldingRepository[T], text_index: MinHashLSHIndex[int]) -> None:
+        self._repository = repository
+        self._text_index = text_index
+
+    async def __call__(self, melding_id: int, days: float = 7, threshold: float = 0.5) -> Sequence[SimilarMelding[T]]:
+        melding = await self._repository.retrieve(melding_id)
+        if melding is None:
+            raise NotFoundException("Melding not found")
+
+        similar = [
+            (pk, similarity)
+            for pk, similarity in self._text_index.query(melding.text, threshold, timedelta(days=days).total_seconds())
+            if pk != melding_id
+        ]
+        meldingen = await self._repository.retrieve_many([pk for pk, _ in similar])
+
+        return [SimilarMelding(pk, meldingen[pk], similarity) for pk, similarity in similar if pk in meldingen]
+
 
 class MeldingRetrieveAction(BaseRetrieveAction[T]):
     """Action that retrieves a melding."""
@@ -150,10 +376,13 @@ class MeldingUpdateAction(Generic[T, L, S], BaseUpdateAction[T]):
 class MeldingUpdateActionMelder(Generic[T, C], BaseCRUDAction[T]):
     """Action that updates the melding and reclassifies it"""
 
+    include: Include = ("classification", "assets")
     _verify_token: TokenVerifier[T]
     _classify: Classifier[C]
     _state_machine: BaseMeldingStateMachine[T]
     _reclassifier: BaseReclassification[T, C]
+    _text_index: MinHashLSHIndex[int] | None
+    _duplicate_index: DuplicateCandidateIndex[T] | None
 
     def __init__(
         self,
@@ -162,15 +391,34 @@ class MeldingUpdateActionMelder(Generic[T, C], BaseCRUDAction[T]):
         classifier: Classifier[C],
         state_machine: BaseMeldingStateMachine[T],
         reclassifier: BaseReclassification[T, C],
+        text_index: MinHashLSHIndex[int] | None = None,
+        duplicate_index: DuplicateCandidateIndex[T] | None = None,
     ) -> None:
         super().__init__(repository)
         self._verify_token = token_verifier
         self._classify = classifier
         self._state_machine = state_machine
         self._reclassifier = reclassifier
+        self._text_index = text_index
+        self._duplicate_index = duplicate_index
 
     async def __call__(self, pk: int, values: dict[str, Any], token: str) -> T:
-        melding = await self._verify_token(pk, token)
+        melding = await self._verify_token(pk, token, self.include)
+        try:
+            await self._update(melding, values)
+        finally:
+            # The melding may come from the verified-melding cache, which must not keep a change that was not saved
+            self._verify_token.invalidate(pk)
+
+        if self._text_index is not None:
+            self._text_index.add(pk, melding.text)
+        if self._duplicate_index is not None:
+            # The classification may have changed
+            self._duplicate_index.add(pk, melding)
+
+        return melding
+
+    async def _update(self, melding: T, values: dict[str, Any]) -> None:
         old_classification: C = cast(C, melding.classification)
 
         for key, value in values.items():
@@ -188,7 +436,80 @@ class MeldingUpdateActionMelder(Generic[T, C], BaseCRUDAction[T]):
         await self._state_machine.transition(melding, MeldingTransitions.CLASSIFY)
         await self._repository.save(melding)
 
-        return melding
+
+@dataclass
+class ReclassificationResult:
+    total: int = 0
+    reclassified: int = 0
+    unclassified: int = 0
+
+
+class MeldingReclassifyAction(Generic[T, C]):
+    """
+    Reclassifies existing meldingen, for example after the classifier model changed. The meldingen are streamed and
+    classified in batches, so a run over tens of thousands of meldingen needs one classifier call per batch and runs
+    in constant memory. The reclassification side effects are only run for meldingen whose classification changed,
+    those meldingen are saved in one batch. The state of the meldingen is left as is.
+    Meldingen that could not be classified keep their classification, the classifier may be unavailable or return an
+    unknown classification, which should not remove the classification of every melding in the run. They are counted
+    as unclassified.
+    """
+
+    include: Include = ("classification", "assets")
+    _repository: BaseMeldingRepository[T]
+    _classify: Classifier[C]
+    _reclassifier: BaseReclassification[T, C]
+    _batch_size: int
+
+    def __init__(
+        self,
+        repository: BaseMeldingRepository[T],
+        classifier: Classifier[C],
+        reclassifier: BaseReclassification[T, C],
+        batch_size: int = 100,
+    ) -> None:
+        self._repository = repository
+        self._classify = classifier
+        self._reclassifier = reclassifier
+        self._batch_size = batch_size
+
+    async def __call__(self, filters: MeldingListFilters | None = None) -> ReclassificationResult:
+        result = ReclassificationResult()
+        batch: list[T] = []
+        async for melding in self._repository.stream_meldingen(
+            filters=filters, batch_size=self._batch_size, include=self.include
+        ):
+            batch.append(melding)
+            if len(batch) == self._batch_size:
+                await self._reclassify(batch, result)
+                batch = []
+
+        if batch:
+            await self._reclassify(batch, result)
+
+        return result
+
+    async def _reclassify(self, meldingen: list[T], result: ReclassificationResult) -> None:
+        classifications = await self._classify.classify_many([melding.text for melding in meldingen])
+
+        changed = []
+        for melding, classification in zip(meldingen, classifications):
+            result.total += 1
+            if classification is None:
+                result.unclassified += 1
+                continue
+
+            old_classification = cast(C | None, melding.classification)
+            if old_classification is not None and old_classification.name == classification.name:
+                continue
+
+            await self._reclassifier(melding, old_classification, classification)
+            melding.classification = classification
+            changed.append(melding)
+
+        if changed:
+            result.reclassified += len(changed)
+            await self._repository.save_many(changed)
 
 
 class MeldingAddContactInfoAction(BaseCRUDAction[T]):
@@ -207,10 +528,13 @@ class MeldingAddContactInfoAction(BaseCRUDAction[T]):
     async def __call__(self, pk: int, phone: str | None, email: str | None, token: str) -> T:
         melding = await self._verify_token(pk, token)
 
-        melding.phone = phone
-        melding.email = email
+        try:
+            melding.phone = phone
+            melding.email = email
 
-        await self._repository.save(melding)
+            await self._repository.save(melding)
+        finally:
+            self._verify_token.invalidate(pk)
 
         return melding
 
@@ -247,6 +571,69 @@ class BaseStateTransitionAction(Generic[T], metaclass=ABCMeta):
         return melding
 
 
+@dataclass
+class BulkStateTransitionResult(Generic[T]):
+    melding_id: int
+    melding: T | None = None
+    error: Exception | None = None
+
+    @property
+    def succeeded(self) -> bool:
+        return self.error is None
+
+
+class BaseBulkStateTransitionAction(Generic[T], metaclass=ABCMeta):
+    """
+    Applies a transition to many meldingen at once, for example to process or cancel a large number of meldingen
+    in the backoffice. The meldingen are retrieved with a single repository call, transitioned concurrently and saved
+    in one batch. Instead of aborting on the first failure, a result is returned for every melding id.
+    """
+
+    _state_machine: BaseMeldingStateMachine[T]
+    _repository: BaseMeldingRepository[T]
+    _max_concurrency: int
+
+    def __init__(
+        self,
+        state_machine: BaseMeldingStateMachine[T],
+        repository: BaseMeldingRepository[T],
+        max_concurrency: int = 10,
+    ):
+        self._state_machine = state_machine
+        self._repository = repository
+        self._max_concurrency = max_concurrency
+
+    @property
+    @abstractmethod
+    def transition_name(self) -> str: ...
+
+    async def __call__(self, melding_ids: Sequence[int]) -> list[BulkStateTransitionResult[T]]:
+        melding_ids = list(dict.fromkeys(melding_ids))
+        meldingen = await self._repository.retrieve_many(melding_ids)
+        semaphore = asyncio.Semaphore(self._max_concurrency)
+
+        async def transition(melding_id: int) -> BulkStateTransitionResult[T]:
+            melding = meldingen.get(melding_id)
+            if melding is None:
+                return BulkStateTransitionResult(melding_id, error=NotFoundException())
+
+            try:
+                async with semaphore:
+                    await self._state_machine.transition(melding, self.transition_name)
+            except Exception as exception:
+                return BulkStateTransitionResult(melding_id, melding, exception)
+
+            return BulkStateTransitionResult(melding_id, melding)
+
+        results = await asyncio.gather(*(transition(melding_id) for melding_id in melding_ids))
+
+        await self._repository.save_many(
+            [result.melding for result in results if result.succeeded and result.melding is not None]
+        )
+
+        return list(results)
+
+
 class BaseMeldingFormStateTransitionAction(Generic[T], metaclass=ABCMeta):
     """
     This action covers transitions that require the melding's token to be verified.
@@ -274,8 +661,11 @@ class BaseMeldingFormStateTransitionAction(Generic[T], metaclass=ABCMeta):
     async def __call__(self, melding_id: int, token: str) -> T:
         melding = await self._verify_token(melding_id, token)
 
-        await self._state_machine.transition(melding, self.transition_name)
-        await self._repository.save(melding)
+        try:
+            await self._state_machine.transition(melding, self.transition_name)
+            await self._repository.save(melding)
+        finally:
+            self._verify_token.invalidate(melding_id)
 
         return melding
 
@@ -346,6 +736,24 @@ class MeldingCancelAction(BaseStateTransitionAction[T]):
         return MeldingTransitions.CANCEL
 
 
+class MeldingBulkProcessAction(BaseBulkStateTransitionAction[T]):
+    @property
+    def transition_name(self) -> str:
+        return MeldingTransitions.PROCESS
+
+
+class MeldingBulkPlanAction(BaseBulkStateTransitionAction[T]):
+    @property
+    def transition_name(self) -> str:
+        return MeldingTransitions.PLAN
+
+
+class MeldingBulkCancelAction(BaseBulkStateTransitionAction[T]):
+    @property
+    def transition_name(self) -> str:
+        return MeldingTransitions.CANCEL
+
+
 class MeldingCompleteAction(Generic[T]):
     _state_machine: BaseMeldingStateMachine[T]
     _repository: BaseMeldingRepository[T]
@@ -458,9 +866,13 @@ class MeldingSubmitActionMelder(BaseCRUDAction[T]):
         token: str,
     ) -> T:
         melding = await self._verify_token(melding_id, token)
-        await self._state_machine.transition(melding, self.transition_name)
-        await self._invalidate_token(melding)
-        await self._repository.save(melding)
+        try:
+            await self._state_machine.transition(melding, self.transition_name)
+            await self._invalidate_token(melding)
+            await self._repository.save(melding)
+        finally:
+            self._verify_token.invalidate(melding_id)
+
         await self._send_mail(melding)
 
         return melding
@@ -471,6 +883,7 @@ class MeldingSubmitActionMelder(BaseCRUDAction[T]):
 
 
 class MeldingAddAssetAction(Generic[T, AS, AT]):
+    include: Include = ("assets", "classification.asset_type")
     _verify_token: TokenVerifier[T]
     _melding_repository: BaseMeldingRepository[T]
     _asset_repository: BaseAssetRepository[AS]
@@ -495,10 +908,10 @@ class MeldingAddAssetAction(Generic[T, AS, AT]):
         self._melding_asset_relationship_manager = melding_asset_relationship_manager
 
     async def __call__(self, melding_id: int, external_asset_id: str, asset_type_id: int, token: str) -> T:
-        melding = await self._verify_token(melding_id, token)
-
-        melding_asset_type = await self._asset_type_repository.find_by_melding(melding_id)
+        melding = await self._verify_token(melding_id, token, self.include)
 
+        # The asset type is loaded along with the classification by the token verifier
+        melding_asset_type = melding.classification.asset_type if melding.classification is not None else None
         if melding_asset_type is None:
             raise NotFoundException(f"Failed to find asset type for melding")
 
@@ -516,17 +929,22 @@ class MeldingAddAssetAction(Generic[T, AS, AT]):
                 f"Melding with id {melding_id} already has the maximum number of assets for asset type {asset_type.name} associated"
             )
 
-        asset = await self._asset_repository.find_by_external_id_and_asset_type_id(external_asset_id, asset_type_id)
-        if asset is None:
-            asset = self._create_asset(external_asset_id, asset_type, melding)
-            await self._asset_repository.save(asset)
+        try:
+            asset = await self._asset_repository.find_by_external_id_and_asset_type_id(external_asset_id, asset_type_id)
+            if asset is None:
+                asset = self._create_asset(external_asset_id, asset_type, melding)
+                await self._asset_repository.save(asset)
 
-        await self._melding_asset_relationship_manager.add_relationship(melding, asset)
+            await self._melding_asset_relationship_manager.add_relationship(melding, asset)
+        finally:
+            # The assets of the melding are changed without saving the melding itself
+            self._verify_token.invalidate(melding_id)
 
         return melding
 
 
 class MeldingDeleteAssetAction(Generic[T, AS]):
+    include: Include = ("assets",)
     _verify_token: TokenVerifier[T]
     _asset_repository: BaseAssetRepository[AS]
     _relationship_manager: RelationshipManager[T, AS]
@@ -542,7 +960,7 @@ class MeldingDeleteAssetAction(Generic[T, AS]):
         self._relationship_manager = relationship_manager
 
     async def __call__(self, melding_id: int, asset_id: int, token: str) -> None:
-        melding = await self._verify_token(melding_id, token)
+        melding = await self._verify_token(melding_id, token, self.include)
         asset = await self._asset_repository.retrieve(asset_id)
 
         if asset is None:
@@ -552,6 +970,10 @@ class MeldingDeleteAssetAction(Generic[T, AS]):
         if asset not in melding_assets:
             raise NotFoundException(f"Melding with id {melding_id} does not have asset with id {asset_id} associated")
 
-        melding_assets.remove(asset)
+        try:
+            melding_assets.remove(asset)
 
-        await self._asset_repository.delete(asset_id)
+            await self._asset_repository.delete(asset_id)
+        finally:
+            # The melding itself is not saved, so the repository does not remove it from the verified-melding cache
+            self._verify_token.invalidate(melding_id)
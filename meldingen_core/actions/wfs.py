@@ -1,22 +1,67 @@
+import asyncio
+import logging
+from collections.abc import Sequence
 from typing import AsyncIterator, Generic, Literal, TypeVar
 
-from meldingen_core.exceptions import NotFoundException
+from meldingen_core.exceptions import InvalidInputException, NotFoundException
 from meldingen_core.models import AssetType
 from meldingen_core.repositories import BaseAssetTypeRepository
-from meldingen_core.wfs import AssetTypeToWfsProviderConverter
+from meldingen_core.spatial import BoundingBox
+from meldingen_core.wfs import (
+    AssetTypeToWfsProviderConverter,
+    BaseWfsResponseCache,
+    Tile,
+    WfsFeature,
+    WfsRequestCoalescer,
+    WfsTileCache,
+    WfsTileGrid,
+    bbox_filter,
+    merge_wfs_features,
+    parse_wfs_features,
+    wfs_cache_key,
+)
+
+log = logging.getLogger(__name__)
 
 AT = TypeVar("AT", bound=AssetType)
 
 
-class WfsRetrieveAction(Generic[AT]):
+class BaseWfsAction(Generic[AT]):
+    """Base for the WFS actions, the `cache_ttl` argument of the asset type sets how long its responses are cached."""
+
+    CACHE_TTL_ARGUMENT = "cache_ttl"
+
     _converter: AssetTypeToWfsProviderConverter
     _asset_type_repository: BaseAssetTypeRepository[AT]
 
+    def _get_cache_ttl(self, asset_type: AT) -> float:
+        ttl = asset_type.arguments.get(self.CACHE_TTL_ARGUMENT)
+        if not isinstance(ttl, (int, float)):
+            return 0
+
+        return ttl
+
+
+class WfsRetrieveAction(BaseWfsAction[AT]):
+    """Retrieves features from the WFS provider of the asset type.
+    When a response cache is provided, responses are cached for the number of seconds specified by the
+    `cache_ttl` argument of the asset type. Asset types without a positive `cache_ttl` are never cached.
+    When a request coalescer is provided, concurrent identical requests share a single upstream fetch."""
+
+    _response_cache: BaseWfsResponseCache | None
+    _request_coalescer: WfsRequestCoalescer | None
+
     def __init__(
-        self, converter: AssetTypeToWfsProviderConverter, asset_type_repository: BaseAssetTypeRepository[AT]
+        self,
+        converter: AssetTypeToWfsProviderConverter,
+        asset_type_repository: BaseAssetTypeRepository[AT],
+        response_cache: BaseWfsResponseCache | None = None,
+        request_coalescer: WfsRequestCoalescer | None = None,
     ) -> None:
         self._converter = converter
         self._asset_type_repository = asset_type_repository
+        self._response_cache = response_cache
+        self._request_coalescer = request_coalescer
 
     async def __call__(
         self,
@@ -35,6 +80,112 @@ class WfsRetrieveAction(Generic[AT]):
         if asset_type is None:
             raise NotFoundException("AssetType not found")
 
-        provider = self._converter(asset_type)
+        ttl = self._get_cache_ttl(asset_type) if self._response_cache is not None else 0
+        response_cache = self._response_cache if ttl > 0 else None
+
+        async def fetch() -> AsyncIterator[bytes]:
+            provider = self._converter(asset_type)
+            data = await provider(type_names, count, srs_name, output_format, service, version, request, filter)
+            if response_cache is None:
+                return data
+
+            return response_cache.tee(key, data, ttl)
+
+        if response_cache is None and self._request_coalescer is None:
+            return await fetch()
+
+        key = wfs_cache_key(asset_type, type_names, count, srs_name, output_format, service, version, request, filter)
+
+        if response_cache is not None:
+            cached = await response_cache.get(key)
+            if cached is not None:
+                return cached
+
+        if self._request_coalescer is None:
+            return await fetch()
+
+        return self._request_coalescer(key, fetch)
+
+
+class WfsTiledRetrieveAction(BaseWfsAction[AT]):
+    """Retrieves the features within a bounding box by snapping it to the tiles of a fixed grid.
+    Tiles that are not in the tile cache are fetched in parallel with a bounding box filter, the features of all tiles
+    are merged into a single GeoJSON feature collection. Because whole tiles are returned, the collection can contain
+    features outside the requested bounding box. Tiles are cached for the `cache_ttl` of the asset type, except tiles
+    that contain `count` features, these may have been truncated by the provider."""
+
+    _tile_grid: WfsTileGrid
+    _tile_cache: WfsTileCache | None
+    _max_concurrency: int
+    _max_tiles: int
+
+    def __init__(
+        self,
+        converter: AssetTypeToWfsProviderConverter,
+        asset_type_repository: BaseAssetTypeRepository[AT],
+        tile_grid: WfsTileGrid,
+        tile_cache: WfsTileCache | None = None,
+        max_concurrency: int = 8,
+        max_tiles: int = 64,
+    ) -> None:
+        self._converter = converter
+        self._asset_type_repository = asset_type_repository
+        self._tile_grid = tile_grid
+        self._tile_cache = tile_cache
+        self._max_concurrency = max_concurrency
+        self._max_tiles = max_tiles
+
+    async def __call__(
+        self,
+        asset_type_id: int,
+        type_names: str,
+        bbox: BoundingBox,
+        count: int = 1000,
+        srs_name: str = "urn:ogc:def:crs:EPSG::4326",
+        output_format: Literal["application/json"] = "application/json",
+        service: Literal["WFS"] = "WFS",
+        version: str = "2.0.0",
+        request: Literal["GetFeature"] = "GetFeature",
+    ) -> AsyncIterator[bytes]:
+        asset_type = await self._asset_type_repository.retrieve(asset_type_id)
+
+        if asset_type is None:
+            raise NotFoundException("AssetType not found")
+
+        tiles = self._tile_grid.tiles(bbox)
+        if len(tiles) > self._max_tiles:
+            raise InvalidInputException(f"Bounding box covers {len(tiles)} tiles, the maximum is {self._max_tiles}")
+
+        ttl = self._get_cache_ttl(asset_type) if self._tile_cache is not None else 0
+        tile_cache = self._tile_cache if ttl > 0 else None
+        layer_key = wfs_cache_key(
+            asset_type, type_names, count, srs_name, output_format, service, version, request, None
+        )
+
+        features: dict[Tile, Sequence[WfsFeature]] = {}
+        for tile in tiles:
+            cached = tile_cache.get(layer_key, tile) if tile_cache is not None else None
+            if cached is not None:
+                features[tile] = cached
+
+        missing = [tile for tile in tiles if tile not in features]
+        if missing:
+            provider = self._converter(asset_type)
+            semaphore = asyncio.Semaphore(self._max_concurrency)
+
+            async def fetch_tile(tile: Tile) -> None:
+                tile_filter = bbox_filter(self._tile_grid.bbox(tile), srs_name)
+                async with semaphore:
+                    data = await provider(
+                        type_names, count, srs_name, output_format, service, version, request, tile_filter
+                    )
+                    features[tile] = await parse_wfs_features(data)
+
+                if len(features[tile]) >= count:
+                    log.warning("Tile %s of %s contains %d features and may be truncated", tile, type_names, count)
+                elif tile_cache is not None:
+                    tile_cache.set(layer_key, tile, features[tile], ttl)
+
+            await asyncio.gather(*(fetch_tile(tile) for tile in missing))
 
-        return await provider(type_names, count, srs_name, output_format, service, version, request, filter)
+        return merge_wfs_features([features[tile] for tile in tiles])
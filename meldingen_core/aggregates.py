@@ -0,0 +1,74 @@
+import time
+from collections.abc import Callable, Hashable, Mapping, Sequence
+from dataclasses import dataclass, field, fields
+from typing import Literal, TypeAlias
+
+from meldingen_core.cache import LRUCache
+from meldingen_core.filters import MeldingListFilters
+from meldingen_core.models import Melding
+
+MeldingFacet: TypeAlias = Literal["state", "classification", "urgency"]
+FacetValue: TypeAlias = str | int | None
+FacetCounts: TypeAlias = Mapping[MeldingFacet, Mapping[FacetValue, int]]
+
+
+@dataclass(frozen=True)
+class MeldingAggregates:
+    total: int
+    facets: FacetCounts = field(default_factory=dict)
+
+
+def facet_value(melding: Melding, facet: MeldingFacet) -> FacetValue:
+    """Returns the value a melding is grouped on for the facet, relationships are grouped on their name."""
+    if facet == "classification":
+        return melding.classification.name if melding.classification is not None else None
+    if facet == "urgency":
+        return melding.urgency
+
+    return melding.state
+
+
+FiltersKey: TypeAlias = tuple[tuple[str, Hashable], ...]
+AggregateCacheKey: TypeAlias = tuple[FiltersKey | None, tuple[MeldingFacet, ...]]
+
+
+def filters_key(filters: MeldingListFilters) -> FiltersKey:
+    """Returns a hashable key of the filters, filters that match the same meldingen get the same key.
+    The sequence filters match any of their values, so they are keyed on the set of values."""
+    key: list[tuple[str, Hashable]] = []
+    for filter_field in fields(filters):
+        value = getattr(filters, filter_field.name)
+        if isinstance(value, Sequence) and not isinstance(value, str):
+            value = frozenset(value)
+
+        key.append((filter_field.name, value))
+
+    return tuple(key)
+
+
+class MeldingAggregateCache:
+    """Short lived cache of aggregates, keyed on the filters and facets.
+    It lets dashboards poll the aggregates without running the grouped query on every request. Aggregates are not
+    invalidated when meldingen change, so keep the time to live short."""
+
+    _cache: LRUCache[AggregateCacheKey, MeldingAggregates]
+    _ttl: float
+
+    def __init__(self, ttl: float = 10.0, max_size: int = 128, clock: Callable[[], float] = time.monotonic) -> None:
+        self._cache = LRUCache(max_size, clock)
+        self._ttl = ttl
+
+    @staticmethod
+    def _key(filters: MeldingListFilters | None, facets: Sequence[MeldingFacet]) -> AggregateCacheKey:
+        return filters_key(filters) if filters is not None else None, tuple(sorted(set(facets)))
+
+    def get(self, filters: MeldingListFilters | None, facets: Sequence[MeldingFacet]) -> MeldingAggregates | None:
+        return self._cache.get(self._key(filters, facets))
+
+    def set(
+        self, filters: MeldingListFilters | None, facets: Sequence[MeldingFacet], aggregates: MeldingAggregates
+    ) -> None:
+        self._cache.set(self._key(filters, facets), aggregates, self._ttl)
+
+    def clear(self) -> None:
+        self._cache.clear()
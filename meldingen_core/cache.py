@@ -0,0 +1,134 @@
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from dataclasses import dataclass
+from typing import Generic, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+@dataclass
+class _CacheEntry(Generic[V]):
+    value: V
+    size: int
+    expires_at: float | None
+
+
+@dataclass
+class CacheMetrics:
+    hits: int = 0
+    misses: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def record(self, hit: bool) -> None:
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+
+class LRUCache(Generic[K, V]):
+    """In-memory cache that evicts the least recently used entries once the total size exceeds the maximum size.
+    Entries can optionally expire after a time to live in seconds."""
+
+    _entries: OrderedDict[K, _CacheEntry[V]]
+    _max_size: int
+    _size: int
+    _clock: Callable[[], float]
+
+    def __init__(self, max_size: int, clock: Callable[[], float] = time.monotonic) -> None:
+        self._entries = OrderedDict()
+        self._max_size = max_size
+        self._size = 0
+        self._clock = clock
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: K) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and not self._is_expired(entry)
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def get(self, key: K) -> V | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        if self._is_expired(entry):
+            self._remove(key)
+            return None
+
+        self._entries.move_to_end(key)
+
+        return entry.value
+
+    def set(self, key: K, value: V, ttl: float | None = None, size: int = 1) -> list[tuple[K, V]]:
+        """Stores the value and returns the entries that were evicted to make room for it.
+        Values that are larger than the maximum size of the cache are not stored."""
+        evicted: list[tuple[K, V]] = []
+
+        previous = self._remove(key)
+        if previous is not None and previous.value is not value:
+            evicted.append((key, previous.value))
+
+        if size > self._max_size:
+            return evicted
+
+        expires_at = None if ttl is None else self._clock() + ttl
+        self._entries[key] = _CacheEntry(value, size, expires_at)
+        self._size += size
+
+        while self._size > self._max_size:
+            evicted_key, evicted_entry = self._entries.popitem(last=False)
+            self._size -= evicted_entry.size
+            evicted.append((evicted_key, evicted_entry.value))
+
+        return evicted
+
+    def items(self) -> list[tuple[K, V]]:
+        """Returns the entries that have not expired, from least to most recently used."""
+        return [(key, entry.value) for key, entry in self._entries.items() if not self._is_expired(entry)]
+
+    def pop(self, key: K) -> V | None:
+        entry = self._remove(key)
+        return None if entry is None else entry.value
+
+    def pop_if_expired(self, key: K) -> V | None:
+        """Removes and returns the entry of the key when it has expired."""
+        entry = self._entries.get(key)
+        if entry is None or not self._is_expired(entry):
+            return None
+
+        self._remove(key)
+        return entry.value
+
+    def pop_expired(self) -> list[tuple[K, V]]:
+        """Removes and returns all expired entries."""
+        expired = [(key, entry.value) for key, entry in self._entries.items() if self._is_expired(entry)]
+        for key, _ in expired:
+            self._remove(key)
+
+        return expired
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._size = 0
+
+    def _remove(self, key: K) -> _CacheEntry[V] | None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry.size
+
+        return entry
+
+    def _is_expired(self, entry: _CacheEntry[V]) -> bool:
+        return entry.expires_at is not None and entry.expires_at <= self._clock()
@@ -1,36 +1,508 @@
+import asyncio
+import hashlib
+import logging
+import re
+import time
 from abc import ABCMeta, abstractmethod
+from collections.abc import Awaitable, Callable, Iterable, Mapping, Sequence
+from dataclasses import dataclass, field
+from enum import StrEnum
 from typing import Generic, TypeVar
 
+from meldingen_core import SortingDirection
+from meldingen_core.cache import CacheMetrics, LRUCache
 from meldingen_core.exceptions import NotFoundException
+from meldingen_core.filters import NameListFilters
 from meldingen_core.models import Classification
-from meldingen_core.repositories import BaseClassificationRepository
+from meldingen_core.pagination import Cursor
+from meldingen_core.repositories import BaseClassificationRepository, Include
+
+log = logging.getLogger(__name__)
 
 C = TypeVar("C", bound=Classification)
+R = TypeVar("R")
 
 
 class ClassificationNotFoundException(NotFoundException): ...
 
 
 class BaseClassifierAdapter(metaclass=ABCMeta):
+    max_concurrency: int = 10
+
     @abstractmethod
     async def __call__(self, text: str) -> str | None:
         """Accepts a text as input and returns the classification name."""
 
+    async def classify_many(self, texts: Sequence[str]) -> list[str | None]:
+        """Returns the classification name of every text, in the order of the texts. Adapters should override this
+        with a single batch request, by default the texts are classified concurrently, at most `max_concurrency` at a
+        time."""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def classify(text: str) -> str | None:
+            async with semaphore:
+                return await self(text)
+
+        return list(await asyncio.gather(*(classify(text) for text in texts)))
+
+
+def normalize_text(text: str) -> str:
+    """Normalizes the text for caching, texts that only differ in case or whitespace are classified the same."""
+    return " ".join(text.split()).lower()
+
+
+class CachingClassifierAdapter(BaseClassifierAdapter):
+    """Decorates an adapter with a cache of the classification names per normalized text.
+    Only cache the answers of the classification service: wrap the cache in a `ResilientClassifierAdapter`, not the
+    other way around, otherwise the answers of its fallback would be cached long after the service has recovered.
+    Texts without classification are cached for `missing_ttl` only, a missing classification can be caused by a
+    temporary problem of the classification service. The cache is keyed on a digest of the text, so long texts do not
+    take up memory."""
+
+    _adapter: BaseClassifierAdapter
+    _cache: LRUCache[bytes, tuple[str | None]]
+    _ttl: float
+    _missing_ttl: float
+    metrics: CacheMetrics
+
+    def __init__(
+        self,
+        adapter: BaseClassifierAdapter,
+        max_size: int = 4096,
+        ttl: float = 3600.0,
+        clock: Callable[[], float] = time.monotonic,
+        missing_ttl: float = 60.0,
+    ) -> None:
+        if isinstance(adapter, ResilientClassifierAdapter):
+            raise ValueError("The resilient adapter has to wrap the cache, not the other way around")
+
+        self._adapter = adapter
+        self._cache = LRUCache(max_size, clock)
+        self._ttl = ttl
+        self._missing_ttl = missing_ttl
+        self.metrics = CacheMetrics()
+
+    @staticmethod
+    def _key(text: str) -> bytes:
+        return hashlib.sha256(normalize_text(text).encode()).digest()
+
+    def _set(self, key: bytes, name: str | None) -> None:
+        if name is None and self._missing_ttl <= 0:
+            return
+
+        self._cache.set(key, (name,), self._ttl if name is not None else self._missing_ttl)
+
+    async def __call__(self, text: str) -> str | None:
+        key = self._key(text)
+
+        cached = self._cache.get(key)
+        self.metrics.record(cached is not None)
+        if cached is not None:
+            return cached[0]
+
+        name = await self._adapter(text)
+        self._set(key, name)
+
+        return name
+
+    async def classify_many(self, texts: Sequence[str]) -> list[str | None]:
+        """Only the texts that are not cached are passed on to the adapter, texts that normalize to the same text are
+        passed on once."""
+        keys = [self._key(text) for text in texts]
+        names: dict[bytes, str | None] = {}
+        missing: dict[bytes, str] = {}
+        for key, text in zip(keys, texts):
+            if key in names or key in missing:
+                continue
+
+            cached = self._cache.get(key)
+            self.metrics.record(cached is not None)
+            if cached is not None:
+                names[key] = cached[0]
+            else:
+                missing[key] = text
+
+        if missing:
+            for key, name in zip(missing, await self._adapter.classify_many(list(missing.values()))):
+                self._set(key, name)
+                names[key] = name
+
+        return [names[key] for key in keys]
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+
+def _words(text: str) -> list[str]:
+    return re.findall(r"\w+", text.lower())
+
+
+@dataclass
+class _TrieNode:
+    children: dict[str, "_TrieNode"] = field(default_factory=dict)
+    names: list[str] = field(default_factory=list)
+
+
+class KeywordClassifierAdapter(BaseClassifierAdapter):
+    """Fast local classifier that looks up keywords in a word trie, meant as fallback when the classification service is
+    unavailable. Every classification is found by its own name and by its synonyms, which can be phrases.
+    The classification with the most matched words wins, the classification that was matched first wins a tie."""
+
+    _root: _TrieNode
+
+    def __init__(self, keywords: Mapping[str, Iterable[str]]) -> None:
+        self._root = _TrieNode()
+        for name, synonyms in keywords.items():
+            for keyword in (name, *synonyms):
+                node = self._root
+                for word in _words(keyword):
+                    node = node.children.setdefault(word, _TrieNode())
+                if node is not self._root and name not in node.names:
+                    node.names.append(name)
+
+    @classmethod
+    def from_classifications(
+        cls, classifications: Iterable[Classification], synonyms: Mapping[str, Iterable[str]] | None = None
+    ) -> "KeywordClassifierAdapter":
+        synonyms = synonyms or {}
+        return cls({classification.name: synonyms.get(classification.name, ()) for classification in classifications})
+
+    async def __call__(self, text: str) -> str | None:
+        words = _words(text)
+        scores: dict[str, int] = {}
+        for start in range(len(words)):
+            node = self._root
+            for length, word in enumerate(words[start:], start=1):
+                child = node.children.get(word)
+                if child is None:
+                    break
+
+                node = child
+                for name in node.names:
+                    scores[name] = scores.get(name, 0) + length
+
+        if not scores:
+            return None
+
+        return max(scores, key=lambda name: scores[name])
+
+
+class CircuitState(StrEnum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Stops calling a failing dependency for a while. The circuit opens after a number of consecutive failures, after
+    the reset timeout a single trial call is let through, which closes the circuit when it succeeds and opens it again
+    when it fails."""
+
+    _failure_threshold: int
+    _reset_timeout: float
+    _clock: Callable[[], float]
+    _failures: int
+    _opened_at: float | None
+    _trial: bool
+
+    def __init__(
+        self, failure_threshold: int = 5, reset_timeout: float = 30.0, clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._clock = clock
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+
+    @property
+    def state(self) -> CircuitState:
+        if self._opened_at is None:
+            return CircuitState.CLOSED
+        if self._clock() - self._opened_at < self._reset_timeout:
+            return CircuitState.OPEN
+
+        return CircuitState.HALF_OPEN
+
+    def allow(self) -> bool:
+        """Returns whether a call may be made, every allowed call has to be followed by a recorded success or failure."""
+        state = self.state
+        if state == CircuitState.CLOSED:
+            return True
+        if state == CircuitState.OPEN or self._trial:
+            return False
+
+        self._trial = True
+        return True
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self._trial or self._failures >= self._failure_threshold:
+            self._opened_at = self._clock()
+            self._trial = False
+
+    def record_cancelled(self) -> None:
+        """Records that an allowed call was cancelled, which says nothing about the dependency. A trial call is released
+        so the next call can be the trial."""
+        self._trial = False
+
+
+class ResilientClassifierAdapter(BaseClassifierAdapter):
+    """Decorates an adapter with a deadline and a circuit breaker, so a slow or failing classification service does not
+    hold up the creation of meldingen. Calls that time out or fail, and calls made while the circuit is open, are
+    answered by the fallback adapter. Without a fallback no classification is returned and the melding is created
+    unclassified. To cache classifications, pass a `CachingClassifierAdapter` around the classification service as
+    adapter, so the answers of the fallback are never cached."""
+
+    _adapter: BaseClassifierAdapter
+    _fallback: BaseClassifierAdapter | None
+    _timeout: float
+    _batch_timeout: float
+    breaker: CircuitBreaker
+
+    def __init__(
+        self,
+        adapter: BaseClassifierAdapter,
+        fallback: BaseClassifierAdapter | None = None,
+        timeout: float = 1.0,
+        breaker: CircuitBreaker | None = None,
+        batch_timeout: float = 30.0,
+    ) -> None:
+        self._adapter = adapter
+        self._fallback = fallback
+        self._timeout = timeout
+        self._batch_timeout = batch_timeout
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+
+    async def _guard(self, call: Callable[[], Awaitable[R]], timeout: float) -> tuple[R] | None:
+        """Makes the call within the deadline when the circuit allows it, returns None when the fallback is needed."""
+        if not self.breaker.allow():
+            return None
+
+        try:
+            result = await asyncio.wait_for(call(), timeout)
+        except TimeoutError:
+            log.warning("Classifier timed out after %s seconds", timeout)
+            self.breaker.record_failure()
+            return None
+        except Exception:
+            log.exception("Classifier failed")
+            self.breaker.record_failure()
+            return None
+        except BaseException:
+            self.breaker.record_cancelled()
+            raise
+
+        self.breaker.record_success()
+        return (result,)
+
+    async def __call__(self, text: str) -> str | None:
+        result = await self._guard(lambda: self._adapter(text), self._timeout)
+        if result is not None:
+            return result[0]
+        if self._fallback is None:
+            return None
+
+        return await self._fallback(text)
+
+    async def classify_many(self, texts: Sequence[str]) -> list[str | None]:
+        """Classifies the texts in one call with the batch deadline, the whole batch falls back when it fails."""
+        result = await self._guard(lambda: self._adapter.classify_many(texts), self._batch_timeout)
+        if result is not None:
+            return result[0]
+        if self._fallback is None:
+            return [None] * len(texts)
+
+        return await self._fallback.classify_many(texts)
+
+
+class ClassificationNameCache(Generic[C]):
+    """Small cache of classifications by name, used by the classifier to skip the repository lookup."""
+
+    _cache: LRUCache[str, C]
+    _ttl: float
+    metrics: CacheMetrics
+
+    def __init__(self, ttl: float = 300.0, max_size: int = 512, clock: Callable[[], float] = time.monotonic) -> None:
+        self._cache = LRUCache(max_size, clock)
+        self._ttl = ttl
+        self.metrics = CacheMetrics()
+
+    def get(self, name: str) -> C | None:
+        classification = self._cache.get(name)
+        self.metrics.record(classification is not None)
+
+        return classification
+
+    def set(self, name: str, classification: C) -> None:
+        self._cache.set(name, classification, self._ttl)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+
+class ClassificationCatalog(BaseClassificationRepository[C]):
+    """Read-through in-memory catalog of all classifications, indexed by name and primary key, with their asset type
+    loaded. Lookups by name and primary key are answered from memory once the catalog is loaded, so classifying a text
+    does not touch the database in steady state. Other operations are passed on to the repository.
+    The catalog is reloaded on the first lookup after it is invalidated, which the classification actions do after a
+    change. Changes made by other processes are picked up after the time to live.
+    The cataloged classifications are shared, so actions that modify classifications should retrieve them from the
+    repository instead of the catalog."""
+
+    include: Include = ("asset_type",)
+    _repository: BaseClassificationRepository[C]
+    _ttl: float | None
+    _clock: Callable[[], float]
+    _by_name: dict[str, C]
+    _by_pk: dict[int, C]
+    _loaded_at: float | None
+    _generation: int
+    _lock: asyncio.Lock
+
+    def __init__(
+        self,
+        repository: BaseClassificationRepository[C],
+        ttl: float | None = 300.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._repository = repository
+        self._ttl = ttl
+        self._clock = clock
+        self._by_name = {}
+        self._by_pk = {}
+        self._loaded_at = None
+        self._generation = 0
+        self._lock = asyncio.Lock()
+
+    def _is_loaded(self) -> bool:
+        return self._loaded_at is not None and (self._ttl is None or self._clock() - self._loaded_at < self._ttl)
+
+    async def _load(self) -> None:
+        if self._is_loaded():
+            return
+
+        async with self._lock:
+            if self._is_loaded():
+                return
+
+            generation = self._generation
+            classifications = await self._repository.list(include=self.include)
+            self._by_name = {classification.name: classification for classification in classifications}
+            self._by_pk = {
+                self._repository.get_pk(classification): classification for classification in classifications
+            }
+
+            # A change during the load may not be part of the result, the next lookup has to load again
+            if generation == self._generation:
+                self._loaded_at = self._clock()
+
+    def invalidate(self) -> None:
+        self._generation += 1
+        self._loaded_at = None
+
+    async def find_by_name(self, name: str) -> C:
+        await self._load()
+        classification = self._by_name.get(name)
+        if classification is None:
+            raise NotFoundException(f"Failed to find classification with name '{name}'")
+
+        return classification
+
+    async def retrieve(self, pk: int, include: Include | None = None) -> C | None:
+        await self._load()
+        return self._by_pk.get(pk)
+
+    async def list(
+        self,
+        *,
+        limit: int | None = None,
+        offset: int | None = None,
+        sort_attribute_name: str | None = None,
+        sort_direction: SortingDirection | None = None,
+        filters: NameListFilters | None = None,
+        cursor: Cursor | None = None,
+        include: Include | None = None,
+    ) -> Sequence[C]:
+        return await self._repository.list(
+            limit=limit,
+            offset=offset,
+            sort_attribute_name=sort_attribute_name,
+            sort_direction=sort_direction,
+            filters=filters,
+            cursor=cursor,
+            include=include,
+        )
+
+    async def save(self, obj: C) -> None:
+        await self._repository.save(obj)
+        self.invalidate()
+
+    async def delete(self, pk: int) -> None:
+        await self._repository.delete(pk)
+        self.invalidate()
+
+    def get_pk(self, obj: C) -> int:
+        return self._repository.get_pk(obj)
+
+    def get_cursor(self, obj: C, sort_attribute_name: str | None = None) -> Cursor:
+        return self._repository.get_cursor(obj, sort_attribute_name)
+
 
 class Classifier(Generic[C]):
     _adapter: BaseClassifierAdapter
     _repository: BaseClassificationRepository[C]
+    _name_cache: ClassificationNameCache[C] | None
 
-    def __init__(self, adapter: BaseClassifierAdapter, repository: BaseClassificationRepository[C]):
+    def __init__(
+        self,
+        adapter: BaseClassifierAdapter,
+        repository: BaseClassificationRepository[C],
+        name_cache: ClassificationNameCache[C] | None = None,
+    ):
         self._adapter = adapter
         self._repository = repository
+        self._name_cache = name_cache
 
     async def __call__(self, text: str) -> C:
         name = await self._adapter(text)
         if name is None:
             raise ClassificationNotFoundException(text)
 
+        return await self._find_by_name(name)
+
+    async def classify_many(self, texts: Sequence[str]) -> list[C | None]:
+        """Classifies the texts in one adapter call, in the order of the texts. Instead of raising an exception, None is
+        returned for texts that could not be classified."""
+        names = await self._adapter.classify_many(texts)
+
+        classifications: dict[str, C | None] = {}
+        for name in dict.fromkeys(name for name in names if name is not None):
+            try:
+                classifications[name] = await self._find_by_name(name)
+            except ClassificationNotFoundException:
+                log.error("Classifier returned unknown classification '%s'", name)
+                classifications[name] = None
+
+        return [classifications[name] if name is not None else None for name in names]
+
+    async def _find_by_name(self, name: str) -> C:
+        if self._name_cache is not None:
+            cached = self._name_cache.get(name)
+            if cached is not None:
+                return cached
+
         try:
-            return await self._repository.find_by_name(name)
+            classification = await self._repository.find_by_name(name)
         except NotFoundException as exception:
             raise ClassificationNotFoundException() from exception
+
+        if self._name_cache is not None:
+            self._name_cache.set(name, classification)
+
+        return classification
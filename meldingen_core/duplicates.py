@@ -0,0 +1,141 @@
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Generic, TypeVar
+
+from meldingen_core.filters import MeldingListFilters
+from meldingen_core.models import Melding
+from meldingen_core.repositories import BaseMeldingRepository
+from meldingen_core.spatial import METERS_PER_DEGREE_LATITUDE, Point, Radius, SpatialGridIndex, haversine
+
+T = TypeVar("T", bound=Melding)
+
+
+@dataclass(frozen=True)
+class DuplicateCandidate(Generic[T]):
+    pk: int
+    melding: T
+    distance: float  # In meters
+
+
+@dataclass
+class _IndexedMelding:
+    location: Point
+    classification: str | None
+    created_at: datetime
+
+
+class DuplicateCandidateIndex(Generic[T]):
+    """In-memory spatial-temporal index of recent meldingen, used to find likely duplicates of a melding.
+    Meldingen are candidates when they have the same classification, are located within the radius and were created
+    within the time window of each other. Meldingen without a location are not indexed.
+    Only the keys the meldingen are found on are indexed, not the meldingen themselves, so the candidates have to be
+    retrieved from the repository. The index is per process, so it has to be rebuilt from the repository on startup."""
+
+    _get_location: Callable[[T], Point | None]  # Function to get the (longitude, latitude) of a melding
+    _get_created_at: Callable[[T], datetime]  # Function to get the creation time of a melding
+    _radius: float
+    _window: timedelta
+    _clock: Callable[[], datetime]
+    _grids: dict[str | None, SpatialGridIndex[int]]
+    _meldingen: dict[int, _IndexedMelding]
+    _next_prune: datetime
+
+    def __init__(
+        self,
+        get_location: Callable[[T], Point | None],
+        get_created_at: Callable[[T], datetime],
+        radius: float = 50.0,
+        window: timedelta = timedelta(hours=24),
+        clock: Callable[[], datetime] = datetime.now,
+    ) -> None:
+        self._get_location = get_location
+        self._get_created_at = get_created_at
+        self._radius = radius
+        self._window = window
+        self._clock = clock
+        self._grids = {}
+        self._meldingen = {}
+        self._next_prune = clock() + window
+
+    def __len__(self) -> int:
+        return len(self._meldingen)
+
+    def __contains__(self, pk: int) -> bool:
+        return pk in self._meldingen
+
+    def _grid(self, classification: str | None) -> SpatialGridIndex[int]:
+        grid = self._grids.get(classification)
+        if grid is None:
+            # Cells of about the size of the radius, a query then visits at most a few cells
+            grid = self._grids[classification] = SpatialGridIndex(max(self._radius, 1.0) / METERS_PER_DEGREE_LATITUDE)
+
+        return grid
+
+    def add(self, pk: int, melding: T) -> None:
+        """Indexes the melding or updates its entry, for example after its location or classification changed.
+        Meldingen older than the time window are pruned once per time window."""
+        if self._clock() >= self._next_prune:
+            self.prune()
+
+        self.remove(pk)
+
+        location = self._get_location(melding)
+        if location is None:
+            return
+
+        classification = melding.classification.name if melding.classification is not None else None
+        self._meldingen[pk] = _IndexedMelding(location, classification, self._get_created_at(melding))
+        self._grid(classification).insert(pk, location)
+
+    def remove(self, pk: int) -> None:
+        indexed = self._meldingen.pop(pk, None)
+        if indexed is not None:
+            self._grids[indexed.classification].remove(pk)
+
+    def prune(self) -> None:
+        """Removes the meldingen that are older than the time window."""
+        now = self._clock()
+        self._next_prune = now + self._window
+        oldest = now - self._window
+        for pk in [pk for pk, indexed in self._meldingen.items() if indexed.created_at < oldest]:
+            self.remove(pk)
+
+    def find(self, pk: int, melding: T) -> list[tuple[int, float]]:
+        """Returns the primary keys of the likely duplicates of the melding and their distance in meters, nearest
+        first."""
+        location = self._get_location(melding)
+        if location is None:
+            return []
+
+        classification = melding.classification.name if melding.classification is not None else None
+        grid = self._grids.get(classification)
+        if grid is None:
+            return []
+
+        created_at = self._get_created_at(melding)
+        candidates: list[tuple[int, float]] = []
+        for candidate_pk in grid.query(Radius(location, self._radius)):
+            indexed = self._meldingen[candidate_pk]
+            if candidate_pk == pk or abs(indexed.created_at - created_at) > self._window:
+                continue
+
+            candidates.append((candidate_pk, haversine(location, indexed.location)))
+
+        return sorted(candidates, key=lambda candidate: candidate[1])
+
+    def clear(self) -> None:
+        self._grids.clear()
+        self._meldingen.clear()
+
+    async def rebuild(self, repository: BaseMeldingRepository[T], batch_size: int = 500) -> None:
+        """Replaces the contents of the index with the meldingen created within the time window."""
+        self.clear()
+
+        meldingen = repository.stream_meldingen(
+            filters=MeldingListFilters(created_after=self._clock() - self._window),
+            batch_size=batch_size,
+            include=["classification"],
+        )
+        async for melding in meldingen:
+            self.add(repository.get_pk(melding), melding)
@@ -1,6 +1,9 @@
 from dataclasses import dataclass
+from datetime import datetime
 from typing import Sequence
 
+from meldingen_core.exceptions import InvalidInputException
+from meldingen_core.spatial import SpatialFilter
 from meldingen_core.statemachine import BaseMeldingState
 
 
@@ -11,5 +14,22 @@ class NameListFilters:
 
 @dataclass
 class MeldingListFilters:
+    """Filters for listing meldingen, all filters that are set have to match.
+    Filters on relationships take the ids of the related objects. Repositories must apply every filter in the query
+    instead of filtering the results afterwards, see the ADR on melding list filters for the indexes that back them."""
+
     area: str | None = None
+    within: SpatialFilter | None = None  # Meldingen located within the bounding box, polygon or radius
     states: Sequence[BaseMeldingState] | None = None
+    classifications: Sequence[int] | None = None
+    urgencies: Sequence[int] | None = None
+    labels: Sequence[int] | None = None  # Meldingen with at least one of the labels
+    sources: Sequence[int] | None = None
+    created_after: datetime | None = None  # Inclusive
+    created_before: datetime | None = None  # Exclusive
+    has_assets: bool | None = None
+
+    def __post_init__(self) -> None:
+        if self.created_after is not None and self.created_before is not None:
+            if self.created_after >= self.created_before:
+                raise InvalidInputException("created_after must be before created_before")
@@ -1,8 +1,21 @@
+import asyncio
+import hashlib
+import logging
 from abc import ABCMeta, abstractmethod  # pragma: no cover
+from collections.abc import Awaitable
+from datetime import datetime, timezone
+from pathlib import PurePosixPath
 from typing import AsyncIterator, Generic, TypeVar
+from uuid import uuid4
+
+from plugfs import filesystem
+from plugfs.filesystem import Filesystem
 
 from meldingen_core.malware import BaseMalwareScanner
-from meldingen_core.models import Attachment
+from meldingen_core.models import Attachment, AttachmentStatus
+from meldingen_core.repositories import BaseAttachmentRepository
+
+log = logging.getLogger(__name__)
 
 
 class BaseImageOptimizer(metaclass=ABCMeta):  # pragma: no cover
@@ -16,6 +29,7 @@ class BaseThumbnailGenerator(metaclass=ABCMeta):  # pragma: no cover
 
 
 T = TypeVar("T", bound=Attachment)
+R = TypeVar("R")
 
 
 class BaseIngestor(Generic[T], metaclass=ABCMeta):  # pragma: no cover
@@ -26,3 +40,170 @@ class BaseIngestor(Generic[T], metaclass=ABCMeta):  # pragma: no cover
 
     @abstractmethod
     async def __call__(self, attachment: T, data: AsyncIterator[bytes]) -> None: ...
+
+
+class AttachmentIngestionPipeline(BaseIngestor[T]):
+    """
+    Ingestor that writes the original file once and then runs the malware scan, the optimization and the thumbnail
+    generation concurrently, so ingesting takes as long as the slowest stage instead of the sum of all stages.
+    The optimized file and thumbnail are set on the attachment as soon as they are generated. A failing optimization
+    or thumbnail is logged and leaves its path empty. When the scan fails, the other stages are cancelled, all files
+    are deleted and the exception is raised.
+    The original can also be written on its own and processed later, see `DeferredUploadAttachmentAction`.
+    All uploads share the stage limit, which bounds the number of stages that run at the same time.
+    """
+
+    _filesystem: Filesystem
+    _base_directory: str
+    _optimize: BaseImageOptimizer
+    _generate_thumbnail: BaseThumbnailGenerator
+    _semaphore: asyncio.Semaphore
+
+    def __init__(
+        self,
+        scanner: BaseMalwareScanner,
+        optimizer: BaseImageOptimizer,
+        thumbnail_generator: BaseThumbnailGenerator,
+        filesystem: Filesystem,
+        base_directory: str,
+        max_concurrent_stages: int = 8,
+    ):
+        super().__init__(scanner)
+        self._optimize = optimizer
+        self._generate_thumbnail = thumbnail_generator
+        self._filesystem = filesystem
+        self._base_directory = base_directory
+        self._semaphore = asyncio.Semaphore(max_concurrent_stages)
+
+    def _get_file_path(self, attachment: T) -> str:
+        """The original filename is not used in the path, only its extension."""
+        extension = PurePosixPath(attachment.original_filename).suffix
+        return f"{self._base_directory.rstrip('/')}/{uuid4().hex}{extension}"
+
+    async def _run_stage(self, stage: Awaitable[R]) -> R:
+        async with self._semaphore:
+            return await stage
+
+    async def _optimize_stage(self, attachment: T) -> None:
+        try:
+            path, media_type = await self._run_stage(self._optimize(attachment.file_path))
+        except Exception:
+            log.exception("Failed to optimize attachment")
+            return
+
+        attachment.optimized_path = path
+        attachment.optimized_media_type = media_type
+
+    async def _thumbnail_stage(self, attachment: T) -> None:
+        try:
+            path, media_type = await self._run_stage(self._generate_thumbnail(attachment.file_path))
+        except Exception:
+            log.exception("Failed to generate thumbnail for attachment")
+            return
+
+        attachment.thumbnail_path = path
+        attachment.thumbnail_media_type = media_type
+
+    async def _delete_file(self, path: str) -> None:
+        try:
+            await self._filesystem.delete(path)
+        except filesystem.NotFoundException:
+            pass
+
+    async def delete(self, attachment: T) -> None:
+        """Deletes the original file of the attachment."""
+        await self._delete_file(attachment.file_path)
+
+    async def delete_derived(self, attachment: T) -> None:
+        """Deletes the optimized file and thumbnail of the attachment and clears their paths."""
+        for path in (attachment.optimized_path, attachment.thumbnail_path):
+            if path is not None:
+                await self._delete_file(path)
+        attachment.optimized_path = attachment.optimized_media_type = None
+        attachment.thumbnail_path = attachment.thumbnail_media_type = None
+
+    async def write(self, attachment: T, data: AsyncIterator[bytes]) -> bool:
+        """Writes the original file of the attachment, returns whether it still has to be processed."""
+        attachment.file_path = self._get_file_path(attachment)
+        await self._filesystem.write_iterator(attachment.file_path, data)
+        attachment.created_at = datetime.now(timezone.utc)
+
+        return True
+
+    async def process(self, attachment: T) -> None:
+        """Scans, optimizes and generates the thumbnail of the written original. When the scan fails, the optimized
+        file and thumbnail are deleted, deleting the original is left to the caller."""
+        stages = [
+            asyncio.create_task(self._optimize_stage(attachment)),
+            asyncio.create_task(self._thumbnail_stage(attachment)),
+        ]
+
+        try:
+            await self._run_stage(self._scan_for_malware(attachment.file_path))
+        except BaseException:
+            for stage in stages:
+                stage.cancel()
+            await asyncio.gather(*stages, return_exceptions=True)
+            await self.delete_derived(attachment)
+            raise
+
+        await asyncio.gather(*stages)
+
+    async def __call__(self, attachment: T, data: AsyncIterator[bytes]) -> None:
+        if not await self.write(attachment, data):
+            return
+
+        try:
+            await self.process(attachment)
+        except BaseException:
+            await self.delete(attachment)
+            raise
+
+
+class ContentAddressedIngestionPipeline(AttachmentIngestionPipeline[T]):
+    """
+    Pipeline that stores every distinct file once. The upload is hashed while it is written, when a ready attachment
+    with the same digest exists, the new upload is discarded and the attachment shares the original, optimized file
+    and thumbnail of the existing attachment, which were already scanned and generated.
+    Shared files are reference counted by the attachments that point to them, see `DeleteAttachmentAction`.
+    """
+
+    _attachment_repository: BaseAttachmentRepository[T]
+
+    def __init__(
+        self,
+        scanner: BaseMalwareScanner,
+        optimizer: BaseImageOptimizer,
+        thumbnail_generator: BaseThumbnailGenerator,
+        filesystem: Filesystem,
+        base_directory: str,
+        attachment_repository: BaseAttachmentRepository[T],
+        max_concurrent_stages: int = 8,
+    ):
+        super().__init__(scanner, optimizer, thumbnail_generator, filesystem, base_directory, max_concurrent_stages)
+        self._attachment_repository = attachment_repository
+
+    async def write(self, attachment: T, data: AsyncIterator[bytes]) -> bool:
+        hasher = hashlib.sha256()
+
+        async def hashed() -> AsyncIterator[bytes]:
+            async for chunk in data:
+                hasher.update(chunk)
+                yield chunk
+
+        await super().write(attachment, hashed())
+        attachment.digest = hasher.hexdigest()
+
+        existing = await self._attachment_repository.find_by_digest(attachment.digest)
+        if existing is None:
+            return True
+
+        await self.delete(attachment)
+        attachment.file_path = existing.file_path
+        attachment.optimized_path = existing.optimized_path
+        attachment.optimized_media_type = existing.optimized_media_type
+        attachment.thumbnail_path = existing.thumbnail_path
+        attachment.thumbnail_media_type = existing.thumbnail_media_type
+        attachment.status = AttachmentStatus.READY
+
+        return False
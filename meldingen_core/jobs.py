@@ -0,0 +1,100 @@
+import asyncio
+import logging
+from abc import ABCMeta, abstractmethod
+
+log = logging.getLogger(__name__)
+
+
+class BaseJob(metaclass=ABCMeta):
+    @abstractmethod
+    async def __call__(self) -> None:
+        """Runs the job, an exception makes the queue retry it."""
+
+    async def failed(self, exception: Exception) -> None:
+        """Called when the job failed on its last attempt, for example to mark the work as failed."""
+
+
+class BaseJobQueue(metaclass=ABCMeta):
+    @abstractmethod
+    async def enqueue(self, job: BaseJob) -> None:
+        """Schedules the job to run in the background."""
+
+
+class AsyncioJobQueue(BaseJobQueue):
+    """
+    In-process job queue that runs jobs on a pool of asyncio workers. Failed jobs are retried up to `max_attempts`
+    times, with a delay that doubles after every attempt. Jobs that are still queued when the process stops are lost,
+    use a persistent queue when that is not acceptable.
+    """
+
+    _workers: int
+    _max_attempts: int
+    _retry_delay: float
+    _queue: asyncio.Queue[tuple[BaseJob, int]]
+    _tasks: list[asyncio.Task[None]]
+    _retries: set[asyncio.Task[None]]
+
+    def __init__(self, workers: int = 4, max_attempts: int = 3, retry_delay: float = 1.0, max_size: int = 0) -> None:
+        self._workers = workers
+        self._max_attempts = max_attempts
+        self._retry_delay = retry_delay
+        self._queue = asyncio.Queue(max_size)
+        self._tasks = []
+        self._retries = set()
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._work()) for _ in range(self._workers)]
+
+    async def join(self) -> None:
+        """Waits until every job, including the retries, has completed or failed."""
+        while True:
+            await self._queue.join()
+            if not self._retries:
+                return
+
+            # A retry puts its job back on the queue before it is done
+            await asyncio.gather(*self._retries)
+
+    async def stop(self) -> None:
+        """Stops the workers after the jobs they are running, jobs that are still queued are not run."""
+        for task in [*self._tasks, *self._retries]:
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._retries, return_exceptions=True)
+        self._tasks = []
+        self._retries = set()
+
+    async def enqueue(self, job: BaseJob) -> None:
+        await self._queue.put((job, 1))
+
+    async def _retry(self, job: BaseJob, attempt: int) -> None:
+        await asyncio.sleep(self._retry_delay * 2 ** (attempt - 2))
+        await self._queue.put((job, attempt))
+
+    async def _work(self) -> None:
+        while True:
+            job, attempt = await self._queue.get()
+            try:
+                await job()
+            except Exception as exception:
+                if attempt < self._max_attempts:
+                    log.warning("Job %r failed on attempt %d, retrying", job, attempt)
+                    retry = asyncio.create_task(self._retry(job, attempt + 1))
+                    self._retries.add(retry)
+                    retry.add_done_callback(self._retries.discard)
+                else:
+                    log.exception("Job %r failed after %d attempts", job, attempt)
+                    await self._run_failed(job, exception)
+            finally:
+                self._queue.task_done()
+
+    @staticmethod
+    async def _run_failed(job: BaseJob, exception: Exception) -> None:
+        try:
+            await job.failed(exception)
+        except Exception:
+            log.exception("Failure handler of job %r failed", job)
@@ -1,6 +1,7 @@
 from collections.abc import Sequence
 from dataclasses import dataclass, field
 from datetime import datetime
+from enum import StrEnum
 from typing import Any, MutableSequence, TypeAlias
 
 AssetTypeArguments: TypeAlias = dict[str, Any]
@@ -49,6 +50,7 @@ class Melding:
     urgency: int = 0  # Expected values: -1 (less urgent), 0 (default), 1 (more urgent)
     labels: Sequence[Label] = field(default_factory=list)
     source: Source | None = None
+    token_digest: str | None = None
 
 
 @dataclass
@@ -85,6 +87,12 @@ class Answer:
     melding: Melding
 
 
+class AttachmentStatus(StrEnum):
+    PROCESSING = "processing"
+    READY = "ready"
+    FAILED = "failed"
+
+
 @dataclass
 class Attachment:
     file_path: str = field(init=False)
@@ -95,6 +103,9 @@ class Attachment:
     optimized_media_type: str | None = None
     thumbnail_path: str | None = None
     thumbnail_media_type: str | None = None
+    status: str = AttachmentStatus.READY
+    digest: str | None = None  # SHA-256 of the original file, set by content-addressed ingestion
+    created_at: datetime | None = None  # When the original file was written, files are not changed afterwards
 
 
 @dataclass
@@ -0,0 +1,114 @@
+import base64
+import binascii
+import json
+from collections.abc import AsyncIterator, Callable, Sequence
+from dataclasses import dataclass, replace
+from datetime import datetime
+from typing import Any, Generic, TypeVar
+
+from meldingen_core import SortingDirection
+from meldingen_core.exceptions import InvalidInputException
+
+T = TypeVar("T")
+
+
+class InvalidCursorException(InvalidInputException): ...
+
+
+@dataclass(frozen=True)
+class Cursor:
+    """Position in a list sorted on an attribute, the primary key is used as tie-breaker.
+    Repositories fetch the rows after the cursor with a keyset predicate like `(sort_value, pk) > (:sort_value, :pk)`,
+    which costs the same for every page, unlike an offset. The sort direction is part of the cursor, because the
+    predicate is reversed for a descending list, so a cursor cannot be used for a list in the other direction."""
+
+    sort_attribute_name: str | None
+    sort_value: Any
+    pk: int
+    sort_direction: SortingDirection | None = None
+
+
+@dataclass(frozen=True)
+class Page(Generic[T]):
+    items: Sequence[T]
+    next_cursor: str | None = None
+
+
+def encode_cursor(cursor: Cursor) -> str:
+    """Encodes the cursor as an opaque, URL-safe string."""
+    sort_value = cursor.sort_value
+    if isinstance(sort_value, datetime):
+        sort_value = {"datetime": sort_value.isoformat()}
+
+    data = json.dumps([cursor.sort_attribute_name, sort_value, cursor.pk, cursor.sort_direction], separators=(",", ":"))
+
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+
+def decode_cursor(value: str) -> Cursor:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(value + "=" * (-len(value) % 4)))
+        sort_attribute_name, sort_value, pk, sort_direction = data
+        if isinstance(sort_value, dict):
+            sort_value = datetime.fromisoformat(sort_value["datetime"])
+        if sort_direction is not None:
+            sort_direction = SortingDirection(sort_direction)
+    except (binascii.Error, UnicodeDecodeError, KeyError, TypeError, ValueError) as exception:
+        raise InvalidCursorException("Invalid cursor") from exception
+
+    if not isinstance(pk, int) or not (sort_attribute_name is None or isinstance(sort_attribute_name, str)):
+        raise InvalidCursorException("Invalid cursor")
+
+    return Cursor(sort_attribute_name, sort_value, pk, sort_direction)
+
+
+def parse_cursor(
+    value: str | None, sort_attribute_name: str | None, sort_direction: SortingDirection | None = None
+) -> Cursor | None:
+    """Decodes the cursor and checks that it was produced for the same sort attribute and direction, a missing
+    direction is ascending."""
+    if value is None:
+        return None
+
+    cursor = decode_cursor(value)
+    if cursor.sort_attribute_name != sort_attribute_name:
+        raise InvalidCursorException("Cursor does not match the sort attribute")
+    if (cursor.sort_direction or SortingDirection.ASC) != (sort_direction or SortingDirection.ASC):
+        raise InvalidCursorException("Cursor does not match the sort direction")
+
+    return cursor
+
+
+def validate_limit(limit: int) -> None:
+    if limit < 1:
+        raise InvalidInputException("Limit must be at least 1")
+
+
+def create_page(
+    items: Sequence[T],
+    limit: int,
+    get_cursor: Callable[[T], Cursor],
+    sort_direction: SortingDirection | None = None,
+) -> Page[T]:
+    """Creates a page from the result of a query for `limit + 1` items. The extra item only signals that there is a
+    next page, so no cursor is returned for the last page. The sort direction is stored in the cursor."""
+    validate_limit(limit)
+    if len(items) <= limit:
+        return Page(items)
+
+    cursor = replace(get_cursor(items[limit - 1]), sort_direction=sort_direction)
+
+    return Page(items[:limit], encode_cursor(cursor))
+
+
+async def chunk(iterator: AsyncIterator[T], size: int) -> AsyncIterator[list[T]]:
+    """Groups the items of the iterator into lists of at most `size` items."""
+    items: list[T] = []
+    async for item in iterator:
+        items.append(item)
+        if len(items) == size:
+            yield items
+            items = []
+
+    if items:
+        yield items
@@ -0,0 +1,76 @@
+from collections.abc import Callable, Sequence
+from typing import Literal, TypeAlias, TypedDict, TypeVar, cast, get_args
+
+from meldingen_core.exceptions import InvalidInputException
+from meldingen_core.models import Melding
+
+T = TypeVar("T", bound=Melding)
+
+MeldingField: TypeAlias = Literal[
+    "id",
+    "text",
+    "state",
+    "classification",
+    "urgency",
+    "street",
+    "house_number",
+    "house_number_addition",
+    "postal_code",
+    "city",
+    "email",
+    "phone",
+    "source",
+]
+MeldingProjection: TypeAlias = Sequence[MeldingField]
+
+MELDING_FIELDS: tuple[MeldingField, ...] = get_args(MeldingField)
+
+
+class MeldingRow(TypedDict, total=False):
+    """Lightweight row that only contains the projected columns of a melding.
+    Relationships are flattened to their name."""
+
+    id: int
+    text: str
+    state: str | None
+    classification: str | None
+    urgency: int
+    street: str | None
+    house_number: int | None
+    house_number_addition: str | None
+    postal_code: str | None
+    city: str | None
+    email: str | None
+    phone: str | None
+    source: str | None
+
+
+class InvalidProjectionException(InvalidInputException): ...
+
+
+def parse_projection(fields: Sequence[str]) -> MeldingProjection:
+    """Checks that the projection only contains known fields, the order of the fields is kept."""
+    if not fields:
+        raise InvalidProjectionException("Projection must contain at least one field")
+
+    unknown = [field for field in fields if field not in MELDING_FIELDS]
+    if unknown:
+        raise InvalidProjectionException(f"Unknown fields in projection: {', '.join(unknown)}")
+
+    return cast(MeldingProjection, list(dict.fromkeys(fields)))
+
+
+def project_melding(melding: T, fields: MeldingProjection, get_pk: Callable[[T], int]) -> MeldingRow:
+    """Projects a hydrated melding onto a row, the primary key is read with `get_pk`, see `BaseRepository.get_pk`."""
+    row: dict[str, object] = {}
+    for field in fields:
+        if field == "id":
+            row[field] = get_pk(melding)
+        elif field == "classification":
+            row[field] = melding.classification.name if melding.classification is not None else None
+        elif field == "source":
+            row[field] = melding.source.name if melding.source is not None else None
+        else:
+            row[field] = getattr(melding, field)
+
+    return cast(MeldingRow, row)
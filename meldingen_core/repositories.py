@@ -1,8 +1,12 @@
+import hmac
 from abc import ABCMeta, abstractmethod
-from collections.abc import Sequence
-from typing import Generic, TypeVar
+from collections import Counter
+from collections.abc import AsyncIterator, Mapping, Sequence
+from dataclasses import replace
+from typing import Generic, TypeAlias, TypeVar
 
 from meldingen_core import SortingDirection
+from meldingen_core.aggregates import FacetCounts, FacetValue, MeldingFacet, facet_value
 from meldingen_core.filters import MeldingListFilters, NameListFilters
 from meldingen_core.models import (
     Answer,
@@ -18,9 +22,15 @@ from meldingen_core.models import (
     Source,
     User,
 )
+from meldingen_core.pagination import Cursor
+from meldingen_core.projection import MeldingProjection, MeldingRow, project_melding
 
 T = TypeVar("T")
 
+# Relationships to load together with the objects, nested relationships are separated by dots,
+# for example ("classification.asset_type", "labels", "assets")
+Include: TypeAlias = Sequence[str]
+
 
 class BaseRepository(Generic[T], metaclass=ABCMeta):
     @abstractmethod
@@ -35,14 +45,55 @@ class BaseRepository(Generic[T], metaclass=ABCMeta):
         sort_attribute_name: str | None = None,
         sort_direction: SortingDirection | None = None,
         filters: NameListFilters | None = None,
+        cursor: Cursor | None = None,
+        include: Include | None = None,
     ) -> Sequence[T]: ...
 
     @abstractmethod
-    async def retrieve(self, pk: int) -> T | None: ...
+    async def retrieve(self, pk: int, include: Include | None = None) -> T | None:
+        """Retrieve an object by its primary key. Backends should load the included relationships in the same
+        round-trip."""
 
     @abstractmethod
     async def delete(self, pk: int) -> None: ...
 
+    def get_pk(self, obj: T) -> int:
+        """Returns the primary key of a saved object. By default it is read from the `id` attribute, backends that
+        store the primary key elsewhere should override this."""
+        pk: int = getattr(obj, "id")
+        return pk
+
+    def get_cursor(self, obj: T, sort_attribute_name: str | None = None) -> Cursor:
+        """Produces the cursor that points at the given object, for keyset pagination.
+        By default the sort value is read from the object's attribute and the primary key from `get_pk`."""
+        pk = self.get_pk(obj)
+        sort_value = getattr(obj, sort_attribute_name) if sort_attribute_name is not None else pk
+
+        return Cursor(sort_attribute_name, sort_value, pk)
+
+    async def retrieve_many(self, pks: Sequence[int], include: Include | None = None) -> Mapping[int, T]:
+        """Retrieve multiple objects by their primary keys, objects that cannot be found are left out.
+        Backends should override this with a single query, by default the objects are retrieved one by one."""
+        objects: dict[int, T] = {}
+        for pk in pks:
+            obj = await self.retrieve(pk, include)
+            if obj is not None:
+                objects[pk] = obj
+
+        return objects
+
+    async def save_many(self, objs: Sequence[T]) -> None:
+        """Save multiple objects. Backends should override this with a single (multi-row) statement,
+        by default the objects are saved one by one."""
+        for obj in objs:
+            await self.save(obj)
+
+    async def delete_many(self, pks: Sequence[int]) -> None:
+        """Delete multiple objects by their primary keys. Backends should override this with a single statement,
+        by default the objects are deleted one by one."""
+        for pk in pks:
+            await self.delete(pk)
+
 
 M = TypeVar("M", bound=Melding)
 
@@ -57,7 +108,108 @@ class BaseMeldingRepository(BaseRepository[M], metaclass=ABCMeta):
         sort_attribute_name: str | None = None,
         sort_direction: SortingDirection | None = None,
         filters: MeldingListFilters | None = None,
-    ) -> Sequence[M]: ...
+        cursor: Cursor | None = None,
+        include: Include | None = None,
+    ) -> Sequence[M]:
+        """List meldingen that match all filters. Every filter must be applied in the query, so that the limit, the
+        cursor and the aggregates built on top of this method are correct and the filters can use the indexes."""
+
+    async def list_melding_rows(
+        self,
+        *,
+        fields: MeldingProjection,
+        limit: int | None = None,
+        offset: int | None = None,
+        sort_attribute_name: str | None = None,
+        sort_direction: SortingDirection | None = None,
+        filters: MeldingListFilters | None = None,
+        cursor: Cursor | None = None,
+    ) -> Sequence[MeldingRow]:
+        """List meldingen as rows that only contain the given fields.
+        Backends should override this to only select the projected columns and join the projected relationships,
+        by default full meldingen are listed and projected afterwards."""
+        include = [field for field in fields if field in ("classification", "source")]
+        meldingen = await self.list_meldingen(
+            limit=limit,
+            offset=offset,
+            sort_attribute_name=sort_attribute_name,
+            sort_direction=sort_direction,
+            filters=filters,
+            cursor=cursor,
+            include=include,
+        )
+
+        return [project_melding(melding, fields, self.get_pk) for melding in meldingen]
+
+    async def stream_meldingen(
+        self,
+        *,
+        sort_attribute_name: str | None = None,
+        sort_direction: SortingDirection | None = None,
+        filters: MeldingListFilters | None = None,
+        batch_size: int = 500,
+        include: Include | None = None,
+    ) -> AsyncIterator[M]:
+        """Yields all meldingen that match the filters without loading them into memory at once.
+        Backends should override this with a server-side cursor, by default the meldingen are fetched in batches
+        using keyset pagination."""
+        cursor = None
+        while True:
+            meldingen = await self.list_meldingen(
+                limit=batch_size,
+                sort_attribute_name=sort_attribute_name,
+                sort_direction=sort_direction,
+                filters=filters,
+                cursor=cursor,
+                include=include,
+            )
+            for melding in meldingen:
+                yield melding
+
+            if len(meldingen) < batch_size:
+                return
+
+            # The direction is part of the cursor, as in the cursors of the pages of a keyset list
+            cursor = replace(self.get_cursor(meldingen[-1], sort_attribute_name), sort_direction=sort_direction)
+
+    async def count_meldingen(self, filters: MeldingListFilters | None = None) -> int:
+        """Count the meldingen that match the filters.
+        Backends should override this with a count query, by default the meldingen are streamed and counted."""
+        total = 0
+        async for _ in self.stream_meldingen(filters=filters):
+            total += 1
+
+        return total
+
+    async def facet_meldingen(
+        self, filters: MeldingListFilters | None = None, facets: Sequence[MeldingFacet] = ()
+    ) -> FacetCounts:
+        """Count the meldingen that match the filters per value of each facet.
+        Every matching melding has to be counted once per facet, meldingen without a value are counted under None.
+        Backends should override this with a grouped aggregate query, by default the meldingen are streamed and
+        counted in a single pass."""
+        counts: dict[MeldingFacet, Counter[FacetValue]] = {facet: Counter() for facet in facets}
+        if not counts:
+            return counts
+
+        include = ["classification"] if "classification" in counts else None
+        async for melding in self.stream_meldingen(filters=filters, include=include):
+            for facet, counter in counts.items():
+                counter[facet_value(melding, facet)] += 1
+
+        return counts
+
+    async def find_by_id_and_token_digest(self, pk: int, token_digest: str, include: Include | None = None) -> M | None:
+        """Find a melding by its id and token digest, returns None if there is no such melding.
+        Backends should override this with a single query on an indexed digest column."""
+        melding = await self.retrieve(pk, include)
+        if melding is None or melding.token_digest is None:
+            return None
+
+        if not hmac.compare_digest(melding.token_digest.encode(), token_digest.encode()):
+            return None
+
+        return melding
 
 
 class BaseUserRepository(BaseRepository[User], metaclass=ABCMeta):
@@ -99,6 +251,17 @@ class BaseAttachmentRepository(BaseRepository[A], metaclass=ABCMeta):
     @abstractmethod
     async def find_by_melding(self, melding_id: int) -> Sequence[A]: ...
 
+    async def find_by_digest(self, digest: str) -> A | None:
+        """Find a ready attachment with the digest, its files can be shared with a new attachment with the same
+        content. By default no attachment is found, so files are not shared. Backends that are used with the
+        content-addressed ingestion pipeline must override this and `count_by_file_path`."""
+        return None
+
+    async def count_by_file_path(self, file_path: str) -> int:
+        """Count the attachments that share the original file, which is the reference count of the file.
+        By default every attachment has its own files."""
+        return 1
+
 
 AT = TypeVar("AT", bound=AssetType)
 
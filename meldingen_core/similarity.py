@@ -0,0 +1,198 @@
+import hashlib
+import operator
+import re
+import time
+from array import array
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Generic, TypeVar
+
+from meldingen_core.filters import MeldingListFilters
+from meldingen_core.models import Melding
+from meldingen_core.repositories import BaseMeldingRepository
+
+K = TypeVar("K", bound=Hashable)
+T = TypeVar("T")
+M = TypeVar("M", bound=Melding)
+
+
+def shingles(text: str, size: int = 5) -> set[str]:
+    """Character shingles of the text after lowercasing it and removing punctuation and repeated whitespace."""
+    normalized = " ".join(re.findall(r"\w+", text.lower()))
+    if len(normalized) <= size:
+        return {normalized}
+
+    return {normalized[i : i + size] for i in range(len(normalized) - size + 1)}
+
+
+def jaccard(a: set[str], b: set[str]) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+class MinHasher:
+    """Computes MinHash signatures of texts, the fraction of equal values in two signatures estimates the Jaccard
+    similarity of the shingles of the texts. Signatures are only comparable when they use the same seed.
+    Instead of permuting one hash per shingle, every shingle is hashed once with SHAKE-128, whose output provides an
+    independent 32-bit hash value per permutation. This keeps the per-shingle work in C."""
+
+    _num_perm: int
+    _seed: bytes
+    _shingle_size: int
+
+    def __init__(self, num_perm: int = 128, shingle_size: int = 5, seed: int = 1) -> None:
+        self._num_perm = num_perm
+        self._seed = seed.to_bytes(8, "little")
+        self._shingle_size = shingle_size
+
+    @property
+    def num_perm(self) -> int:
+        return self._num_perm
+
+    def __call__(self, text: str) -> array[int]:
+        # The hash values of all shingles one after another, the values of permutation i are at i, i + num_perm, ...
+        values = array(
+            "I",
+            b"".join(
+                hashlib.shake_128(self._seed + shingle.encode()).digest(4 * self._num_perm)
+                for shingle in shingles(text, self._shingle_size)
+            ),
+        )
+
+        return array("I", (min(values[i :: self._num_perm]) for i in range(self._num_perm)))
+
+
+def estimate_similarity(a: array[int], b: array[int]) -> float:
+    equal: int = sum(map(operator.eq, a, b))
+
+    return equal / len(a)
+
+
+@dataclass
+class _Entry:
+    signature: array[int]
+    added_at: float
+
+
+class MinHashLSHIndex(Generic[K]):
+    """Index of MinHash signatures that finds similar texts without comparing them pairwise.
+    Signatures are split into bands, texts that share at least one band are candidates. With b bands of r rows, texts
+    with a similarity s become candidates with a probability of 1 - (1 - s^r)^b, the default of 32 bands of 4 rows
+    finds texts with a similarity of 0.5 with a probability of over 0.85 and 0.7 with over 0.999.
+    The index keeps at most `max_size` texts, the texts that were added or updated least recently are evicted first.
+    Texts keep the time they were added, or the given creation time, when they are updated, which is used to only query
+    recent texts. The index is per process, so it has to be rebuilt from the repository on startup."""
+
+    _hasher: MinHasher
+    _bands: int
+    _rows: int
+    _max_size: int
+    _clock: Callable[[], float]
+    _entries: OrderedDict[K, _Entry]
+    _buckets: dict[tuple[int, bytes], set[K]]
+
+    def __init__(
+        self,
+        hasher: MinHasher | None = None,
+        bands: int = 32,
+        max_size: int = 100_000,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self._hasher = hasher if hasher is not None else MinHasher()
+        if self._hasher.num_perm % bands != 0:
+            raise ValueError("The number of permutations must be a multiple of the number of bands")
+
+        self._bands = bands
+        self._rows = self._hasher.num_perm // bands
+        self._max_size = max_size
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._buckets = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._entries
+
+    def _band_keys(self, signature: array[int]) -> list[tuple[int, bytes]]:
+        return [(band, signature[band * self._rows : (band + 1) * self._rows].tobytes()) for band in range(self._bands)]
+
+    def add(self, key: K, text: str, added_at: float | None = None) -> None:
+        """Indexes the text under the key, a text that was indexed under the same key is replaced.
+        The time the text was created, in seconds since the epoch, defaults to the time it was first added."""
+        if added_at is None:
+            previous = self._entries.get(key)
+            added_at = previous.added_at if previous is not None else self._clock()
+        self.remove(key)
+
+        signature = self._hasher(text)
+        self._entries[key] = _Entry(signature, added_at)
+        for band_key in self._band_keys(signature):
+            self._buckets.setdefault(band_key, set()).add(key)
+
+        while len(self._entries) > self._max_size:
+            self.remove(next(iter(self._entries)))
+
+    def remove(self, key: K) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+
+        for band_key in self._band_keys(entry.signature):
+            bucket = self._buckets[band_key]
+            bucket.discard(key)
+            if not bucket:
+                del self._buckets[band_key]
+
+    def query(self, text: str, threshold: float = 0.5, max_age: float | None = None) -> list[tuple[K, float]]:
+        """Returns the keys of the texts with an estimated similarity of at least the threshold, most similar first.
+        When a maximum age in seconds is given, only texts that were added within that time are returned."""
+        signature = self._hasher(text)
+        oldest = self._clock() - max_age if max_age is not None else None
+
+        candidates: set[K] = set()
+        for band_key in self._band_keys(signature):
+            candidates.update(self._buckets.get(band_key, ()))
+
+        results = []
+        for key in candidates:
+            entry = self._entries[key]
+            if oldest is not None and entry.added_at < oldest:
+                continue
+
+            similarity = estimate_similarity(signature, entry.signature)
+            if similarity >= threshold:
+                results.append((key, similarity))
+
+        return sorted(results, key=lambda result: result[1], reverse=True)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._buckets.clear()
+
+    async def rebuild(
+        self: "MinHashLSHIndex[int]",
+        repository: BaseMeldingRepository[M],
+        get_created_at: Callable[[M], datetime],
+        max_age: float | None = None,
+        batch_size: int = 500,
+    ) -> None:
+        """Replaces the contents of the index with the texts of the meldingen, keyed on their primary key.
+        When a maximum age in seconds is given, only the meldingen created within that time are indexed."""
+        self.clear()
+
+        filters = None
+        if max_age is not None:
+            filters = MeldingListFilters(created_after=datetime.fromtimestamp(self._clock() - max_age))
+
+        async for melding in repository.stream_meldingen(filters=filters, batch_size=batch_size):
+            self.add(repository.get_pk(melding), melding.text, get_created_at(melding).timestamp())
+
+
+@dataclass(frozen=True)
+class SimilarMelding(Generic[T]):
+    pk: int
+    melding: T
+    similarity: float
@@ -0,0 +1,230 @@
+import json
+import math
+import re
+from collections.abc import Hashable, Mapping, Sequence
+from dataclasses import dataclass
+from typing import Any, Generic, TypeAlias, TypeVar
+
+from meldingen_core.exceptions import InvalidInputException
+
+# Coordinates are (x, y) pairs, for WGS84 that is (longitude, latitude) like in GeoJSON
+Point: TypeAlias = tuple[float, float]
+Ring: TypeAlias = tuple[Point, ...]
+
+EARTH_RADIUS = 6_371_008.8
+METERS_PER_DEGREE_LATITUDE = 111_320.0
+
+
+class InvalidSpatialFilterException(InvalidInputException): ...
+
+
+@dataclass(frozen=True)
+class BoundingBox:
+    """Bounding box in the axis order of the coordinate reference system it is used with."""
+
+    min_x: float
+    min_y: float
+    max_x: float
+    max_y: float
+
+    def bbox(self) -> "BoundingBox":
+        return self
+
+    def contains(self, point: Point) -> bool:
+        x, y = point
+        return self.min_x <= x <= self.max_x and self.min_y <= y <= self.max_y
+
+
+def _ring_contains(ring: Ring, point: Point) -> bool:
+    """Even-odd ray casting, the ring does not have to be closed."""
+    x, y = point
+    inside = False
+    previous_x, previous_y = ring[-1]
+    for current_x, current_y in ring:
+        if (current_y > y) != (previous_y > y):
+            crossing_x = previous_x + (y - previous_y) * (current_x - previous_x) / (current_y - previous_y)
+            if x < crossing_x:
+                inside = not inside
+
+        previous_x, previous_y = current_x, current_y
+
+    return inside
+
+
+def _parse_ring(coordinates: Sequence[Sequence[float]]) -> Ring:
+    ring = tuple((float(x), float(y)) for x, y in coordinates)
+    if len(ring) < 3:
+        raise InvalidSpatialFilterException("A polygon ring needs at least 3 coordinates")
+
+    return ring
+
+
+@dataclass(frozen=True)
+class Polygon:
+    """Planar polygon with optional holes, in the axis order of the coordinate reference system it is used with."""
+
+    exterior: Ring
+    holes: tuple[Ring, ...] = ()
+
+    @classmethod
+    def from_wkt(cls, wkt: str) -> "Polygon":
+        match = re.fullmatch(r"\s*POLYGON\s*\((.*)\)\s*", wkt, re.IGNORECASE | re.DOTALL)
+        if match is None:
+            raise InvalidSpatialFilterException("WKT is not a polygon")
+
+        try:
+            rings = [
+                _parse_ring([pair.split() for pair in ring.split(",")])
+                for ring in re.findall(r"\(([^()]*)\)", match.group(1))
+            ]
+        except ValueError as exception:
+            raise InvalidSpatialFilterException("Invalid WKT coordinates") from exception
+
+        if not rings:
+            raise InvalidSpatialFilterException("WKT polygon has no rings")
+
+        return cls(rings[0], tuple(rings[1:]))
+
+    @classmethod
+    def from_geojson(cls, geometry: Mapping[str, Any] | str) -> "Polygon":
+        try:
+            if isinstance(geometry, str):
+                geometry = json.loads(geometry)
+            if not isinstance(geometry, Mapping) or geometry.get("type") != "Polygon":
+                raise InvalidSpatialFilterException("GeoJSON geometry is not a polygon")
+
+            rings = [_parse_ring(ring) for ring in geometry["coordinates"]]
+        except (KeyError, TypeError, ValueError) as exception:
+            raise InvalidSpatialFilterException("Invalid GeoJSON polygon") from exception
+
+        if not rings:
+            raise InvalidSpatialFilterException("GeoJSON polygon has no rings")
+
+        return cls(rings[0], tuple(rings[1:]))
+
+    def bbox(self) -> BoundingBox:
+        xs = [x for x, _ in self.exterior]
+        ys = [y for _, y in self.exterior]
+
+        return BoundingBox(min(xs), min(ys), max(xs), max(ys))
+
+    def contains(self, point: Point) -> bool:
+        return _ring_contains(self.exterior, point) and not any(_ring_contains(hole, point) for hole in self.holes)
+
+
+@dataclass(frozen=True)
+class Radius:
+    """Circle around a WGS84 (longitude, latitude) point, the distance is in meters."""
+
+    center: Point
+    distance: float
+
+    def __post_init__(self) -> None:
+        if self.distance < 0:
+            raise InvalidSpatialFilterException("Distance must not be negative")
+
+    def bbox(self) -> BoundingBox:
+        longitude, latitude = self.center
+        delta_latitude = self.distance / METERS_PER_DEGREE_LATITUDE
+        delta_longitude = delta_latitude / max(math.cos(math.radians(latitude)), 1e-6)
+
+        return BoundingBox(
+            longitude - delta_longitude,
+            latitude - delta_latitude,
+            longitude + delta_longitude,
+            latitude + delta_latitude,
+        )
+
+    def contains(self, point: Point) -> bool:
+        return haversine(self.center, point) <= self.distance
+
+
+def haversine(a: Point, b: Point) -> float:
+    """Great-circle distance in meters between two WGS84 (longitude, latitude) points."""
+    longitude_a, latitude_a = map(math.radians, a)
+    longitude_b, latitude_b = map(math.radians, b)
+    h = (
+        math.sin((latitude_b - latitude_a) / 2) ** 2
+        + math.cos(latitude_a) * math.cos(latitude_b) * math.sin((longitude_b - longitude_a) / 2) ** 2
+    )
+
+    return 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(h)))
+
+
+SpatialFilter: TypeAlias = BoundingBox | Polygon | Radius
+
+K = TypeVar("K", bound=Hashable)
+Cell: TypeAlias = tuple[int, int]
+
+
+class SpatialGridIndex(Generic[K]):
+    """In-memory index of points on a fixed grid of square cells.
+    A query only visits the cells that overlap the bounding box of the filter and only tests the points in those cells
+    against the exact geometry, so it scales with the size of the area instead of the number of indexed points.
+    Choose a cell size close to the size of typical queries."""
+
+    _cell_size: float
+    _cells: dict[Cell, dict[K, Point]]
+    _points: dict[K, Point]
+
+    def __init__(self, cell_size: float) -> None:
+        if cell_size <= 0:
+            raise ValueError("cell_size must be positive")
+
+        self._cell_size = cell_size
+        self._cells = {}
+        self._points = {}
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._points
+
+    def _cell(self, point: Point) -> Cell:
+        x, y = point
+        return math.floor(x / self._cell_size), math.floor(y / self._cell_size)
+
+    def insert(self, key: K, point: Point) -> None:
+        """Indexes the point under the key, a point that was indexed under the same key is replaced."""
+        self.remove(key)
+        self._points[key] = point
+        self._cells.setdefault(self._cell(point), {})[key] = point
+
+    def remove(self, key: K) -> None:
+        point = self._points.pop(key, None)
+        if point is None:
+            return
+
+        cell = self._cell(point)
+        points = self._cells[cell]
+        del points[key]
+        if not points:
+            del self._cells[cell]
+
+    def clear(self) -> None:
+        self._cells.clear()
+        self._points.clear()
+
+    def query(self, spatial_filter: SpatialFilter) -> list[K]:
+        """Returns the keys of the points that match the filter."""
+        bbox = spatial_filter.bbox()
+        min_column, min_row = self._cell((bbox.min_x, bbox.min_y))
+        max_column, max_row = self._cell((bbox.max_x, bbox.max_y))
+
+        # Large areas can cover more cells than there are occupied cells, only visit the occupied cells in that case
+        if (max_column - min_column + 1) * (max_row - min_row + 1) > len(self._cells):
+            cells = [
+                cell for cell in self._cells if min_column <= cell[0] <= max_column and min_row <= cell[1] <= max_row
+            ]
+        else:
+            cells = [
+                (column, row) for column in range(min_column, max_column + 1) for row in range(min_row, max_row + 1)
+            ]
+
+        return [
+            key
+            for cell in cells
+            for key, point in self._cells.get(cell, {}).items()
+            if bbox.contains(point) and spatial_filter.contains(point)
+        ]
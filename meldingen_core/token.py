@@ -1,10 +1,20 @@
+import hashlib
+import hmac
+import time
 from abc import ABCMeta, abstractmethod
+from collections.abc import AsyncIterator, Callable, Mapping, Sequence
 from datetime import datetime
 from typing import Generic, TypeVar
 
+from meldingen_core import SortingDirection
+from meldingen_core.aggregates import FacetCounts, MeldingFacet
+from meldingen_core.cache import LRUCache
 from meldingen_core.exceptions import NotFoundException
+from meldingen_core.filters import MeldingListFilters, NameListFilters
 from meldingen_core.models import Melding
-from meldingen_core.repositories import BaseMeldingRepository
+from meldingen_core.pagination import Cursor
+from meldingen_core.projection import MeldingProjection, MeldingRow
+from meldingen_core.repositories import BaseMeldingRepository, Include
 
 T = TypeVar("T", bound=Melding)
 
@@ -15,6 +25,22 @@ class BaseTokenGenerator(metaclass=ABCMeta):
         """Generates and returns token"""
 
 
+class TokenDigester:
+    """Produces the digest of a token, so only the digest has to be stored.
+    Tokens are long random strings, so a (keyed) SHA-256 digest suffices and a slow password hash is not needed."""
+
+    _key: bytes | None
+
+    def __init__(self, key: bytes | None = None) -> None:
+        self._key = key
+
+    def __call__(self, token: str) -> str:
+        if self._key is None:
+            return hashlib.sha256(token.encode()).hexdigest()
+
+        return hmac.new(self._key, token.encode(), hashlib.sha256).hexdigest()
+
+
 class TokenException(Exception): ...
 
 
@@ -27,33 +53,277 @@ class TokenExpiredException(TokenException): ...
 class InvalidStateException(TokenException): ...
 
 
+class VerifiedMeldingCache(Generic[T]):
+    """Short lived cache of meldingen that passed token verification, keyed on the melding id and the token.
+    It saves the melder-facing actions from retrieving the same melding over and over again during a form session.
+    The relationships that were loaded with a melding are remembered, a cached melding is only returned when it was
+    loaded with at least the requested relationships.
+    Every request gets the same cached instance, so actions that change a melding have to invalidate it, also when
+    they fail before saving it, see `TokenVerifier.invalidate`.
+    Entries are not shared between processes, so keep the time to live short."""
+
+    _cache: LRUCache[int, tuple[str, T, frozenset[str]]]
+    _ttl: float
+
+    def __init__(self, ttl: float = 5.0, max_size: int = 1024, clock: Callable[[], float] = time.monotonic) -> None:
+        self._cache = LRUCache(max_size, clock)
+        self._ttl = ttl
+
+    def get(self, melding_id: int, token: str, include: Include | None = None) -> T | None:
+        entry = self._cache.get(melding_id)
+        if entry is None:
+            return None
+
+        verified_token, melding, included = entry
+        if not hmac.compare_digest(token.encode(), verified_token.encode()):
+            return None
+        if not included.issuperset(include or ()):
+            return None
+
+        return melding
+
+    def set(self, melding_id: int, token: str, melding: T, include: Include | None = None) -> None:
+        self._cache.set(melding_id, (token, melding, frozenset(include or ())), self._ttl)
+
+    def invalidate(self, melding_id: int) -> None:
+        self._cache.pop(melding_id)
+
+
+class VerifiedMeldingCacheRepository(BaseMeldingRepository[T]):
+    """Melding repository that removes meldingen from the verified-melding cache whenever they are saved or deleted.
+    Pass it to every action that saves meldingen, also the backoffice actions that do not verify a token, so a melder
+    never gets a cached melding that was changed in the meantime. All other calls are passed to the wrapped
+    repository."""
+
+    _repository: BaseMeldingRepository[T]
+    _cache: VerifiedMeldingCache[T]
+
+    def __init__(self, repository: BaseMeldingRepository[T], cache: VerifiedMeldingCache[T]) -> None:
+        self._repository = repository
+        self._cache = cache
+
+    def _invalidate(self, obj: T) -> None:
+        self._cache.invalidate(self._repository.get_pk(obj))
+
+    async def save(self, obj: T) -> None:
+        # Also invalidate when saving fails, the cached melding may have been changed before it was saved
+        try:
+            await self._repository.save(obj)
+        finally:
+            self._invalidate(obj)
+
+    async def save_many(self, objs: Sequence[T]) -> None:
+        try:
+            await self._repository.save_many(objs)
+        finally:
+            for obj in objs:
+                self._invalidate(obj)
+
+    async def delete(self, pk: int) -> None:
+        await self._repository.delete(pk)
+        self._cache.invalidate(pk)
+
+    async def delete_many(self, pks: Sequence[int]) -> None:
+        await self._repository.delete_many(pks)
+        for pk in pks:
+            self._cache.invalidate(pk)
+
+    async def retrieve(self, pk: int, include: Include | None = None) -> T | None:
+        return await self._repository.retrieve(pk, include)
+
+    async def retrieve_many(self, pks: Sequence[int], include: Include | None = None) -> Mapping[int, T]:
+        return await self._repository.retrieve_many(pks, include)
+
+    async def find_by_id_and_token_digest(self, pk: int, token_digest: str, include: Include | None = None) -> T | None:
+        return await self._repository.find_by_id_and_token_digest(pk, token_digest, include)
+
+    def get_pk(self, obj: T) -> int:
+        return self._repository.get_pk(obj)
+
+    def get_cursor(self, obj: T, sort_attribute_name: str | None = None) -> Cursor:
+        return self._repository.get_cursor(obj, sort_attribute_name)
+
+    async def list(
+        self,
+        *,
+        limit: int | None = None,
+        offset: int | None = None,
+        sort_attribute_name: str | None = None,
+        sort_direction: SortingDirection | None = None,
+        filters: NameListFilters | None = None,
+        cursor: Cursor | None = None,
+        include: Include | None = None,
+    ) -> Sequence[T]:
+        return await self._repository.list(
+            limit=limit,
+            offset=offset,
+            sort_attribute_name=sort_attribute_name,
+            sort_direction=sort_direction,
+            filters=filters,
+            cursor=cursor,
+            include=include,
+        )
+
+    async def list_meldingen(
+        self,
+        *,
+        limit: int | None = None,
+        offset: int | None = None,
+        sort_attribute_name: str | None = None,
+        sort_direction: SortingDirection | None = None,
+        filters: MeldingListFilters | None = None,
+        cursor: Cursor | None = None,
+        include: Include | None = None,
+    ) -> Sequence[T]:
+        return await self._repository.list_meldingen(
+            limit=limit,
+            offset=offset,
+            sort_attribute_name=sort_attribute_name,
+            sort_direction=sort_direction,
+            filters=filters,
+            cursor=cursor,
+            include=include,
+        )
+
+    async def list_melding_rows(
+        self,
+        *,
+        fields: MeldingProjection,
+        limit: int | None = None,
+        offset: int | None = None,
+        sort_attribute_name: str | None = None,
+        sort_direction: SortingDirection | None = None,
+        filters: MeldingListFilters | None = None,
+        cursor: Cursor | None = None,
+    ) -> Sequence[MeldingRow]:
+        return await self._repository.list_melding_rows(
+            fields=fields,
+            limit=limit,
+            offset=offset,
+            sort_attribute_name=sort_attribute_name,
+            sort_direction=sort_direction,
+            filters=filters,
+            cursor=cursor,
+        )
+
+    def stream_meldingen(
+        self,
+        *,
+        sort_attribute_name: str | None = None,
+        sort_direction: SortingDirection | None = None,
+        filters: MeldingListFilters | None = None,
+        batch_size: int = 500,
+        include: Include | None = None,
+    ) -> AsyncIterator[T]:
+        return self._repository.stream_meldingen(
+            sort_attribute_name=sort_attribute_name,
+            sort_direction=sort_direction,
+            filters=filters,
+            batch_size=batch_size,
+            include=include,
+        )
+
+    async def count_meldingen(self, filters: MeldingListFilters | None = None) -> int:
+        return await self._repository.count_meldingen(filters)
+
+    async def facet_meldingen(
+        self, filters: MeldingListFilters | None = None, facets: Sequence[MeldingFacet] = ()
+    ) -> FacetCounts:
+        return await self._repository.facet_meldingen(filters, facets)
+
+
 class TokenVerifier(Generic[T]):
+    """Verifies the token of a melding using a constant-time comparison.
+    When a token digester is provided, the token is verified against the stored digest of the token, which lets the
+    repository look up the melding by its id and token digest in a single query. In that mode an unknown melding is
+    reported as an invalid token. Meldingen that were created before the digester was configured only have a plain
+    token, when the digest lookup finds nothing they are retrieved by id and verified against the plain token, until
+    their tokens expire."""
+
     _repository: BaseMeldingRepository[T]
+    _cache: VerifiedMeldingCache[T] | None
+    _digest: TokenDigester | None
 
-    def __init__(self, repository: BaseMeldingRepository[T]):
+    def __init__(
+        self,
+        repository: BaseMeldingRepository[T],
+        cache: VerifiedMeldingCache[T] | None = None,
+        token_digester: TokenDigester | None = None,
+    ):
         self._repository = repository
+        self._cache = cache
+        self._digest = token_digester
 
-    async def __call__(self, melding_id: int, token: str) -> T:
-        melding = await self._repository.retrieve(melding_id)
-        if melding is None:
-            raise NotFoundException("Melding not found")
+    async def __call__(self, melding_id: int, token: str, include: Include | None = None) -> T:
+        cached = self._cache.get(melding_id, token, include) if self._cache is not None else None
+        melding = cached if cached is not None else await self._retrieve(melding_id, token, include)
 
-        if token != melding.token:
+        # The token of a cached melding may have been changed or invalidated since it was verified
+        if not self._matches(melding, token):
             raise InvalidTokenException()
 
+        # Expiry is checked on every call, also when the melding comes from the cache
         if melding.token_expires is not None and melding.token_expires < datetime.now():
             raise TokenExpiredException()
 
+        if self._cache is not None and cached is None:
+            self._cache.set(melding_id, token, melding, include)
+
         return melding
 
+    async def _retrieve(self, melding_id: int, token: str, include: Include | None) -> T:
+        if self._digest is not None:
+            melding = await self._repository.find_by_id_and_token_digest(melding_id, self._digest(token), include)
+            if melding is None:
+                # The melding may have been created before the digester was configured
+                melding = await self._repository.retrieve(melding_id, include)
+            if melding is None:
+                raise InvalidTokenException()
+
+            return melding
+
+        melding = await self._repository.retrieve(melding_id, include)
+        if melding is None:
+            raise NotFoundException("Melding not found")
+
+        return melding
+
+    def _matches(self, melding: T, token: str) -> bool:
+        expected: str | None = melding.token
+        actual = token
+        if self._digest is not None and melding.token_digest is not None:
+            expected, actual = melding.token_digest, self._digest(token)
+
+        return expected is not None and hmac.compare_digest(expected.encode(), actual.encode())
+
+    def invalidate(self, melding_id: int) -> None:
+        """Removes the melding from the cache. Saving through a VerifiedMeldingCacheRepository does this already, but
+        actions that change a verified melding call this in a `finally` block, so a change that was not saved because
+        the action failed halfway is not handed to the next request."""
+        if self._cache is not None:
+            self._cache.invalidate(melding_id)
+
+    def invalidate_melding(self, melding: T) -> None:
+        """Removes the melding from the cache by its primary key."""
+        if self._cache is not None:
+            self._cache.invalidate(self._repository.get_pk(melding))
+
 
 class BaseTokenInvalidator(Generic[T], metaclass=ABCMeta):
+    _verify_token: TokenVerifier[T] | None
+
+    def __init__(self, token_verifier: TokenVerifier[T] | None = None) -> None:
+        self._verify_token = token_verifier
 
     async def __call__(self, melding: T) -> T:
         if not melding.state in self.allowed_states:
             raise InvalidStateException()
 
         melding.token = None
+        melding.token_digest = None
+
+        if self._verify_token is not None:
+            self._verify_token.invalidate_melding(melding)
 
         return melding
 
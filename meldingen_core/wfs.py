@@ -1,8 +1,25 @@
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import time
 from abc import ABCMeta, abstractmethod
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Hashable, Sequence
+from dataclasses import dataclass
 from importlib import import_module
-from typing import AsyncIterator, Literal
+from typing import Any, AsyncIterator, Literal, TypeAlias, cast
+from uuid import uuid4
 
+from plugfs import filesystem
+from plugfs.filesystem import Filesystem
+
+from meldingen_core.cache import LRUCache
 from meldingen_core.models import AssetType, AssetTypeArguments
+from meldingen_core.spatial import BoundingBox
+
+log = logging.getLogger(__name__)
 
 
 class BaseWfsProvider(metaclass=ABCMeta):
@@ -33,10 +50,60 @@ class BaseWfsProviderFactory(metaclass=ABCMeta):
 class InvalidWfsProviderException(Exception): ...
 
 
+ProviderCacheKey: TypeAlias = tuple[str, Hashable]
+
+
+def _freeze(value: Any) -> Hashable:
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, set):
+        return frozenset(_freeze(item) for item in value)
+
+    return cast(Hashable, value)
+
+
 # This class takes an asset type, and tries to instantiate a WFS provider based on the class name and arguments specified in the asset type.
 # It performs several checks to ensure that the class can be imported, instantiated, and that it produces a valid WFS provider.
+# Instantiated providers are kept in a LRU cache keyed on the class name and arguments, so providers that hold resources
+# like HTTP connection pools are reused between requests instead of being rebuilt every time.
 class AssetTypeToWfsProviderConverter:
+    _providers: OrderedDict[ProviderCacheKey, BaseWfsProvider]
+    _max_size: int
+
+    def __init__(self, max_size: int = 128) -> None:
+        self._providers = OrderedDict()
+        self._max_size = max_size
+
     def __call__(self, asset_type: AssetType) -> BaseWfsProvider:
+        key = self._cache_key(asset_type)
+
+        provider = self._providers.get(key)
+        if provider is not None:
+            self._providers.move_to_end(key)
+            return provider
+
+        provider = self._convert(asset_type)
+
+        if self._max_size > 0:
+            self._providers[key] = provider
+            if len(self._providers) > self._max_size:
+                self._providers.popitem(last=False)
+
+        return provider
+
+    def invalidate(self, asset_type: AssetType) -> None:
+        """Removes the provider for the current class name and arguments of the asset type from the cache."""
+        self._providers.pop(self._cache_key(asset_type), None)
+
+    def clear(self) -> None:
+        self._providers.clear()
+
+    def _cache_key(self, asset_type: AssetType) -> ProviderCacheKey:
+        return asset_type.class_name, _freeze(asset_type.arguments)
+
+    def _convert(self, asset_type: AssetType) -> BaseWfsProvider:
         try:
             module_name, class_name = asset_type.class_name.rsplit(".", 1)
         except ValueError as e:
@@ -73,4 +140,391 @@ class AssetTypeToWfsProviderConverter:
 # It does this by trying to convert the asset type to a WFS provider using the AssetTypeToWfsProviderConverter.
 class BaseWfsProviderValidator:
     async def __call__(self, asset_type: AssetType) -> None:
-        AssetTypeToWfsProviderConverter()(asset_type)
+        # Use a converter without a cache, validation should always instantiate the provider
+        AssetTypeToWfsProviderConverter(max_size=0)(asset_type)
+
+
+def wfs_cache_key(
+    asset_type: AssetType,
+    type_names: str,
+    count: int,
+    srs_name: str,
+    output_format: str,
+    service: str,
+    version: str,
+    request: str,
+    filter: str | None,
+) -> str:
+    """Produces a key for the normalized request parameters. The class name and arguments of the asset type are part of
+    the key, so changing the asset type's provider configuration automatically bypasses previously cached responses."""
+    parameters = {
+        "class_name": asset_type.class_name,
+        "arguments": _freeze(asset_type.arguments),
+        "type_names": ",".join(name.strip() for name in type_names.split(",")),
+        "count": count,
+        "srs_name": srs_name.strip(),
+        "output_format": output_format,
+        "service": service.upper(),
+        "version": version.strip(),
+        "request": request,
+        "filter": filter.strip() if filter is not None else None,
+    }
+
+    return hashlib.sha256(json.dumps(parameters, sort_keys=True, default=repr).encode()).hexdigest()
+
+
+class BaseWfsResponseCache(metaclass=ABCMeta):
+    """Cache for the byte streams produced by WFS providers."""
+
+    _max_entry_size: int
+
+    def __init__(self, max_entry_size: int = 10 * 1024 * 1024) -> None:
+        self._max_entry_size = max_entry_size
+
+    @abstractmethod
+    async def get(self, key: str) -> AsyncIterator[bytes] | None:
+        """Returns an iterator over the cached chunks or None when there is no (valid) entry for the key."""
+
+    @abstractmethod
+    async def set(self, key: str, chunks: Sequence[bytes], ttl: float) -> None: ...
+
+    async def tee(self, key: str, data: AsyncIterator[bytes], ttl: float) -> AsyncIterator[bytes]:
+        """Yields the chunks of the stream while collecting them, the response is only stored once the stream has been
+        fully consumed. Responses that are larger than the maximum entry size are served but not stored."""
+        chunks: list[bytes] = []
+        size = 0
+        cacheable = True
+
+        async for chunk in data:
+            if cacheable:
+                size += len(chunk)
+                if size > self._max_entry_size:
+                    cacheable = False
+                    chunks.clear()
+                else:
+                    chunks.append(chunk)
+
+            yield chunk
+
+        if cacheable:
+            await self.set(key, chunks, ttl)
+
+
+async def _iterate(chunks: Sequence[bytes]) -> AsyncIterator[bytes]:
+    for chunk in chunks:
+        yield chunk
+
+
+class InMemoryWfsResponseCache(BaseWfsResponseCache):
+    _cache: LRUCache[str, Sequence[bytes]]
+
+    def __init__(
+        self,
+        max_size: int = 64 * 1024 * 1024,
+        max_entry_size: int = 10 * 1024 * 1024,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        super().__init__(max_entry_size)
+        self._cache = LRUCache(max_size, clock)
+
+    async def get(self, key: str) -> AsyncIterator[bytes] | None:
+        chunks = self._cache.get(key)
+        if chunks is None:
+            return None
+
+        return _iterate(chunks)
+
+    async def set(self, key: str, chunks: Sequence[bytes], ttl: float) -> None:
+        self._cache.set(key, tuple(chunks), ttl, sum(len(chunk) for chunk in chunks))
+
+
+class FilesystemWfsResponseCache(BaseWfsResponseCache):
+    """Stores responses as files, for example on local disk using the plugfs local adapter.
+    The index of stored responses is kept in memory, cached responses are streamed from the file. The files of expired
+    responses are deleted when they are looked up and when a response is stored."""
+
+    _filesystem: Filesystem
+    _directory: str
+    _index: LRUCache[str, str]
+
+    def __init__(
+        self,
+        filesystem: Filesystem,
+        directory: str,
+        max_size: int = 1024 * 1024 * 1024,
+        max_entry_size: int = 10 * 1024 * 1024,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        super().__init__(max_entry_size)
+        self._filesystem = filesystem
+        self._directory = directory.rstrip("/")
+        self._index = LRUCache(max_size, clock)
+
+    async def get(self, key: str) -> AsyncIterator[bytes] | None:
+        # An expired entry is removed from the index here instead of by the lookup, so its file is deleted too
+        expired_path = self._index.pop_if_expired(key)
+        if expired_path is not None:
+            await self._delete(expired_path)
+            return None
+
+        path = self._index.get(key)
+        if path is None:
+            return None
+
+        try:
+            file = await self._filesystem.get_file(path)
+            return await file.get_iterator()
+        except filesystem.NotFoundException:
+            self._index.pop(key)
+            return None
+
+    async def set(self, key: str, chunks: Sequence[bytes], ttl: float) -> None:
+        # Every write gets a unique path, so replacing an entry never deletes the file that was just written
+        path = f"{self._directory}/{key}-{uuid4().hex}"
+        await self._filesystem.write_iterator(path, _iterate(chunks))
+
+        evicted = self._index.set(key, path, ttl, sum(len(chunk) for chunk in chunks))
+        for _, evicted_path in [*evicted, *self._index.pop_expired()]:
+            await self._delete(evicted_path)
+
+    async def _delete(self, path: str) -> None:
+        try:
+            await self._filesystem.delete(path)
+        except filesystem.NotFoundException:
+            log.warning(f"Cached WFS response '{path}' was already removed")
+
+
+class TieredWfsResponseCache(BaseWfsResponseCache):
+    """Combines caches into tiers, for example a small in-memory cache in front of a larger filesystem cache.
+    Lookups return the first hit, responses are stored in all tiers. A hit in a slower tier is stored in the faster
+    tiers once it has been read. The remaining time to live of the hit is not known, so it is stored for
+    `promotion_ttl` seconds, keep this short compared to the `cache_ttl` of the asset types."""
+
+    _tiers: Sequence[BaseWfsResponseCache]
+    _promotion_ttl: float
+
+    def __init__(
+        self,
+        tiers: Sequence[BaseWfsResponseCache],
+        max_entry_size: int = 10 * 1024 * 1024,
+        promotion_ttl: float = 60.0,
+    ) -> None:
+        super().__init__(max_entry_size)
+        self._tiers = tiers
+        self._promotion_ttl = promotion_ttl
+
+    async def get(self, key: str) -> AsyncIterator[bytes] | None:
+        for index, tier in enumerate(self._tiers):
+            data = await tier.get(key)
+            if data is not None:
+                for faster in self._tiers[:index]:
+                    data = faster.tee(key, data, self._promotion_ttl)
+
+                return data
+
+        return None
+
+    async def set(self, key: str, chunks: Sequence[bytes], ttl: float) -> None:
+        for tier in self._tiers:
+            await tier.set(key, chunks, ttl)
+
+
+class WfsFetchCancelledException(Exception): ...
+
+
+class _SharedWfsStream:
+    """Reads an upstream stream once and replays its chunks to every subscriber."""
+
+    _chunks: list[bytes]
+    _done: bool
+    _error: Exception | None
+    _subscribers: int
+    _condition: asyncio.Condition
+    _on_done: Callable[["_SharedWfsStream"], None]
+    _task: asyncio.Task[None]
+
+    def __init__(
+        self,
+        fetch: Callable[[], Awaitable[AsyncIterator[bytes]]],
+        on_done: Callable[["_SharedWfsStream"], None],
+    ) -> None:
+        self._chunks = []
+        self._done = False
+        self._error = None
+        self._subscribers = 0
+        self._condition = asyncio.Condition()
+        self._on_done = on_done
+        self._task = asyncio.create_task(self._produce(fetch))
+
+    async def _produce(self, fetch: Callable[[], Awaitable[AsyncIterator[bytes]]]) -> None:
+        try:
+            data = await fetch()
+            async for chunk in data:
+                async with self._condition:
+                    self._chunks.append(chunk)
+                    self._condition.notify_all()
+        except asyncio.CancelledError:
+            self._error = WfsFetchCancelledException("Upstream WFS fetch was cancelled")
+            raise
+        except Exception as exception:
+            self._error = exception
+        finally:
+            self._on_done(self)
+            async with self._condition:
+                self._done = True
+                self._condition.notify_all()
+
+    def subscribe(self) -> AsyncIterator[bytes]:
+        # Subscribers are counted when they join, not when they start iterating, so the upstream fetch
+        # is not cancelled while a subscriber that has not started reading yet is still waiting for it
+        self._subscribers += 1
+        return self._iterate()
+
+    async def _iterate(self) -> AsyncIterator[bytes]:
+        index = 0
+        try:
+            while True:
+                async with self._condition:
+                    await self._condition.wait_for(lambda: index < len(self._chunks) or self._done)
+                    chunks = self._chunks[index:]
+                    index += len(chunks)
+                    if not chunks and self._error is not None:
+                        raise self._error
+                    if not chunks:
+                        return
+
+                for chunk in chunks:
+                    yield chunk
+        finally:
+            self._subscribers -= 1
+            if self._subscribers == 0 and not self._done:
+                # Nobody is reading anymore, stop new requests from joining and stop fetching
+                self._on_done(self)
+                self._task.cancel()
+
+
+class WfsRequestCoalescer:
+    """Makes concurrent identical requests share a single upstream fetch (single-flight).
+    Every caller gets its own iterator over the shared chunks, including the chunks that were received before it joined.
+    Errors of the upstream fetch are raised to every caller while iterating.
+    Once the upstream stream is exhausted, new requests start a new fetch."""
+
+    _in_flight: dict[str, _SharedWfsStream]
+
+    def __init__(self) -> None:
+        self._in_flight = {}
+
+    def __call__(self, key: str, fetch: Callable[[], Awaitable[AsyncIterator[bytes]]]) -> AsyncIterator[bytes]:
+        stream = self._in_flight.get(key)
+        if stream is None:
+            stream = _SharedWfsStream(fetch, lambda done: self._remove(key, done))
+            self._in_flight[key] = stream
+
+        return stream.subscribe()
+
+    def __len__(self) -> int:
+        return len(self._in_flight)
+
+    def _remove(self, key: str, stream: _SharedWfsStream) -> None:
+        if self._in_flight.get(key) is stream:
+            del self._in_flight[key]
+
+
+Tile: TypeAlias = tuple[int, int]
+
+
+class WfsTileGrid:
+    """Fixed grid of square tiles, used to snap requested bounding boxes to tiles that can be cached and reused."""
+
+    _tile_size: float
+    _origin_x: float
+    _origin_y: float
+
+    def __init__(self, tile_size: float, origin_x: float = 0.0, origin_y: float = 0.0) -> None:
+        if tile_size <= 0:
+            raise ValueError("tile_size must be positive")
+
+        self._tile_size = tile_size
+        self._origin_x = origin_x
+        self._origin_y = origin_y
+
+    def tiles(self, bbox: BoundingBox) -> list[Tile]:
+        """Returns the tiles that together cover the bounding box."""
+        min_column = math.floor((bbox.min_x - self._origin_x) / self._tile_size)
+        min_row = math.floor((bbox.min_y - self._origin_y) / self._tile_size)
+        # A box that ends exactly on a tile boundary does not need the next tile
+        max_column = max(min_column, math.ceil((bbox.max_x - self._origin_x) / self._tile_size) - 1)
+        max_row = max(min_row, math.ceil((bbox.max_y - self._origin_y) / self._tile_size) - 1)
+
+        return [(column, row) for row in range(min_row, max_row + 1) for column in range(min_column, max_column + 1)]
+
+    def bbox(self, tile: Tile) -> BoundingBox:
+        column, row = tile
+        min_x = self._origin_x + column * self._tile_size
+        min_y = self._origin_y + row * self._tile_size
+
+        return BoundingBox(min_x, min_y, min_x + self._tile_size, min_y + self._tile_size)
+
+
+def bbox_filter(bbox: BoundingBox, srs_name: str) -> str:
+    """Produces a FES 2.0 filter that selects the features within the bounding box."""
+    return (
+        '<fes:Filter xmlns:fes="http://www.opengis.net/fes/2.0" xmlns:gml="http://www.opengis.net/gml/3.2">'
+        f'<fes:BBOX><gml:Envelope srsName="{srs_name}">'
+        f"<gml:lowerCorner>{bbox.min_x} {bbox.min_y}</gml:lowerCorner>"
+        f"<gml:upperCorner>{bbox.max_x} {bbox.max_y}</gml:upperCorner>"
+        "</gml:Envelope></fes:BBOX></fes:Filter>"
+    )
+
+
+@dataclass(frozen=True)
+class WfsFeature:
+    """A single GeoJSON feature, serialized, with the key that is used to merge features that appear in multiple tiles."""
+
+    key: str
+    data: bytes
+
+
+class WfsTileCache:
+    """In-memory cache of the features per tile, bounded by the total size of the serialized features."""
+
+    _cache: LRUCache[tuple[str, Tile], Sequence[WfsFeature]]
+
+    def __init__(self, max_size: int = 64 * 1024 * 1024, clock: Callable[[], float] = time.monotonic) -> None:
+        self._cache = LRUCache(max_size, clock)
+
+    def get(self, layer_key: str, tile: Tile) -> Sequence[WfsFeature] | None:
+        return self._cache.get((layer_key, tile))
+
+    def set(self, layer_key: str, tile: Tile, features: Sequence[WfsFeature], ttl: float) -> None:
+        self._cache.set((layer_key, tile), tuple(features), ttl, sum(len(feature.data) for feature in features))
+
+
+async def parse_wfs_features(data: AsyncIterator[bytes]) -> list[WfsFeature]:
+    """Reads a GeoJSON feature collection and returns its features. Features are keyed on their id when available."""
+    collection = json.loads(b"".join([chunk async for chunk in data]))
+
+    features = []
+    for feature in collection.get("features", []):
+        serialized = json.dumps(feature, separators=(",", ":"), sort_keys=True)
+        feature_id = feature.get("id")
+        key = f"id:{feature_id}" if feature_id is not None else f"feature:{serialized}"
+        features.append(WfsFeature(key, serialized.encode()))
+
+    return features
+
+
+async def merge_wfs_features(tiles: Sequence[Sequence[WfsFeature]]) -> AsyncIterator[bytes]:
+    """Streams the features of the tiles as a single GeoJSON feature collection, without duplicates."""
+    yield b'{"type":"FeatureCollection","features":['
+
+    seen: set[str] = set()
+    for features in tiles:
+        for feature in features:
+            if feature.key in seen:
+                continue
+
+            yield feature.data if not seen else b"," + feature.data
+            seen.add(feature.key)
+
+    yield b"]}"
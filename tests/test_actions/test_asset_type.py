@@ -12,7 +12,7 @@ from meldingen_core.actions.asset_type import (
 from meldingen_core.exceptions import NotFoundException
 from meldingen_core.models import AssetType
 from meldingen_core.repositories import BaseAssetTypeRepository
-from meldingen_core.wfs import BaseWfsProviderValidator
+from meldingen_core.wfs import AssetTypeToWfsProviderConverter, BaseWfsProviderValidator
 
 
 def test_can_instantiate_create_action() -> None:
@@ -112,3 +112,38 @@ async def test_update_action_raises_not_found() -> None:
 
     with pytest.raises(NotFoundException):
         await action(1, {"name": "new_name"})
+
+
+@pytest.mark.anyio
+async def test_update_action_invalidates_cached_provider_before_changing_wfs_fields() -> None:
+    asset_type = AssetType("name", "old.ClassName", {"base_url": "http://example.com"}, 3)
+    repository = Mock(BaseAssetTypeRepository)
+    repository.retrieve = AsyncMock(return_value=asset_type)
+    repository.save = AsyncMock()
+    validator = AsyncMock(BaseWfsProviderValidator)
+    converter = Mock(AssetTypeToWfsProviderConverter)
+    invalidated_class_names: list[str] = []
+    converter.invalidate.side_effect = lambda obj: invalidated_class_names.append(obj.class_name)
+    action: AssetTypeUpdateAction[AssetType] = AssetTypeUpdateAction(repository, validator, converter)
+
+    await action(1, {"class_name": "new.ClassName"})
+
+    converter.invalidate.assert_called_once_with(asset_type)
+    assert invalidated_class_names == ["old.ClassName"]
+    assert asset_type.class_name == "new.ClassName"
+
+
+@pytest.mark.anyio
+async def test_update_action_does_not_invalidate_cached_provider_when_no_wfs_fields_change() -> None:
+    asset_type = Mock(AssetType)
+    repository = Mock(BaseAssetTypeRepository)
+    repository.retrieve = AsyncMock(return_value=asset_type)
+    repository.save = AsyncMock()
+    converter = Mock(AssetTypeToWfsProviderConverter)
+    action: AssetTypeUpdateAction[AssetType] = AssetTypeUpdateAction(
+        repository, AsyncMock(BaseWfsProviderValidator), converter
+    )
+
+    await action(1, {"name": "new_name"})
+
+    converter.invalidate.assert_not_called()
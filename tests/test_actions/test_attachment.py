@@ -1,23 +1,34 @@
-from typing import AsyncIterator
-from unittest.mock import AsyncMock, Mock
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator
+from unittest.mock import AsyncMock, Mock, call
 
 import pytest
 from plugfs import filesystem
 from plugfs.filesystem import File, Filesystem
 
 from meldingen_core.actions.attachment import (
+    AttachmentDownload,
+    AttachmentRepositoryFactory,
     AttachmentTypes,
+    ByteRange,
+    DeferredUploadAttachmentAction,
     DeleteAttachmentAction,
     DownloadAttachmentAction,
     ListAttachmentsAction,
     MelderDownloadAttachmentAction,
     MelderListAttachmentsAction,
+    ProcessAttachmentJob,
+    RangeNotSatisfiableException,
     UploadAttachmentAction,
+    get_etag,
 )
-from meldingen_core.exceptions import NotFoundException
+from meldingen_core.exceptions import InvalidInputException, NotFoundException
 from meldingen_core.factories import BaseAttachmentFactory
-from meldingen_core.image import BaseIngestor
-from meldingen_core.models import Attachment, Melding
+from meldingen_core.image import AttachmentIngestionPipeline, BaseIngestor
+from meldingen_core.jobs import BaseJobQueue
+from meldingen_core.malware import MalwareException, MalwareFoundException
+from meldingen_core.models import Attachment, AttachmentStatus, Melding
 from meldingen_core.repositories import BaseAttachmentRepository
 from meldingen_core.token import TokenVerifier
 from meldingen_core.validators import BaseMediaTypeIntegrityValidator, BaseMediaTypeValidator
@@ -28,6 +39,34 @@ async def _iterator() -> AsyncIterator[bytes]:
         yield chunk
 
 
+class FakeFile(File):
+    def __init__(self, content: bytes, chunk_size: int = 4) -> None:
+        super().__init__("/path/to/file.ext")
+        self._content = content
+        self._chunk_size = chunk_size
+
+    @property
+    async def size(self) -> int:
+        return len(self._content)
+
+    async def read(self) -> bytes:
+        return self._content
+
+    async def get_iterator(self) -> AsyncIterator[bytes]:
+        async def iterate() -> AsyncIterator[bytes]:
+            for i in range(0, len(self._content), self._chunk_size):
+                yield self._content[i : i + self._chunk_size]
+
+        return iterate()
+
+    async def delete(self) -> None: ...
+
+
+async def _read(download: AttachmentDownload) -> bytes:
+    assert download.data is not None
+    return b"".join([chunk async for chunk in download.data])
+
+
 class TestUploadAttachmentAction:
     @pytest.mark.anyio
     async def test_can_handle_attachment(self) -> None:
@@ -54,6 +93,168 @@ class TestUploadAttachmentAction:
         attachment_repository.save.assert_awaited_once_with(attachment)
 
 
+def _repository_factory(attachment_repository: Mock) -> AttachmentRepositoryFactory[Attachment]:
+    @asynccontextmanager
+    async def factory() -> AsyncIterator[BaseAttachmentRepository[Attachment]]:
+        yield attachment_repository
+
+    return factory
+
+
+class TestDeferredUploadAttachmentAction:
+    @pytest.mark.anyio
+    async def test_saves_processing_attachment_and_enqueues_job(self) -> None:
+        token_verifier = AsyncMock(TokenVerifier, return_value=Melding("melding text"))
+        attachment_factory = Mock(
+            BaseAttachmentFactory, return_value=Attachment("photo.jpg", "image/jpeg", Melding(""))
+        )
+        attachment_repository = Mock(BaseAttachmentRepository)
+        saved_statuses: list[str] = []
+        attachment_repository.save.side_effect = lambda attachment: saved_statuses.append(attachment.status)
+        attachment_repository.get_pk.return_value = 456
+        job_repository = Mock(BaseAttachmentRepository)
+        pipeline = Mock(AttachmentIngestionPipeline)
+        pipeline.write.return_value = True
+        job_queue = Mock(BaseJobQueue)
+
+        action: DeferredUploadAttachmentAction[Attachment, Melding] = DeferredUploadAttachmentAction(
+            attachment_factory,
+            attachment_repository,
+            token_verifier,
+            Mock(BaseMediaTypeValidator),
+            Mock(BaseMediaTypeIntegrityValidator),
+            pipeline,
+            job_queue,
+            _repository_factory(job_repository),
+        )
+
+        iterator = _iterator()
+        attachment = await action(123, "super_secret_token", "photo.jpg", "image/jpeg", b"test", iterator)
+
+        pipeline.write.assert_awaited_once_with(attachment, iterator)
+        pipeline.process.assert_not_called()
+        assert saved_statuses == [AttachmentStatus.PROCESSING]
+        job_queue.enqueue.assert_awaited_once()
+        job = job_queue.enqueue.await_args.args[0]
+        assert isinstance(job, ProcessAttachmentJob)
+        assert repr(job) == "ProcessAttachmentJob(attachment_id=456)"
+
+        # The job does not use the repository of the request
+        job_repository.retrieve.return_value = attachment
+        await job()
+        job_repository.retrieve.assert_awaited_once_with(456)
+        job_repository.save.assert_awaited_once_with(attachment)
+        assert saved_statuses == [AttachmentStatus.PROCESSING]
+
+    @pytest.mark.anyio
+    async def test_saves_ready_attachment_when_no_processing_is_needed(self) -> None:
+        attachment_factory = Mock(
+            BaseAttachmentFactory, return_value=Attachment("photo.jpg", "image/jpeg", Melding(""))
+        )
+        attachment_repository = Mock(BaseAttachmentRepository)
+        pipeline = Mock(AttachmentIngestionPipeline)
+        pipeline.write.return_value = False
+        job_queue = Mock(BaseJobQueue)
+
+        action: DeferredUploadAttachmentAction[Attachment, Melding] = DeferredUploadAttachmentAction(
+            attachment_factory,
+            attachment_repository,
+            AsyncMock(TokenVerifier),
+            Mock(BaseMediaTypeValidator),
+            Mock(BaseMediaTypeIntegrityValidator),
+            pipeline,
+            job_queue,
+            _repository_factory(Mock(BaseAttachmentRepository)),
+        )
+
+        attachment = await action(123, "super_secret_token", "photo.jpg", "image/jpeg", b"test", _iterator())
+
+        assert attachment.status == AttachmentStatus.READY
+        attachment_repository.save.assert_awaited_once_with(attachment)
+        job_queue.enqueue.assert_not_called()
+
+
+class TestProcessAttachmentJob:
+    @pytest.mark.anyio
+    async def test_marks_attachment_ready(self) -> None:
+        attachment = Attachment("photo.jpg", "image/jpeg", Melding("text"), status=AttachmentStatus.PROCESSING)
+        attachment.file_path = "/path/to/file.ext"
+        attachment_repository = Mock(BaseAttachmentRepository)
+        attachment_repository.retrieve.return_value = attachment
+        pipeline = Mock(AttachmentIngestionPipeline)
+
+        await ProcessAttachmentJob(pipeline, _repository_factory(attachment_repository), 456)()
+
+        attachment_repository.retrieve.assert_awaited_once_with(456)
+        pipeline.process.assert_awaited_once_with(attachment)
+        assert attachment.status == AttachmentStatus.READY
+        attachment_repository.save.assert_awaited_once_with(attachment)
+
+    @pytest.mark.anyio
+    async def test_marks_attachment_with_malware_failed(self) -> None:
+        attachment = Attachment("photo.jpg", "image/jpeg", Melding("text"), status=AttachmentStatus.PROCESSING)
+        attachment.file_path = "/path/to/file.ext"
+        attachment_repository = Mock(BaseAttachmentRepository)
+        attachment_repository.retrieve.return_value = attachment
+        pipeline = Mock(AttachmentIngestionPipeline)
+        pipeline.process.side_effect = MalwareFoundException()
+
+        await ProcessAttachmentJob(pipeline, _repository_factory(attachment_repository), 456)()
+
+        pipeline.delete.assert_awaited_once_with(attachment)
+        assert attachment.status == AttachmentStatus.FAILED
+        attachment_repository.save.assert_awaited_once_with(attachment)
+
+    @pytest.mark.anyio
+    async def test_raises_other_failures_to_be_retried(self) -> None:
+        attachment = Attachment("photo.jpg", "image/jpeg", Melding("text"), status=AttachmentStatus.PROCESSING)
+        attachment.file_path = "/path/to/file.ext"
+        attachment_repository = Mock(BaseAttachmentRepository)
+        attachment_repository.retrieve.return_value = attachment
+        pipeline = Mock(AttachmentIngestionPipeline)
+        pipeline.process.side_effect = MalwareException()
+        job = ProcessAttachmentJob(pipeline, _repository_factory(attachment_repository), 456)
+
+        with pytest.raises(MalwareException):
+            await job()
+        attachment_repository.save.assert_not_called()
+
+        await job.failed(MalwareException())
+
+        pipeline.delete.assert_awaited_once_with(attachment)
+        pipeline.delete_derived.assert_awaited_once_with(attachment)
+        assert attachment.status == AttachmentStatus.FAILED
+        attachment_repository.save.assert_awaited_once_with(attachment)
+
+    @pytest.mark.anyio
+    async def test_deletes_generated_files_when_saving_fails(self) -> None:
+        attachment = Attachment("photo.jpg", "image/jpeg", Melding("text"), status=AttachmentStatus.PROCESSING)
+        attachment.file_path = "/path/to/file.ext"
+        attachment_repository = Mock(BaseAttachmentRepository)
+        attachment_repository.retrieve.return_value = attachment
+        attachment_repository.save.side_effect = RuntimeError
+        pipeline = Mock(AttachmentIngestionPipeline)
+
+        with pytest.raises(RuntimeError):
+            await ProcessAttachmentJob(pipeline, _repository_factory(attachment_repository), 456)()
+
+        pipeline.delete_derived.assert_awaited_once_with(attachment)
+        pipeline.delete.assert_not_called()
+
+    @pytest.mark.anyio
+    async def test_skips_deleted_attachment(self) -> None:
+        attachment_repository = Mock(BaseAttachmentRepository)
+        attachment_repository.retrieve.return_value = None
+        pipeline = Mock(AttachmentIngestionPipeline)
+        job = ProcessAttachmentJob(pipeline, _repository_factory(attachment_repository), 456)
+
+        await job()
+        await job.failed(MalwareException())
+
+        pipeline.process.assert_not_called()
+        attachment_repository.save.assert_not_called()
+
+
 class TestMelderDownloadAttachmentAction:
     @pytest.mark.anyio
     async def test_attachment_not_found(self) -> None:
@@ -257,6 +458,23 @@ class TestDownloadAttachmentAction:
 
         assert str(exception_info.value) == "Attachment not found"
 
+    @pytest.mark.anyio
+    @pytest.mark.parametrize("status", [AttachmentStatus.PROCESSING, AttachmentStatus.FAILED])
+    async def test_attachment_not_ready(self, status: AttachmentStatus) -> None:
+        attachment = Attachment("bla", "image/png", Melding("text"), status=status)
+        attachment.file_path = "/path/to/file.ext"
+        attachment_repository = Mock(BaseAttachmentRepository)
+        attachment_repository.retrieve.return_value = attachment
+        filesystem_mock = Mock(Filesystem)
+
+        action: DownloadAttachmentAction[Attachment] = DownloadAttachmentAction(attachment_repository, filesystem_mock)
+
+        with pytest.raises(NotFoundException) as exception_info:
+            await action(123, AttachmentTypes.ORIGINAL)
+
+        assert str(exception_info.value) == f"Attachment is {status}"
+        filesystem_mock.get_file.assert_not_called()
+
     @pytest.mark.anyio
     @pytest.mark.parametrize("_type", AttachmentTypes)
     async def test_can_handle_attachment_download(self, _type: AttachmentTypes) -> None:
@@ -280,6 +498,8 @@ class TestDownloadAttachmentAction:
 
         await action(123, _type)
 
+        attachment_repository.retrieve.assert_awaited_once_with(123, ("melding",))
+
     @pytest.mark.anyio
     async def test_optimized_path_none(self) -> None:
         melding = Melding(text="text")
@@ -468,6 +688,7 @@ class TestDeleteAttachmentAction:
 
         attachment_repository = Mock(BaseAttachmentRepository)
         attachment_repository.retrieve.return_value = attachment
+        attachment_repository.count_by_file_path.return_value = 1
 
         filesystem_mock = Mock(Filesystem)
         filesystem_mock.delete.side_effect = filesystem.NotFoundException
@@ -483,6 +704,35 @@ class TestDeleteAttachmentAction:
 
         assert str(exception_info.value) == "File not found"
 
+    @pytest.mark.anyio
+    async def test_delete_failed_attachment(self) -> None:
+        melding = Melding(text="text")
+        token_verifier = AsyncMock(TokenVerifier)
+        token_verifier.return_value = melding
+
+        attachment = Attachment(original_filename="bla", original_media_type="image/png", melding=melding)
+        attachment.file_path = "/path/to/file.ext"
+        attachment.status = AttachmentStatus.FAILED
+
+        attachment_repository = Mock(BaseAttachmentRepository)
+        attachment_repository.retrieve.return_value = attachment
+        attachment_repository.count_by_file_path.return_value = 1
+
+        # Processing already deleted the files of the failed attachment
+        filesystem_mock = Mock(Filesystem)
+        filesystem_mock.delete.side_effect = filesystem.NotFoundException
+
+        action: DeleteAttachmentAction[Attachment, Melding] = DeleteAttachmentAction(
+            token_verifier,
+            attachment_repository,
+            filesystem_mock,
+        )
+
+        await action(123, 456, "supersecrettoken")
+
+        filesystem_mock.delete.assert_awaited_once_with("/path/to/file.ext")
+        attachment_repository.delete.assert_awaited_once_with(456)
+
     @pytest.mark.anyio
     async def test_delete_attachment(self) -> None:
         melding = Melding(text="text")
@@ -494,6 +744,7 @@ class TestDeleteAttachmentAction:
 
         attachment_repository = Mock(BaseAttachmentRepository)
         attachment_repository.retrieve.return_value = attachment
+        attachment_repository.count_by_file_path.return_value = 1
 
         filesystem_mock = Mock(Filesystem)
 
@@ -507,3 +758,237 @@ class TestDeleteAttachmentAction:
 
         filesystem_mock.delete.assert_awaited_once_with(attachment.file_path)
         attachment_repository.delete.assert_awaited_once_with(456)
+
+    @pytest.mark.anyio
+    async def test_delete_attachment_with_derived_files(self) -> None:
+        melding = Melding(text="text")
+        attachment = Attachment("bla", "image/png", melding, optimized_path="/optimized", thumbnail_path="/thumbnail")
+        attachment.file_path = "/path/to/file.ext"
+
+        attachment_repository = Mock(BaseAttachmentRepository)
+        attachment_repository.retrieve.return_value = attachment
+        attachment_repository.count_by_file_path.return_value = 1
+
+        filesystem_mock = Mock(Filesystem)
+        filesystem_mock.delete.side_effect = [None, filesystem.NotFoundException, None]
+
+        action: DeleteAttachmentAction[Attachment, Melding] = DeleteAttachmentAction(
+            AsyncMock(TokenVerifier, return_value=melding), attachment_repository, filesystem_mock
+        )
+
+        await action(123, 456, "supersecrettoken")
+
+        assert filesystem_mock.delete.await_args_list == [
+            call("/path/to/file.ext"),
+            call("/optimized"),
+            call("/thumbnail"),
+        ]
+        attachment_repository.delete.assert_awaited_once_with(456)
+
+    @pytest.mark.anyio
+    async def test_delete_attachment_keeps_shared_files(self) -> None:
+        melding = Melding(text="text")
+        attachment = Attachment("bla", "image/png", melding, optimized_path="/optimized")
+        attachment.file_path = "/path/to/file.ext"
+
+        attachment_repository = Mock(BaseAttachmentRepository)
+        attachment_repository.retrieve.return_value = attachment
+        attachment_repository.count_by_file_path.side_effect = [2, 1]
+
+        filesystem_mock = Mock(Filesystem)
+
+        action: DeleteAttachmentAction[Attachment, Melding] = DeleteAttachmentAction(
+            AsyncMock(TokenVerifier, return_value=melding), attachment_repository, filesystem_mock
+        )
+
+        await action(123, 456, "supersecrettoken")
+
+        assert attachment_repository.count_by_file_path.await_args_list == [call("/path/to/file.ext")] * 2
+        filesystem_mock.delete.assert_not_called()
+        attachment_repository.delete.assert_awaited_once_with(456)
+
+    @pytest.mark.anyio
+    async def test_delete_attachment_deletes_shared_files_deleted_concurrently(self) -> None:
+        melding = Melding(text="text")
+        attachment = Attachment("bla", "image/png", melding, optimized_path="/optimized")
+        attachment.file_path = "/path/to/file.ext"
+
+        attachment_repository = Mock(BaseAttachmentRepository)
+        attachment_repository.retrieve.return_value = attachment
+        # The other attachment that shared the files was deleted in the meantime
+        attachment_repository.count_by_file_path.side_effect = [2, 0]
+
+        filesystem_mock = Mock(Filesystem)
+        filesystem_mock.delete.side_effect = [filesystem.NotFoundException, None]
+
+        action: DeleteAttachmentAction[Attachment, Melding] = DeleteAttachmentAction(
+            AsyncMock(TokenVerifier, return_value=melding), attachment_repository, filesystem_mock
+        )
+
+        await action(123, 456, "supersecrettoken")
+
+        attachment_repository.delete.assert_awaited_once_with(456)
+        assert filesystem_mock.delete.await_args_list == [call("/path/to/file.ext"), call("/optimized")]
+
+
+CREATED_AT = datetime(2026, 10, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+LAST_MODIFIED = CREATED_AT.replace(microsecond=0)
+
+
+def _download_action(
+    attachment: Attachment, content: bytes = b"Hello world!"
+) -> tuple[DownloadAttachmentAction[Attachment], Mock]:
+    attachment_repository = Mock(BaseAttachmentRepository)
+    attachment_repository.retrieve.return_value = attachment
+    filesystem_mock = Mock(Filesystem)
+    filesystem_mock.get_file.return_value = FakeFile(content)
+
+    return DownloadAttachmentAction(attachment_repository, filesystem_mock), filesystem_mock
+
+
+def _attachment(**kwargs: Any) -> Attachment:
+    attachment = Attachment("bla", "image/png", Melding("text"), created_at=CREATED_AT, **kwargs)
+    attachment.file_path = "/path/to/file.ext"
+    return attachment
+
+
+class TestAttachmentDownload:
+    @pytest.mark.anyio
+    async def test_download(self) -> None:
+        action, filesystem_mock = _download_action(_attachment())
+
+        download = await action.download(123, AttachmentTypes.ORIGINAL)
+
+        assert await _read(download) == b"Hello world!"
+        assert download.media_type == "image/png"
+        assert download.etag == get_etag("/path/to/file.ext")
+        assert download.last_modified == LAST_MODIFIED
+        assert download.size == 12
+        assert download.byte_range is None
+        assert not download.not_modified
+        filesystem_mock.get_file.assert_awaited_once_with("/path/to/file.ext")
+
+    @pytest.mark.anyio
+    @pytest.mark.parametrize(
+        "byte_range,expected,resolved",
+        [
+            (ByteRange(0, 5), b"Hello", ByteRange(0, 5)),
+            (ByteRange(3, 6), b"lo wor", ByteRange(3, 6)),
+            (ByteRange(6), b"world!", ByteRange(6, 6)),
+            (ByteRange(8, 100), b"rld!", ByteRange(8, 4)),
+            (ByteRange(11, 1), b"!", ByteRange(11, 1)),
+        ],
+    )
+    async def test_download_range(self, byte_range: ByteRange, expected: bytes, resolved: ByteRange) -> None:
+        action, _ = _download_action(_attachment())
+
+        download = await action.download(123, AttachmentTypes.ORIGINAL, byte_range)
+
+        assert await _read(download) == expected
+        assert download.byte_range == resolved
+        assert download.size == 12
+
+    @pytest.mark.anyio
+    async def test_download_range_not_satisfiable(self) -> None:
+        action, _ = _download_action(_attachment())
+
+        with pytest.raises(RangeNotSatisfiableException):
+            await action.download(123, AttachmentTypes.ORIGINAL, ByteRange(12))
+
+    def test_invalid_byte_range(self) -> None:
+        with pytest.raises(InvalidInputException):
+            ByteRange(-1)
+        with pytest.raises(InvalidInputException):
+            ByteRange(0, 0)
+
+    @pytest.mark.anyio
+    @pytest.mark.parametrize(
+        "if_none_match,if_modified_since,not_modified",
+        [
+            (get_etag("/path/to/file.ext"), None, True),
+            (f'"other", W/{get_etag("/path/to/file.ext")}', None, True),
+            ("*", None, True),
+            ('"other"', CREATED_AT + timedelta(days=1), False),
+            (None, CREATED_AT, True),
+            (None, LAST_MODIFIED, True),
+            (None, LAST_MODIFIED.replace(tzinfo=None), True),
+            (None, LAST_MODIFIED.astimezone(timezone(timedelta(hours=2))), True),
+            (None, LAST_MODIFIED - timedelta(seconds=1), False),
+            (None, (LAST_MODIFIED - timedelta(seconds=1)).replace(tzinfo=None), False),
+            (None, None, False),
+        ],
+    )
+    async def test_conditional_download(
+        self, if_none_match: str | None, if_modified_since: datetime | None, not_modified: bool
+    ) -> None:
+        action, filesystem_mock = _download_action(_attachment())
+
+        download = await action.download(
+            123, AttachmentTypes.ORIGINAL, if_none_match=if_none_match, if_modified_since=if_modified_since
+        )
+
+        assert download.not_modified == not_modified
+        assert download.etag == get_etag("/path/to/file.ext")
+        assert filesystem_mock.get_file.called != not_modified
+
+    @pytest.mark.anyio
+    async def test_download_without_last_modified(self) -> None:
+        attachment = _attachment()
+        attachment.created_at = None
+        action, _ = _download_action(attachment)
+
+        download = await action.download(123, AttachmentTypes.ORIGINAL, if_modified_since=CREATED_AT)
+
+        assert not download.not_modified
+        assert download.last_modified is None
+
+    @pytest.mark.anyio
+    async def test_etag_of_content_addressed_original(self) -> None:
+        attachment = _attachment(digest="abc", thumbnail_path="/thumbnail", thumbnail_media_type="image/webp")
+        action, _ = _download_action(attachment)
+
+        original = await action.download(123, AttachmentTypes.ORIGINAL, if_none_match='"abc"')
+        thumbnail = await action.download(123, AttachmentTypes.THUMBNAIL)
+
+        assert original.not_modified
+        assert original.etag == '"abc"'
+        assert thumbnail.etag == get_etag("/thumbnail")
+        assert thumbnail.media_type == "image/webp"
+
+    @pytest.mark.anyio
+    async def test_download_file_not_found(self) -> None:
+        action, filesystem_mock = _download_action(_attachment())
+        filesystem_mock.get_file.side_effect = filesystem.NotFoundException
+
+        with pytest.raises(NotFoundException) as exception_info:
+            await action.download(123, AttachmentTypes.ORIGINAL)
+
+        assert str(exception_info.value) == "File not found"
+
+    @pytest.mark.anyio
+    async def test_melder_download(self) -> None:
+        attachment = _attachment()
+        attachment_repository = Mock(BaseAttachmentRepository)
+        attachment_repository.retrieve.return_value = attachment
+        filesystem_mock = Mock(Filesystem)
+        filesystem_mock.get_file.return_value = FakeFile(b"Hello world!")
+
+        action: MelderDownloadAttachmentAction[Attachment, Melding] = MelderDownloadAttachmentAction(
+            AsyncMock(TokenVerifier, return_value=attachment.melding), attachment_repository, filesystem_mock
+        )
+
+        download = await action.download(123, 456, "token", AttachmentTypes.ORIGINAL, ByteRange(6, 5))
+
+        assert await _read(download) == b"world"
+
+    @pytest.mark.anyio
+    async def test_melder_download_of_other_melding(self) -> None:
+        attachment_repository = Mock(BaseAttachmentRepository)
+        attachment_repository.retrieve.return_value = _attachment()
+
+        action: MelderDownloadAttachmentAction[Attachment, Melding] = MelderDownloadAttachmentAction(
+            AsyncMock(TokenVerifier, return_value=Melding("other")), attachment_repository, Mock(Filesystem)
+        )
+
+        with pytest.raises(NotFoundException):
+            await action.download(123, 456, "token", AttachmentTypes.ORIGINAL)
@@ -7,12 +7,16 @@ from meldingen_core import SortingDirection
 from meldingen_core.actions.base import (
     BaseCreateAction,
     BaseDeleteAction,
+    BaseKeysetListAction,
     BaseListAction,
     BaseRetrieveAction,
     BaseUpdateAction,
 )
-from meldingen_core.exceptions import NotFoundException
+from meldingen_core.exceptions import InvalidInputException, NotFoundException
+from meldingen_core.models import Melding
+from meldingen_core.pagination import Cursor, InvalidCursorException, Page, encode_cursor
 from meldingen_core.repositories import BaseRepository
+from tests.test_repositories import InMemoryMeldingRepository
 
 
 class DummyModel:
@@ -61,7 +65,9 @@ async def test_base_list_action_limit(
 
     await base_list_action(limit=limit)
 
-    spy.assert_called_once_with(limit=limit, offset=None, sort_attribute_name=None, sort_direction=None, filters=None)
+    spy.assert_called_once_with(
+        limit=limit, offset=None, sort_attribute_name=None, sort_direction=None, filters=None, include=None
+    )
 
 
 @pytest.mark.parametrize("offset", [1, 5, 10, 20])
@@ -75,7 +81,9 @@ async def test_base_list_action_offset(
 
     await base_list_action(offset=offset)
 
-    spy.assert_called_once_with(limit=None, offset=offset, sort_attribute_name=None, sort_direction=None, filters=None)
+    spy.assert_called_once_with(
+        limit=None, offset=offset, sort_attribute_name=None, sort_direction=None, filters=None, include=None
+    )
 
 
 @pytest.mark.anyio
@@ -87,7 +95,9 @@ async def test_base_list_action_sort_attribute_name(
 
     await base_list_action(sort_attribute_name="name")
 
-    spy.assert_called_once_with(limit=None, offset=None, sort_attribute_name="name", sort_direction=None, filters=None)
+    spy.assert_called_once_with(
+        limit=None, offset=None, sort_attribute_name="name", sort_direction=None, filters=None, include=None
+    )
 
 
 @pytest.mark.parametrize("direction", [SortingDirection.ASC, SortingDirection.DESC])
@@ -102,7 +112,7 @@ async def test_base_list_action_sort_direction(
     await base_list_action(sort_direction=direction)
 
     spy.assert_called_once_with(
-        limit=None, offset=None, sort_attribute_name=None, sort_direction=direction, filters=None
+        limit=None, offset=None, sort_attribute_name=None, sort_direction=direction, filters=None, include=None
     )
 
 
@@ -121,7 +131,9 @@ async def test_base_list_action_limit_offset(
 
     await base_list_action(limit=limit, offset=offset)
 
-    spy.assert_called_once_with(limit=limit, offset=offset, sort_attribute_name=None, sort_direction=None, filters=None)
+    spy.assert_called_once_with(
+        limit=limit, offset=offset, sort_attribute_name=None, sort_direction=None, filters=None, include=None
+    )
 
 
 @pytest.mark.parametrize(
@@ -140,7 +152,9 @@ async def test_base_list_action_limit_offset_sort_attribute_name(
 
     await base_list_action(limit=limit, offset=offset, sort_attribute_name=name)
 
-    spy.assert_called_once_with(limit=limit, offset=offset, sort_attribute_name=name, sort_direction=None, filters=None)
+    spy.assert_called_once_with(
+        limit=limit, offset=offset, sort_attribute_name=name, sort_direction=None, filters=None, include=None
+    )
 
 
 @pytest.mark.parametrize(
@@ -166,7 +180,7 @@ async def test_base_list_action_limit_offset_sort_attribute_name_sort_direction(
     await base_list_action(limit=limit, offset=offset, sort_attribute_name=name, sort_direction=direction)
 
     spy.assert_called_once_with(
-        limit=limit, offset=offset, sort_attribute_name=name, sort_direction=direction, filters=None
+        limit=limit, offset=offset, sort_attribute_name=name, sort_direction=direction, filters=None, include=None
     )
 
 
@@ -179,7 +193,7 @@ async def test_base_retrieve_action(pk: int, mocker: MockerFixture) -> None:
 
     await action(pk=pk)
 
-    spy.assert_called_once_with(pk=pk)
+    spy.assert_called_once_with(pk=pk, include=None)
 
 
 @pytest.mark.parametrize("pk", [1, 2, 3, 4, 5])
@@ -217,3 +231,77 @@ async def test_base_delete_action_not_found(mocker: MockerFixture) -> None:
     mocker.patch.object(action._repository, "retrieve", return_value=None)
     with pytest.raises(NotFoundException) as exc_info:
         await action(101, {"name": "new name"})
+
+
+@pytest.mark.anyio
+async def test_base_keyset_list_action_pages_through_all_objects() -> None:
+    meldingen = {pk: Melding(f"melding {pk}") for pk in range(1, 6)}
+    action: BaseKeysetListAction[Melding] = BaseKeysetListAction(InMemoryMeldingRepository(meldingen))
+
+    first = await action(limit=2)
+    second = await action(limit=2, cursor=first.next_cursor)
+    third = await action(limit=2, cursor=second.next_cursor)
+
+    assert list(first.items) == [meldingen[1], meldingen[2]]
+    assert list(second.items) == [meldingen[3], meldingen[4]]
+    assert list(third.items) == [meldingen[5]]
+    assert third.next_cursor is None
+
+
+@pytest.mark.anyio
+async def test_base_keyset_list_action_passes_decoded_cursor() -> None:
+    repository = Mock(BaseRepository)
+    repository.list.return_value = []
+    action: BaseKeysetListAction[DummyModel] = BaseKeysetListAction(repository)
+
+    page = await action(
+        limit=10,
+        cursor=encode_cursor(Cursor("name", "b", 2)),
+        sort_attribute_name="name",
+        sort_direction=SortingDirection.ASC,
+    )
+
+    assert page == Page([])
+    repository.list.assert_awaited_once_with(
+        limit=11,
+        sort_attribute_name="name",
+        sort_direction=SortingDirection.ASC,
+        filters=None,
+        cursor=Cursor("name", "b", 2),
+        include=None,
+    )
+
+
+@pytest.mark.anyio
+async def test_base_keyset_list_action_rejects_cursor_for_other_sort_direction() -> None:
+    repository = Mock(BaseRepository)
+    repository.list.return_value = [DummyModel(), DummyModel()]
+    repository.get_cursor.return_value = Cursor("name", "b", 2)
+    action: BaseKeysetListAction[DummyModel] = BaseKeysetListAction(repository)
+
+    page = await action(limit=1, sort_attribute_name="name", sort_direction=SortingDirection.DESC)
+
+    with pytest.raises(InvalidCursorException):
+        await action(cursor=page.next_cursor, sort_attribute_name="name", sort_direction=SortingDirection.ASC)
+    await action(cursor=page.next_cursor, sort_attribute_name="name", sort_direction=SortingDirection.DESC)
+
+    assert repository.list.await_args.kwargs["cursor"] == Cursor("name", "b", 2, SortingDirection.DESC)
+
+
+@pytest.mark.anyio
+async def test_base_keyset_list_action_rejects_limit_below_one() -> None:
+    repository = Mock(BaseRepository)
+    action: BaseKeysetListAction[DummyModel] = BaseKeysetListAction(repository)
+
+    with pytest.raises(InvalidInputException):
+        await action(limit=0)
+
+    repository.list.assert_not_called()
+
+
+@pytest.mark.anyio
+async def test_base_keyset_list_action_rejects_cursor_for_other_sort_attribute() -> None:
+    action: BaseKeysetListAction[DummyModel] = BaseKeysetListAction(Mock(BaseRepository))
+
+    with pytest.raises(InvalidCursorException):
+        await action(cursor=encode_cursor(Cursor("name", "b", 2)), sort_attribute_name="email")
@@ -9,6 +9,7 @@ from meldingen_core.actions.classification import (
     ClassificationRetrieveAction,
     ClassificationUpdateAction,
 )
+from meldingen_core.classification import ClassificationCatalog, ClassificationNameCache
 from meldingen_core.exceptions import NotFoundException
 from meldingen_core.models import AssetType, Classification
 from meldingen_core.repositories import BaseAssetTypeRepository, BaseClassificationRepository
@@ -41,6 +42,29 @@ class TestClassificationCreateAction:
 
         await action(Classification("name"), 123)
 
+    @pytest.mark.anyio
+    async def test_invalidates_catalog(self) -> None:
+        catalog = Mock(ClassificationCatalog)
+        action: ClassificationCreateAction[Classification, AssetType] = ClassificationCreateAction(
+            Mock(BaseClassificationRepository), Mock(BaseAssetTypeRepository), catalog
+        )
+
+        await action(Classification("name"))
+
+        catalog.invalidate.assert_called_once_with()
+
+    @pytest.mark.anyio
+    async def test_clears_name_cache(self) -> None:
+        name_cache: ClassificationNameCache[Classification] = ClassificationNameCache()
+        name_cache.set("name", Classification("name"))
+        action: ClassificationCreateAction[Classification, AssetType] = ClassificationCreateAction(
+            Mock(BaseClassificationRepository), Mock(BaseAssetTypeRepository), name_cache=name_cache
+        )
+
+        await action(Classification("name"))
+
+        assert name_cache.get("name") is None
+
 
 def test_can_instantiate_retrieve_action() -> None:
     action: ClassificationRetrieveAction[Classification] = ClassificationRetrieveAction(
@@ -82,7 +106,55 @@ class TestClassificationUpdateAction:
         classification = await action(123, {"asset_type": 456})
         assert classification is not None
 
+    @pytest.mark.anyio
+    async def test_invalidates_catalog(self) -> None:
+        catalog = Mock(ClassificationCatalog)
+        action: ClassificationUpdateAction[Classification, AssetType] = ClassificationUpdateAction(
+            Mock(BaseClassificationRepository), Mock(BaseAssetTypeRepository), catalog
+        )
+
+        await action(123, {"name": "name"})
+
+        catalog.invalidate.assert_called_once_with()
+
+    @pytest.mark.anyio
+    async def test_clears_name_cache(self) -> None:
+        name_cache = Mock(ClassificationNameCache)
+        action: ClassificationUpdateAction[Classification, AssetType] = ClassificationUpdateAction(
+            Mock(BaseClassificationRepository), Mock(BaseAssetTypeRepository), name_cache=name_cache
+        )
+
+        await action(123, {"name": "other name"})
+
+        name_cache.clear.assert_called_once_with()
+
 
 def test_can_instantiate_delete_action() -> None:
     action: ClassificationDeleteAction[Classification] = ClassificationDeleteAction(Mock(BaseClassificationRepository))
     assert isinstance(action, ClassificationDeleteAction)
+
+
+@pytest.mark.anyio
+async def test_delete_action_invalidates_catalog() -> None:
+    repository = Mock(BaseClassificationRepository)
+    catalog = Mock(ClassificationCatalog)
+    action: ClassificationDeleteAction[Classification] = ClassificationDeleteAction(repository, catalog)
+
+    await action(123)
+
+    repository.delete.assert_awaited_once_with(pk=123)
+    catalog.invalidate.assert_called_once_with()
+
+
+@pytest.mark.anyio
+async def test_delete_action_clears_name_cache() -> None:
+    catalog = Mock(ClassificationCatalog)
+    name_cache = Mock(ClassificationNameCache)
+    action: ClassificationDeleteAction[Classification] = ClassificationDeleteAction(
+        Mock(BaseClassificationRepository), catalog, name_cache
+    )
+
+    await action(123)
+
+    catalog.invalidate.assert_called_once_with()
+    name_cache.clear.assert_called_once_with()
@@ -1,7 +1,7 @@
 import logging
 from datetime import datetime, timedelta
 from typing import MutableSequence
-from unittest.mock import AsyncMock, Mock
+from unittest.mock import AsyncMock, Mock, call
 
 import pytest
 from _pytest.logging import LogCaptureFixture
@@ -13,28 +13,41 @@ from meldingen_core.actions.melding import (
     MeldingAddAssetAction,
     MeldingAddAttachmentsAction,
     MeldingAddContactInfoAction,
+    MeldingAggregateAction,
     MeldingAnswerDeleteAction,
     MeldingAnswerQuestionsAction,
+    MeldingBulkCancelAction,
+    MeldingBulkPlanAction,
+    MeldingBulkProcessAction,
     MeldingCancelAction,
     MeldingCompleteAction,
     MeldingContactInfoAddedAction,
     MeldingCreateAction,
     MeldingDeleteAssetAction,
+    MeldingDuplicatesAction,
+    MeldingKeysetListAction,
     MeldingListAction,
     MeldingListQuestionsAnswersAction,
     MeldingPlanAction,
     MeldingProcessAction,
+    MeldingReclassifyAction,
     MeldingReopenAction,
     MeldingRequestProcessingAction,
     MeldingRequestReopenAction,
     MeldingRetrieveAction,
+    MeldingRowListAction,
+    MeldingSimilarTextAction,
+    MeldingStreamAction,
     MeldingSubmitAction,
     MeldingSubmitActionMelder,
     MeldingSubmitLocationAction,
     MeldingUpdateAction,
     MeldingUpdateActionMelder,
+    ReclassificationResult,
 )
+from meldingen_core.aggregates import MeldingAggregateCache, MeldingAggregates
 from meldingen_core.classification import ClassificationNotFoundException, Classifier
+from meldingen_core.duplicates import DuplicateCandidate, DuplicateCandidateIndex
 from meldingen_core.exceptions import InvalidInputException, LimitReachedException, NotFoundException
 from meldingen_core.factories import BaseAssetFactory
 from meldingen_core.filters import MeldingListFilters
@@ -42,6 +55,7 @@ from meldingen_core.labels import BaseLabelReplacer
 from meldingen_core.mail import BaseMeldingCompleteMailer, BaseMeldingConfirmationMailer
 from meldingen_core.managers import RelationshipExistsException, RelationshipManager
 from meldingen_core.models import Answer, Asset, AssetType, Classification, Label, Melding, Question, Source
+from meldingen_core.pagination import InvalidCursorException
 from meldingen_core.reclassification import BaseReclassification
 from meldingen_core.repositories import (
     BaseAnswerRepository,
@@ -50,8 +64,17 @@ from meldingen_core.repositories import (
     BaseMeldingRepository,
     BaseSourceRepository,
 )
+from meldingen_core.similarity import MinHashLSHIndex, SimilarMelding
 from meldingen_core.statemachine import BaseMeldingStateMachine, MeldingStates, MeldingTransitions
-from meldingen_core.token import BaseTokenGenerator, BaseTokenInvalidator, TokenVerifier
+from meldingen_core.token import (
+    BaseTokenGenerator,
+    BaseTokenInvalidator,
+    TokenDigester,
+    TokenVerifier,
+    VerifiedMeldingCache,
+    VerifiedMeldingCacheRepository,
+)
+from tests.test_repositories import InMemoryMeldingRepository
 
 
 @pytest.mark.anyio
@@ -73,6 +96,85 @@ async def test_melding_create_action() -> None:
     assert melding.classification == classification
 
 
+@pytest.mark.anyio
+async def test_melding_create_action_stores_token_digest() -> None:
+    token_generator = AsyncMock(BaseTokenGenerator, return_value="123456")
+    digest = TokenDigester()
+    repository = Mock(BaseMeldingRepository)
+    saved: list[tuple[str | None, str | None]] = []
+    repository.save.side_effect = lambda melding: saved.append((melding.token, melding.token_digest))
+    action: MeldingCreateAction[Melding, Classification] = MeldingCreateAction(
+        repository,
+        AsyncMock(Classifier),
+        Mock(BaseMeldingStateMachine),
+        token_generator,
+        timedelta(days=3),
+        digest,
+    )
+    melding = Melding("text")
+
+    await action(melding)
+
+    # Only the digest is saved, the plain token is only set for the response
+    assert saved[-1] == (None, digest("123456"))
+    assert melding.token == "123456"
+    assert melding.token_digest == digest("123456")
+
+
+@pytest.mark.anyio
+async def test_melding_create_action_stores_plain_token_without_digester() -> None:
+    repository = Mock(BaseMeldingRepository)
+    saved: list[tuple[str | None, str | None]] = []
+    repository.save.side_effect = lambda melding: saved.append((melding.token, melding.token_digest))
+    action: MeldingCreateAction[Melding, Classification] = MeldingCreateAction(
+        repository,
+        AsyncMock(Classifier),
+        Mock(BaseMeldingStateMachine),
+        AsyncMock(BaseTokenGenerator, return_value="123456"),
+        timedelta(days=3),
+    )
+
+    await action(Melding("text"))
+
+    assert saved[-1] == ("123456", None)
+
+
+@pytest.mark.anyio
+async def test_melding_create_action_adds_melding_to_duplicate_index() -> None:
+    repository = InMemoryMeldingRepository()
+    duplicate_index = Mock(DuplicateCandidateIndex)
+    action: MeldingCreateAction[Melding, Classification] = MeldingCreateAction(
+        repository,
+        AsyncMock(Classifier),
+        Mock(BaseMeldingStateMachine),
+        AsyncMock(BaseTokenGenerator),
+        timedelta(days=3),
+        duplicate_index=duplicate_index,
+    )
+    melding = Melding("text")
+
+    await action(melding)
+
+    duplicate_index.add.assert_called_once_with(1, melding)
+
+
+@pytest.mark.anyio
+async def test_melding_create_action_adds_melding_to_text_index() -> None:
+    text_index = Mock(MinHashLSHIndex)
+    action: MeldingCreateAction[Melding, Classification] = MeldingCreateAction(
+        InMemoryMeldingRepository(),
+        AsyncMock(Classifier),
+        Mock(BaseMeldingStateMachine),
+        AsyncMock(BaseTokenGenerator),
+        timedelta(days=3),
+        text_index=text_index,
+    )
+
+    await action(Melding("text"))
+
+    text_index.add.assert_called_once_with(1, "text")
+
+
 @pytest.mark.anyio
 async def test_melding_create_action_with_classification_not_found(caplog: LogCaptureFixture) -> None:
     classifier = AsyncMock(Classifier, side_effect=ClassificationNotFoundException)
@@ -98,6 +200,192 @@ def test_can_instantiate_melding_list_action() -> None:
     assert isinstance(action, MeldingListAction)
 
 
+@pytest.mark.anyio
+async def test_melding_keyset_list_action() -> None:
+    meldingen = {pk: Melding(f"melding {pk}") for pk in range(1, 4)}
+    repository = InMemoryMeldingRepository(meldingen)
+    action: MeldingKeysetListAction[Melding] = MeldingKeysetListAction(repository)
+
+    first = await action(limit=2, filters=MeldingListFilters(states=[MeldingStates.NEW]))
+    second = await action(limit=2, cursor=first.next_cursor)
+
+    assert list(first.items) == [meldingen[1], meldingen[2]]
+    assert first.next_cursor is not None
+    assert list(second.items) == [meldingen[3]]
+    assert second.next_cursor is None
+
+
+@pytest.mark.anyio
+async def test_melding_keyset_list_action_checks_limit_and_sort_direction() -> None:
+    repository = InMemoryMeldingRepository({pk: Melding(f"melding {pk}") for pk in range(1, 4)})
+    action: MeldingKeysetListAction[Melding] = MeldingKeysetListAction(repository)
+
+    with pytest.raises(InvalidInputException):
+        await action(limit=0)
+
+    first = await action(limit=2)
+    with pytest.raises(InvalidCursorException):
+        await action(limit=2, cursor=first.next_cursor, sort_direction=SortingDirection.DESC)
+
+
+@pytest.mark.anyio
+async def test_melding_row_list_action() -> None:
+    meldingen = {pk: Melding(f"melding {pk}", urgency=pk - 2) for pk in range(1, 4)}
+    action: MeldingRowListAction[Melding] = MeldingRowListAction(InMemoryMeldingRepository(meldingen))
+
+    rows = await action(fields=["urgency", "text"], offset=1)
+
+    assert rows == [{"urgency": 0, "text": "melding 2"}, {"urgency": 1, "text": "melding 3"}]
+
+
+@pytest.mark.anyio
+async def test_melding_row_list_action_rejects_unknown_fields() -> None:
+    repository = Mock(BaseMeldingRepository)
+    action: MeldingRowListAction[Melding] = MeldingRowListAction(repository)
+
+    with pytest.raises(InvalidInputException):
+        await action(fields=["token"])
+
+    repository.list_melding_rows.assert_not_called()
+
+
+@pytest.mark.anyio
+async def test_melding_aggregate_action() -> None:
+    meldingen = {pk: Melding(f"melding {pk}", state="new", urgency=pk % 2) for pk in range(1, 4)}
+    action: MeldingAggregateAction[Melding] = MeldingAggregateAction(InMemoryMeldingRepository(meldingen))
+
+    aggregates = await action(facets=["state", "urgency"])
+
+    assert aggregates == MeldingAggregates(3, {"state": {"new": 3}, "urgency": {1: 2, 0: 1}})
+
+
+@pytest.mark.anyio
+async def test_melding_aggregate_action_without_facets() -> None:
+    repository = AsyncMock(BaseMeldingRepository)
+    repository.count_meldingen.return_value = 5
+    filters = MeldingListFilters(area="AREA")
+    action: MeldingAggregateAction[Melding] = MeldingAggregateAction(repository)
+
+    assert await action(filters=filters) == MeldingAggregates(5)
+    repository.count_meldingen.assert_awaited_once_with(filters)
+    repository.facet_meldingen.assert_not_awaited()
+
+
+@pytest.mark.anyio
+async def test_melding_aggregate_action_takes_total_from_facets() -> None:
+    repository = AsyncMock(BaseMeldingRepository)
+    repository.facet_meldingen.return_value = {"urgency": {0: 2, None: 1}, "state": {"new": 3}}
+    filters = MeldingListFilters(area="AREA")
+    action: MeldingAggregateAction[Melding] = MeldingAggregateAction(repository)
+
+    aggregates = await action(filters=filters, facets=["urgency", "state"])
+
+    assert aggregates == MeldingAggregates(3, {"urgency": {0: 2, None: 1}, "state": {"new": 3}})
+    repository.facet_meldingen.assert_awaited_once_with(filters, ["urgency", "state"])
+    repository.count_meldingen.assert_not_awaited()
+
+
+@pytest.mark.anyio
+async def test_melding_aggregate_action_rejects_unknown_facets() -> None:
+    action: MeldingAggregateAction[Melding] = MeldingAggregateAction(AsyncMock(BaseMeldingRepository))
+
+    with pytest.raises(InvalidInputException) as exception_info:
+        await action(facets=["state", "area"])
+
+    assert str(exception_info.value) == "Unknown facets: area"
+
+
+@pytest.mark.anyio
+async def test_melding_aggregate_action_uses_cache() -> None:
+    repository = AsyncMock(BaseMeldingRepository)
+    repository.facet_meldingen.return_value = {"state": {"new": 5}}
+    action: MeldingAggregateAction[Melding] = MeldingAggregateAction(repository, MeldingAggregateCache())
+
+    first = await action(facets=["state"])
+    second = await action(facets=["state"])
+
+    assert first is second
+    repository.facet_meldingen.assert_awaited_once()
+
+
+@pytest.mark.anyio
+async def test_melding_duplicates_action() -> None:
+    melding = Melding("text")
+    duplicate = Melding("duplicate")
+    repository = InMemoryMeldingRepository({1: melding, 2: duplicate})
+    duplicate_index = Mock(DuplicateCandidateIndex)
+    # A melding that was deleted, but is still in the index
+    duplicate_index.find.return_value = [(2, 10.0), (3, 20.0)]
+    action: MeldingDuplicatesAction[Melding] = MeldingDuplicatesAction(repository, duplicate_index)
+
+    candidates = await action(1)
+
+    assert candidates == [DuplicateCandidate(2, duplicate, 10.0)]
+    duplicate_index.add.assert_not_called()
+    duplicate_index.find.assert_called_once_with(1, melding)
+    assert repository.includes == [("classification",)] * 3
+
+
+@pytest.mark.anyio
+async def test_melding_duplicates_action_melding_not_found() -> None:
+    action: MeldingDuplicatesAction[Melding] = MeldingDuplicatesAction(
+        InMemoryMeldingRepository(), Mock(DuplicateCandidateIndex)
+    )
+
+    with pytest.raises(NotFoundException):
+        await action(1)
+
+
+@pytest.mark.anyio
+async def test_melding_similar_text_action() -> None:
+    meldingen = {
+        1: Melding("De lantaarnpaal voor ons huis is kapot"),
+        2: Melding("de lantaarnpaal voor ons huis is kapot!"),
+        3: Melding("De lantaarnpaal voor ons huis is kapot."),
+        4: Melding("Grofvuil naast de container"),
+    }
+    text_index: MinHashLSHIndex[int] = MinHashLSHIndex()
+    for pk, melding in meldingen.items():
+        text_index.add(pk, melding.text)
+    # A melding that was deleted, but is still in the index
+    text_index.add(5, "De lantaarnpaal voor ons huis is kapot")
+    action: MeldingSimilarTextAction[Melding] = MeldingSimilarTextAction(
+        InMemoryMeldingRepository(meldingen), text_index
+    )
+
+    similar = await action(1, days=1)
+
+    assert similar == [SimilarMelding(2, meldingen[2], 1.0), SimilarMelding(3, meldingen[3], 1.0)]
+
+
+@pytest.mark.anyio
+async def test_melding_similar_text_action_melding_not_found() -> None:
+    action: MeldingSimilarTextAction[Melding] = MeldingSimilarTextAction(InMemoryMeldingRepository(), MinHashLSHIndex())
+
+    with pytest.raises(NotFoundException):
+        await action(1)
+
+
+@pytest.mark.anyio
+async def test_melding_stream_action() -> None:
+    meldingen = {pk: Melding(f"melding {pk}") for pk in range(1, 4)}
+    action: MeldingStreamAction[Melding] = MeldingStreamAction(InMemoryMeldingRepository(meldingen))
+
+    streamed = [melding async for melding in action(filters=MeldingListFilters(area="AREA"), batch_size=2)]
+
+    assert streamed == list(meldingen.values())
+
+
+@pytest.mark.anyio
+async def test_melding_stream_action_chunks() -> None:
+    meldingen = {pk: Melding(f"melding {pk}") for pk in range(1, 4)}
+    action: MeldingStreamAction[Melding] = MeldingStreamAction(InMemoryMeldingRepository(meldingen))
+
+    chunks = [chunk async for chunk in action.chunks(batch_size=2)]
+
+    assert chunks == [[meldingen[1], meldingen[2]], [meldingen[3]]]
+
+
 @pytest.mark.anyio
 async def test_melding_list_action() -> None:
     repository = Mock(BaseMeldingRepository)
@@ -214,6 +502,61 @@ async def test_melding_update_action_melder() -> None:
     assert melding.classification == classification
 
 
+@pytest.mark.anyio
+async def test_melding_update_action_melder_updates_text_index() -> None:
+    text_index = Mock(MinHashLSHIndex)
+    action: MeldingUpdateActionMelder[Melding, Classification] = MeldingUpdateActionMelder(
+        Mock(BaseMeldingRepository),
+        AsyncMock(TokenVerifier),
+        AsyncMock(Classifier),
+        Mock(BaseMeldingStateMachine),
+        AsyncMock(BaseReclassification),
+        text_index,
+    )
+
+    await action(123, {"text": "new text"}, "123456")
+
+    text_index.add.assert_called_once_with(123, "new text")
+
+
+@pytest.mark.anyio
+async def test_melding_update_action_melder_updates_duplicate_index() -> None:
+    melding = Melding("text")
+    duplicate_index = Mock(DuplicateCandidateIndex)
+    action: MeldingUpdateActionMelder[Melding, Classification] = MeldingUpdateActionMelder(
+        Mock(BaseMeldingRepository),
+        AsyncMock(TokenVerifier, return_value=melding),
+        AsyncMock(Classifier),
+        Mock(BaseMeldingStateMachine),
+        AsyncMock(BaseReclassification),
+        duplicate_index=duplicate_index,
+    )
+
+    await action(123, {"text": "new text"}, "123456")
+
+    duplicate_index.add.assert_called_once_with(123, melding)
+
+
+@pytest.mark.anyio
+async def test_melding_update_action_melder_invalidates_verified_melding_cache_when_it_fails() -> None:
+    token = "123456"
+    cache: VerifiedMeldingCache[Melding] = VerifiedMeldingCache()
+    repository = VerifiedMeldingCacheRepository(InMemoryMeldingRepository({123: Melding("text", token=token)}), cache)
+    token_verifier: TokenVerifier[Melding] = TokenVerifier(repository, cache)
+    state_machine = AsyncMock(BaseMeldingStateMachine)
+    state_machine.transition.side_effect = Exception("Transition failed")
+
+    action: MeldingUpdateActionMelder[Melding, Classification] = MeldingUpdateActionMelder(
+        repository, token_verifier, AsyncMock(Classifier), state_machine, AsyncMock(BaseReclassification)
+    )
+
+    await token_verifier(123, token, action.include)
+    with pytest.raises(Exception, match="Transition failed"):
+        await action(123, {"text": "unsaved text"}, token)
+
+    assert cache.get(123, token, action.include) is None
+
+
 @pytest.mark.anyio
 async def test_melding_update_action_melder_with_classification_not_found() -> None:
     token = "123456"
@@ -234,6 +577,73 @@ async def test_melding_update_action_melder_with_classification_not_found() -> N
     assert melding.classification is None
 
 
+@pytest.mark.anyio
+async def test_melding_reclassify_action() -> None:
+    lights, waste = Classification("lights"), Classification("waste")
+    unchanged = Melding("lamp", classification=Classification("lights"))
+    changed = Melding("trash", classification=lights)
+    unclassified = Melding("unknown", classification=waste)
+    new = Melding("garbage")
+    repository = InMemoryMeldingRepository({1: unchanged, 2: changed, 3: unclassified, 4: new})
+    repository.save_many = AsyncMock()  # type: ignore[method-assign]
+    classifier = Mock(Classifier)
+    classifier.classify_many = AsyncMock(side_effect=[[lights, waste, None], [waste]])
+    reclassifier = AsyncMock(BaseReclassification)
+
+    action: MeldingReclassifyAction[Melding, Classification] = MeldingReclassifyAction(
+        repository, classifier, reclassifier, batch_size=3
+    )
+    result = await action()
+
+    assert result == ReclassificationResult(total=4, reclassified=2, unclassified=1)
+    assert changed.classification is waste
+    assert unclassified.classification is waste
+    assert new.classification is waste
+    assert classifier.classify_many.await_args_list == [call(["lamp", "trash", "unknown"]), call(["garbage"])]
+    assert reclassifier.await_args_list == [call(changed, lights, waste), call(new, None, waste)]
+    assert repository.save_many.await_args_list == [call([changed]), call([new])]
+    assert repository.includes == [("classification", "assets")] * 2
+
+
+@pytest.mark.anyio
+async def test_melding_reclassify_action_without_changes() -> None:
+    repository = InMemoryMeldingRepository({1: Melding("text")})
+    repository.save_many = AsyncMock()  # type: ignore[method-assign]
+    classifier = Mock(Classifier)
+    classifier.classify_many = AsyncMock(return_value=[None])
+    filters = MeldingListFilters(has_assets=False)
+
+    action: MeldingReclassifyAction[Melding, Classification] = MeldingReclassifyAction(
+        repository, classifier, AsyncMock(BaseReclassification)
+    )
+
+    assert await action(filters) == ReclassificationResult(total=1, reclassified=0, unclassified=1)
+    repository.save_many.assert_not_awaited()
+
+
+@pytest.mark.anyio
+async def test_melding_reclassify_action_keeps_classifications_when_classifier_is_unavailable() -> None:
+    meldingen = {pk: Melding(f"text {pk}", classification=Classification(f"classification {pk}")) for pk in (1, 2, 3)}
+    repository = InMemoryMeldingRepository(dict(meldingen))
+    repository.save_many = AsyncMock()  # type: ignore[method-assign]
+    classifier = Mock(Classifier)
+    classifier.classify_many = AsyncMock(return_value=[None, None, None])
+    reclassifier = AsyncMock(BaseReclassification)
+
+    action: MeldingReclassifyAction[Melding, Classification] = MeldingReclassifyAction(
+        repository, classifier, reclassifier
+    )
+
+    assert await action() == ReclassificationResult(total=3, reclassified=0, unclassified=3)
+    assert [melding.classification for melding in meldingen.values()] == [
+        Classification("classification 1"),
+        Classification("classification 2"),
+        Classification("classification 3"),
+    ]
+    reclassifier.assert_not_called()
+    repository.save_many.assert_not_awaited()
+
+
 @pytest.mark.anyio
 async def test_melding_add_contact_action() -> None:
     token = "123456"
@@ -251,6 +661,34 @@ async def test_melding_add_contact_action() -> None:
     assert melding.email == email
 
 
+@pytest.mark.anyio
+async def test_melding_add_contact_action_invalidates_verified_melding_cache() -> None:
+    token = "123456"
+    cache: VerifiedMeldingCache[Melding] = VerifiedMeldingCache()
+    repository = VerifiedMeldingCacheRepository(InMemoryMeldingRepository({123: Melding("text", token=token)}), cache)
+    token_verifier: TokenVerifier[Melding] = TokenVerifier(repository, cache)
+
+    action: MeldingAddContactInfoAction[Melding] = MeldingAddContactInfoAction(repository, token_verifier)
+
+    await action(123, "1234567", "user@test.com", token)
+
+    assert cache.get(123, token) is None
+
+
+@pytest.mark.anyio
+async def test_state_transition_action_invalidates_verified_melding_cache() -> None:
+    token = "123456"
+    melding = Melding("text", token=token, state=MeldingStates.SUBMITTED)
+    cache: VerifiedMeldingCache[Melding] = VerifiedMeldingCache()
+    cache.set(123, token, melding)
+    repository = VerifiedMeldingCacheRepository(InMemoryMeldingRepository({123: melding}), cache)
+
+    action: MeldingProcessAction[Melding] = MeldingProcessAction(AsyncMock(BaseMeldingStateMachine), repository)
+    await action(123)
+
+    assert cache.get(123, token) is None
+
+
 @pytest.mark.anyio
 async def test_melding_add_contact_action_not_found() -> None:
     repository = Mock(BaseMeldingRepository)
@@ -319,6 +757,65 @@ async def test_process_action_not_found() -> None:
         await process(1)
 
 
+@pytest.mark.anyio
+@pytest.mark.parametrize(
+    "action_class,transition",
+    [
+        (MeldingBulkProcessAction, MeldingTransitions.PROCESS),
+        (MeldingBulkPlanAction, MeldingTransitions.PLAN),
+        (MeldingBulkCancelAction, MeldingTransitions.CANCEL),
+    ],
+)
+async def test_bulk_state_transition_action(
+    action_class: type[MeldingBulkProcessAction[Melding]], transition: MeldingTransitions
+) -> None:
+    first = Melding("first")
+    second = Melding("second")
+    repository = InMemoryMeldingRepository({1: first, 2: second})
+    repository.save_many = AsyncMock()  # type: ignore[method-assign]
+    state_machine = Mock(BaseMeldingStateMachine)
+
+    action = action_class(state_machine, repository)
+
+    results = await action([1, 2])
+
+    assert [(result.melding_id, result.melding, result.succeeded) for result in results] == [
+        (1, first, True),
+        (2, second, True),
+    ]
+    state_machine.transition.assert_has_awaits([call(first, transition), call(second, transition)])
+    repository.save_many.assert_awaited_once_with([first, second])
+
+
+@pytest.mark.anyio
+async def test_bulk_state_transition_action_reports_failures_per_melding() -> None:
+    first = Melding("first")
+    second = Melding("second")
+    repository = InMemoryMeldingRepository({1: first, 2: second})
+    repository.save_many = AsyncMock()  # type: ignore[method-assign]
+    error = ValueError("Transition not allowed")
+    state_machine = Mock(BaseMeldingStateMachine)
+
+    async def transition(melding: Melding, transition_name: str) -> None:
+        if melding is first:
+            raise error
+
+    state_machine.transition.side_effect = transition
+
+    action: MeldingBulkProcessAction[Melding] = MeldingBulkProcessAction(state_machine, repository, max_concurrency=1)
+
+    results = await action([1, 3, 2, 1])
+
+    assert [result.melding_id for result in results] == [1, 3, 2]
+    assert not results[0].succeeded
+    assert results[0].error is error
+    assert not results[1].succeeded
+    assert results[1].melding is None
+    assert isinstance(results[1].error, NotFoundException)
+    assert results[2].succeeded
+    repository.save_many.assert_awaited_once_with([second])
+
+
 @pytest.mark.anyio
 async def test_plan_action() -> None:
     state_machine = Mock(BaseMeldingStateMachine)
@@ -710,12 +1207,16 @@ async def test_submit_melding_melding_not_found() -> None:
 async def test_add_asset_asset_type_not_found() -> None:
     asset_type_repository = Mock(BaseAssetTypeRepository)
     asset_type_repository.retrieve.return_value = None
+    token_verifier = AsyncMock(TokenVerifier)
+    token_verifier.return_value = Melding(
+        "text", classification=Classification("test", asset_type=AssetType("type", "class_name", {}, 10))
+    )
 
     asset_repository = Mock(BaseAssetRepository)
     asset_repository.find_by_external_id_and_asset_type_id.return_value = None
 
     action: MeldingAddAssetAction[Melding, Asset, AssetType] = MeldingAddAssetAction(
-        AsyncMock(TokenVerifier),
+        token_verifier,
         Mock(BaseMeldingRepository),
         asset_repository,
         asset_type_repository,
@@ -733,7 +1234,8 @@ async def test_add_asset_asset_does_not_yet_exist() -> None:
 
     asset_type_repository = Mock(BaseAssetTypeRepository)
     asset_type_repository.retrieve.return_value = asset_type
-    asset_type_repository.find_by_melding.return_value = asset_type
+    token_verifier = AsyncMock(TokenVerifier)
+    token_verifier.return_value = Melding("text", classification=Classification("test", asset_type=asset_type))
 
     relationship_manager = AsyncMock(RelationshipManager)
     relationship_manager.get_related.return_value = [Mock(Asset) for _ in range(5)]
@@ -742,7 +1244,7 @@ async def test_add_asset_asset_does_not_yet_exist() -> None:
     asset_repository.find_by_external_id_and_asset_type_id.return_value = None
 
     action: MeldingAddAssetAction[Melding, Asset, AssetType] = MeldingAddAssetAction(
-        AsyncMock(TokenVerifier),
+        token_verifier,
         Mock(BaseMeldingRepository),
         asset_repository,
         asset_type_repository,
@@ -752,6 +1254,7 @@ async def test_add_asset_asset_does_not_yet_exist() -> None:
 
     melding = await action(123, "external_id", 456, "token")
     assert melding is not None
+    asset_type_repository.find_by_melding.assert_not_called()
 
 
 @pytest.mark.anyio
@@ -760,13 +1263,14 @@ async def test_add_asset_asset_exists() -> None:
 
     asset_type_repository = Mock(BaseAssetTypeRepository)
     asset_type_repository.retrieve.return_value = asset_type
-    asset_type_repository.find_by_melding.return_value = asset_type
+    token_verifier = AsyncMock(TokenVerifier)
+    token_verifier.return_value = Melding("text", classification=Classification("test", asset_type=asset_type))
 
     relationship_manager = AsyncMock(RelationshipManager)
     relationship_manager.get_related.return_value = [Mock(Asset) for _ in range(5)]
 
     action: MeldingAddAssetAction[Melding, Asset, AssetType] = MeldingAddAssetAction(
-        AsyncMock(TokenVerifier),
+        token_verifier,
         Mock(BaseMeldingRepository),
         Mock(BaseAssetRepository),
         asset_type_repository,
@@ -784,13 +1288,14 @@ async def test_add_asset_asset_type_on_melding_does_not_exist() -> None:
 
     asset_type_repository = Mock(BaseAssetTypeRepository)
     asset_type_repository.retrieve.return_value = asset_type
-    asset_type_repository.find_by_melding.return_value = None
+    token_verifier = AsyncMock(TokenVerifier)
+    token_verifier.return_value = Melding("text", classification=Classification("test", asset_type=None))
 
     relationship_manager = AsyncMock(RelationshipManager)
     relationship_manager.get_related.return_value = [Mock(Asset) for _ in range(5)]
 
     action: MeldingAddAssetAction[Melding, Asset, AssetType] = MeldingAddAssetAction(
-        AsyncMock(TokenVerifier),
+        token_verifier,
         Mock(BaseMeldingRepository),
         Mock(BaseAssetRepository),
         asset_type_repository,
@@ -802,19 +1307,47 @@ async def test_add_asset_asset_type_on_melding_does_not_exist() -> None:
         await action(123, "external_id", 456, "token")
 
 
+@pytest.mark.anyio
+async def test_add_asset_melding_not_classified() -> None:
+    asset_type_repository = Mock(BaseAssetTypeRepository)
+    token_verifier = AsyncMock(TokenVerifier)
+    token_verifier.return_value = Melding("text")
+
+    action: MeldingAddAssetAction[Melding, Asset, AssetType] = MeldingAddAssetAction(
+        token_verifier,
+        Mock(BaseMeldingRepository),
+        Mock(BaseAssetRepository),
+        asset_type_repository,
+        Mock(BaseAssetFactory),
+        AsyncMock(RelationshipManager),
+    )
+
+    with pytest.raises(NotFoundException):
+        await action(123, "external_id", 456, "token")
+
+    asset_type_repository.retrieve.assert_not_called()
+
+
 @pytest.mark.anyio
 async def test_add_asset_asset_type_does_not_exist() -> None:
     asset_type_repository = Mock(BaseAssetTypeRepository)
     asset_type_repository.retrieve.return_value = None
-    asset_type_repository.find_by_melding.return_value = AssetType(
-        name="different_asset_type", class_name="different_class_name", arguments={}, max_assets=1
+    token_verifier = AsyncMock(TokenVerifier)
+    token_verifier.return_value = Melding(
+        "text",
+        classification=Classification(
+            "test",
+            asset_type=AssetType(
+                name="different_asset_type", class_name="different_class_name", arguments={}, max_assets=1
+            ),
+        ),
     )
 
     relationship_manager = AsyncMock(RelationshipManager)
     relationship_manager.get_related.return_value = [Mock(Asset) for _ in range(5)]
 
     action: MeldingAddAssetAction[Melding, Asset, AssetType] = MeldingAddAssetAction(
-        AsyncMock(TokenVerifier),
+        token_verifier,
         Mock(BaseMeldingRepository),
         Mock(BaseAssetRepository),
         asset_type_repository,
@@ -832,15 +1365,22 @@ async def test_add_asset_wrong_asset_type() -> None:
     asset_type_repository = Mock(BaseAssetTypeRepository)
 
     asset_type_repository.retrieve.return_value = asset_type
-    asset_type_repository.find_by_melding.return_value = AssetType(
-        name="different_asset_type", class_name="different_class_name", arguments={}, max_assets=1
+    token_verifier = AsyncMock(TokenVerifier)
+    token_verifier.return_value = Melding(
+        "text",
+        classification=Classification(
+            "test",
+            asset_type=AssetType(
+                name="different_asset_type", class_name="different_class_name", arguments={}, max_assets=1
+            ),
+        ),
     )
 
     relationship_manager = AsyncMock(RelationshipManager)
     relationship_manager.get_related.return_value = [Mock(Asset) for _ in range(5)]
 
     action: MeldingAddAssetAction[Melding, Asset, AssetType] = MeldingAddAssetAction(
-        AsyncMock(TokenVerifier),
+        token_verifier,
         Mock(BaseMeldingRepository),
         Mock(BaseAssetRepository),
         asset_type_repository,
@@ -858,14 +1398,15 @@ async def test_add_asset_already_linked() -> None:
 
     asset_type_repository = Mock(BaseAssetTypeRepository)
     asset_type_repository.retrieve.return_value = asset_type
-    asset_type_repository.find_by_melding.return_value = asset_type
+    token_verifier = AsyncMock(TokenVerifier)
+    token_verifier.return_value = Melding("text", classification=Classification("test", asset_type=asset_type))
 
     relationship_manager = AsyncMock(RelationshipManager)
     relationship_manager.add_relationship.side_effect = RelationshipExistsException("Relationship already exists")
     relationship_manager.get_related.return_value = [Mock(Asset) for _ in range(5)]
 
     action: MeldingAddAssetAction[Melding, Asset, AssetType] = MeldingAddAssetAction(
-        AsyncMock(TokenVerifier),
+        token_verifier,
         Mock(BaseMeldingRepository),
         Mock(BaseAssetRepository),
         asset_type_repository,
@@ -883,7 +1424,8 @@ async def test_add_asset_limit_exceeded() -> None:
 
     asset_type_repository = Mock(BaseAssetTypeRepository)
     asset_type_repository.retrieve.return_value = asset_type
-    asset_type_repository.find_by_melding.return_value = asset_type
+    token_verifier = AsyncMock(TokenVerifier)
+    token_verifier.return_value = Melding("text", classification=Classification("test", asset_type=asset_type))
 
     asset_repository = Mock(BaseAssetRepository)
     asset_repository.find_by_external_id_and_asset_type_id.return_value = None
@@ -892,7 +1434,7 @@ async def test_add_asset_limit_exceeded() -> None:
     relationship_manager.get_related.return_value = [Mock(Asset) for _ in range(5)]
 
     action: MeldingAddAssetAction[Melding, Asset, AssetType] = MeldingAddAssetAction(
-        AsyncMock(TokenVerifier),
+        token_verifier,
         Mock(BaseMeldingRepository),
         asset_repository,
         asset_type_repository,
@@ -916,7 +1458,7 @@ async def test_list_assets() -> None:
     action: ListAssetsAction[Asset, Melding] = ListAssetsAction(melding_repository, relationship_manager)
     await action(melding_id)
 
-    melding_repository.retrieve.assert_awaited_once_with(melding_id)
+    melding_repository.retrieve.assert_awaited_once_with(melding_id, ("assets",))
     relationship_manager.get_related.assert_awaited_once_with(melding)
 
 
@@ -1031,6 +1573,7 @@ async def test_delete_asset_asset_exists() -> None:
     await action(123, 456, "token")
 
     asset_repository.delete.assert_awaited_once_with(456)
+    token_verifier.invalidate.assert_called_once_with(123)
 
 
 @pytest.mark.anyio
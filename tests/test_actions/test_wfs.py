@@ -1,12 +1,24 @@
+import json
+from typing import AsyncIterator
 from unittest.mock import AsyncMock, Mock
 
 import pytest
 
-from meldingen_core.actions.wfs import WfsRetrieveAction
-from meldingen_core.exceptions import NotFoundException
+from meldingen_core.actions.wfs import WfsRetrieveAction, WfsTiledRetrieveAction
+from meldingen_core.exceptions import InvalidInputException, NotFoundException
 from meldingen_core.models import AssetType
 from meldingen_core.repositories import BaseAssetTypeRepository
-from meldingen_core.wfs import AssetTypeToWfsProviderConverter, BaseWfsProvider
+from meldingen_core.spatial import BoundingBox
+from meldingen_core.wfs import (
+    AssetTypeToWfsProviderConverter,
+    BaseWfsProvider,
+    InMemoryWfsResponseCache,
+    WfsRequestCoalescer,
+    WfsTileCache,
+    WfsTileGrid,
+    bbox_filter,
+)
+from tests.test_wfs import collect, iterate
 
 
 class TestWfsAction:
@@ -56,3 +68,231 @@ class TestWfsAction:
             await action(asset_type_id=1, type_names="test")
 
         assert str(exception_info.value) == "AssetType not found"
+
+    @pytest.mark.anyio
+    async def test_retrieve_action_serves_cached_response(self) -> None:
+        asset_type = AssetType("name", "module.Factory", {"cache_ttl": 60}, 3)
+        repository = AsyncMock(BaseAssetTypeRepository)
+        repository.retrieve.return_value = asset_type
+
+        provider = AsyncMock(BaseWfsProvider)
+        provider.side_effect = lambda *args: iterate([b'{"features": ', b"[]}"])
+        converter = Mock(AssetTypeToWfsProviderConverter)
+        converter.return_value = provider
+
+        action: WfsRetrieveAction[AssetType] = WfsRetrieveAction(converter, repository, InMemoryWfsResponseCache())
+
+        assert await collect(await action(asset_type_id=1, type_names="test")) == [b'{"features": ', b"[]}"]
+        assert await collect(await action(asset_type_id=1, type_names="test")) == [b'{"features": ', b"[]}"]
+
+        provider.assert_awaited_once()
+        converter.assert_called_once_with(asset_type)
+
+    @pytest.mark.anyio
+    async def test_retrieve_action_caches_per_request_parameters(self) -> None:
+        asset_type = AssetType("name", "module.Factory", {"cache_ttl": 60}, 3)
+        repository = AsyncMock(BaseAssetTypeRepository)
+        repository.retrieve.return_value = asset_type
+
+        provider = AsyncMock(BaseWfsProvider)
+        provider.side_effect = lambda *args: iterate([b"{}"])
+        converter = Mock(AssetTypeToWfsProviderConverter)
+        converter.return_value = provider
+
+        action: WfsRetrieveAction[AssetType] = WfsRetrieveAction(converter, repository, InMemoryWfsResponseCache())
+
+        await collect(await action(asset_type_id=1, type_names="test"))
+        await collect(await action(asset_type_id=1, type_names="test", filter="<Filter/>"))
+
+        assert provider.await_count == 2
+
+    @pytest.mark.anyio
+    @pytest.mark.parametrize("arguments", [{}, {"cache_ttl": 0}, {"cache_ttl": "60"}])
+    async def test_retrieve_action_does_not_cache_without_ttl(self, arguments: dict[str, object]) -> None:
+        asset_type = AssetType("name", "module.Factory", arguments, 3)
+        repository = AsyncMock(BaseAssetTypeRepository)
+        repository.retrieve.return_value = asset_type
+
+        provider = AsyncMock(BaseWfsProvider)
+        provider.side_effect = lambda *args: iterate([b"{}"])
+        converter = Mock(AssetTypeToWfsProviderConverter)
+        converter.return_value = provider
+
+        action: WfsRetrieveAction[AssetType] = WfsRetrieveAction(converter, repository, InMemoryWfsResponseCache())
+
+        await collect(await action(asset_type_id=1, type_names="test"))
+        await collect(await action(asset_type_id=1, type_names="test"))
+
+        assert provider.await_count == 2
+
+    @pytest.mark.anyio
+    async def test_retrieve_action_coalesces_concurrent_requests(self) -> None:
+        asset_type = AssetType("name", "module.Factory", {}, 3)
+        repository = AsyncMock(BaseAssetTypeRepository)
+        repository.retrieve.return_value = asset_type
+
+        provider = AsyncMock(BaseWfsProvider)
+        provider.side_effect = lambda *args: iterate([b"{}"])
+        converter = Mock(AssetTypeToWfsProviderConverter)
+        converter.return_value = provider
+
+        action: WfsRetrieveAction[AssetType] = WfsRetrieveAction(
+            converter, repository, request_coalescer=WfsRequestCoalescer()
+        )
+
+        first = await action(asset_type_id=1, type_names="test")
+        second = await action(asset_type_id=1, type_names="test")
+
+        assert await collect(first) == [b"{}"]
+        assert await collect(second) == [b"{}"]
+        provider.assert_awaited_once()
+
+    @pytest.mark.anyio
+    async def test_retrieve_action_coalesces_requests_that_miss_the_cache(self) -> None:
+        asset_type = AssetType("name", "module.Factory", {"cache_ttl": 60}, 3)
+        repository = AsyncMock(BaseAssetTypeRepository)
+        repository.retrieve.return_value = asset_type
+
+        provider = AsyncMock(BaseWfsProvider)
+        provider.side_effect = lambda *args: iterate([b"{}"])
+        converter = Mock(AssetTypeToWfsProviderConverter)
+        converter.return_value = provider
+
+        action: WfsRetrieveAction[AssetType] = WfsRetrieveAction(
+            converter, repository, InMemoryWfsResponseCache(), WfsRequestCoalescer()
+        )
+
+        first = await action(asset_type_id=1, type_names="test")
+        second = await action(asset_type_id=1, type_names="test")
+        assert await collect(first) == [b"{}"]
+        assert await collect(second) == [b"{}"]
+
+        assert await collect(await action(asset_type_id=1, type_names="test")) == [b"{}"]
+        provider.assert_awaited_once()
+
+
+class TestWfsTiledRetrieveAction:
+    @staticmethod
+    def create_provider(grid: WfsTileGrid) -> AsyncMock:
+        # Every tile contains a feature of its own and a feature that lies on the boundary between tiles
+        tiles = {bbox_filter(grid.bbox((column, 0)), "urn:ogc:def:crs:EPSG::4326"): column for column in range(-1, 3)}
+
+        def respond(*args: object) -> AsyncIterator[bytes]:
+            column = tiles[str(args[-1])]
+            features = [{"id": f"tile-{column}"}, {"id": "boundary"}]
+            return iterate([json.dumps({"type": "FeatureCollection", "features": features}).encode()])
+
+        provider = AsyncMock(BaseWfsProvider)
+        provider.side_effect = respond
+        return provider
+
+    @staticmethod
+    async def features(data: AsyncIterator[bytes]) -> list[object]:
+        return [feature["id"] for feature in json.loads(b"".join(await collect(data)))["features"]]
+
+    def test_can_instantiate_tiled_retrieve_action(self) -> None:
+        action: WfsTiledRetrieveAction[AssetType] = WfsTiledRetrieveAction(
+            Mock(AssetTypeToWfsProviderConverter), Mock(BaseAssetTypeRepository), WfsTileGrid(1)
+        )
+        assert isinstance(action, WfsTiledRetrieveAction)
+
+    @pytest.mark.anyio
+    async def test_asset_type_not_found(self) -> None:
+        repository = AsyncMock(BaseAssetTypeRepository)
+        repository.retrieve.return_value = None
+
+        action: WfsTiledRetrieveAction[AssetType] = WfsTiledRetrieveAction(
+            Mock(AssetTypeToWfsProviderConverter), repository, WfsTileGrid(1)
+        )
+
+        with pytest.raises(NotFoundException) as exception_info:
+            await action(asset_type_id=1, type_names="test", bbox=BoundingBox(0, 0, 1, 1))
+
+        assert str(exception_info.value) == "AssetType not found"
+
+    @pytest.mark.anyio
+    async def test_raises_when_bbox_covers_too_many_tiles(self) -> None:
+        repository = AsyncMock(BaseAssetTypeRepository)
+        repository.retrieve.return_value = AssetType("name", "module.Factory", {}, 3)
+
+        action: WfsTiledRetrieveAction[AssetType] = WfsTiledRetrieveAction(
+            Mock(AssetTypeToWfsProviderConverter), repository, WfsTileGrid(1), max_tiles=4
+        )
+
+        with pytest.raises(InvalidInputException) as exception_info:
+            await action(asset_type_id=1, type_names="test", bbox=BoundingBox(0, 0, 3, 3))
+
+        assert str(exception_info.value) == "Bounding box covers 9 tiles, the maximum is 4"
+
+    @pytest.mark.anyio
+    async def test_fetches_tiles_and_merges_features(self) -> None:
+        grid = WfsTileGrid(1)
+        repository = AsyncMock(BaseAssetTypeRepository)
+        repository.retrieve.return_value = AssetType("name", "module.Factory", {}, 3)
+        provider = self.create_provider(grid)
+        converter = Mock(AssetTypeToWfsProviderConverter)
+        converter.return_value = provider
+
+        action: WfsTiledRetrieveAction[AssetType] = WfsTiledRetrieveAction(converter, repository, grid)
+
+        data = await action(asset_type_id=1, type_names="test", bbox=BoundingBox(0.5, 0.2, 1.5, 0.8))
+
+        assert await self.features(data) == ["tile-0", "boundary", "tile-1"]
+        assert provider.await_count == 2
+
+    @pytest.mark.anyio
+    async def test_reuses_cached_tiles(self) -> None:
+        grid = WfsTileGrid(1)
+        repository = AsyncMock(BaseAssetTypeRepository)
+        repository.retrieve.return_value = AssetType("name", "module.Factory", {"cache_ttl": 60}, 3)
+        provider = self.create_provider(grid)
+        converter = Mock(AssetTypeToWfsProviderConverter)
+        converter.return_value = provider
+
+        action: WfsTiledRetrieveAction[AssetType] = WfsTiledRetrieveAction(converter, repository, grid, WfsTileCache())
+
+        await collect(await action(asset_type_id=1, type_names="test", bbox=BoundingBox(0.5, 0.2, 1.5, 0.8)))
+        assert provider.await_count == 2
+
+        data = await action(asset_type_id=1, type_names="test", bbox=BoundingBox(1.5, 0.2, 2.5, 0.8))
+        assert await self.features(data) == ["tile-1", "boundary", "tile-2"]
+        assert provider.await_count == 3
+
+        data = await action(asset_type_id=1, type_names="test", bbox=BoundingBox(0.1, 0.2, 2.9, 0.8))
+        assert await self.features(data) == ["tile-0", "boundary", "tile-1", "tile-2"]
+        assert provider.await_count == 3
+        converter.assert_called()
+
+    @pytest.mark.anyio
+    async def test_does_not_cache_tiles_without_ttl(self) -> None:
+        grid = WfsTileGrid(1)
+        repository = AsyncMock(BaseAssetTypeRepository)
+        repository.retrieve.return_value = AssetType("name", "module.Factory", {}, 3)
+        provider = self.create_provider(grid)
+        converter = Mock(AssetTypeToWfsProviderConverter)
+        converter.return_value = provider
+
+        action: WfsTiledRetrieveAction[AssetType] = WfsTiledRetrieveAction(converter, repository, grid, WfsTileCache())
+
+        await collect(await action(asset_type_id=1, type_names="test", bbox=BoundingBox(0.5, 0.2, 0.8, 0.8)))
+        await collect(await action(asset_type_id=1, type_names="test", bbox=BoundingBox(0.5, 0.2, 0.8, 0.8)))
+
+        assert provider.await_count == 2
+
+    @pytest.mark.anyio
+    async def test_does_not_cache_truncated_tiles(self) -> None:
+        grid = WfsTileGrid(1)
+        repository = AsyncMock(BaseAssetTypeRepository)
+        repository.retrieve.return_value = AssetType("name", "module.Factory", {"cache_ttl": 60}, 3)
+        provider = self.create_provider(grid)
+        converter = Mock(AssetTypeToWfsProviderConverter)
+        converter.return_value = provider
+
+        action: WfsTiledRetrieveAction[AssetType] = WfsTiledRetrieveAction(converter, repository, grid, WfsTileCache())
+
+        # Every tile contains two features, so a count of two may have truncated them
+        data = await action(asset_type_id=1, type_names="test", bbox=BoundingBox(0.5, 0.2, 0.8, 0.8), count=2)
+        assert await self.features(data) == ["tile-0", "boundary"]
+        await collect(await action(asset_type_id=1, type_names="test", bbox=BoundingBox(0.5, 0.2, 0.8, 0.8), count=2))
+
+        assert provider.await_count == 2
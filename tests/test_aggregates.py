@@ -0,0 +1,68 @@
+from datetime import datetime
+
+from meldingen_core.aggregates import MeldingAggregateCache, MeldingAggregates, facet_value, filters_key
+from meldingen_core.filters import MeldingListFilters
+from meldingen_core.models import Classification, Melding
+from meldingen_core.spatial import BoundingBox
+from meldingen_core.statemachine import MeldingStates
+from tests.test_cache import FakeClock
+
+
+def test_facet_value() -> None:
+    melding = Melding("text", classification=Classification("classification"), state="new", urgency=1)
+
+    assert facet_value(melding, "state") == "new"
+    assert facet_value(melding, "classification") == "classification"
+    assert facet_value(melding, "urgency") == 1
+    assert facet_value(Melding("text"), "classification") is None
+
+
+def test_filters_key() -> None:
+    filters = MeldingListFilters(
+        within=BoundingBox(0, 0, 1, 1),
+        states=[MeldingStates.NEW, MeldingStates.SUBMITTED],
+        labels=(1, 2),
+        created_after=datetime(2024, 1, 1),
+    )
+    same = MeldingListFilters(
+        within=BoundingBox(0, 0, 1, 1),
+        states=[MeldingStates.SUBMITTED, MeldingStates.NEW],
+        labels=[2, 1],
+        created_after=datetime(2024, 1, 1),
+    )
+
+    assert filters_key(filters) == filters_key(same)
+    assert hash(filters_key(filters)) == hash(filters_key(same))
+    assert filters_key(filters) != filters_key(MeldingListFilters(states=[MeldingStates.NEW]))
+    assert filters_key(MeldingListFilters(labels=[])) != filters_key(MeldingListFilters())
+
+
+def test_aggregate_cache_is_keyed_on_filters_and_facets() -> None:
+    cache = MeldingAggregateCache()
+    aggregates = MeldingAggregates(3, {"urgency": {0: 3}})
+
+    cache.set(MeldingListFilters(states=[MeldingStates.NEW]), ["urgency", "state"], aggregates)
+
+    assert cache.get(MeldingListFilters(states=[MeldingStates.NEW]), ["state", "urgency"]) is aggregates
+    assert cache.get(MeldingListFilters(states=[MeldingStates.SUBMITTED]), ["state", "urgency"]) is None
+    assert cache.get(MeldingListFilters(states=[MeldingStates.NEW]), ["state"]) is None
+    assert cache.get(None, ["state", "urgency"]) is None
+
+
+def test_aggregate_cache_expires() -> None:
+    clock = FakeClock()
+    cache = MeldingAggregateCache(ttl=10, clock=clock)
+    cache.set(None, [], MeldingAggregates(3))
+
+    clock.now = 10
+
+    assert cache.get(None, []) is None
+
+
+def test_aggregate_cache_clear() -> None:
+    cache = MeldingAggregateCache()
+    cache.set(None, [], MeldingAggregates(3))
+
+    cache.clear()
+
+    assert cache.get(None, []) is None
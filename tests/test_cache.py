@@ -0,0 +1,170 @@
+import pytest
+
+from meldingen_core.cache import CacheMetrics, LRUCache
+
+
+class FakeClock:
+    now: float
+
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_get_returns_none_for_missing_key() -> None:
+    cache: LRUCache[str, int] = LRUCache(10)
+
+    assert cache.get("missing") is None
+    assert "missing" not in cache
+
+
+def test_set_and_get() -> None:
+    cache: LRUCache[str, int] = LRUCache(10)
+
+    assert cache.set("key", 1) == []
+
+    assert cache.get("key") == 1
+    assert "key" in cache
+    assert len(cache) == 1
+    assert cache.size == 1
+
+
+def test_evicts_least_recently_used_entry() -> None:
+    cache: LRUCache[str, int] = LRUCache(2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+
+    evicted = cache.set("c", 3)
+
+    assert evicted == [("b", 2)]
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+def test_evicts_until_size_fits() -> None:
+    cache: LRUCache[str, str] = LRUCache(10)
+    cache.set("a", "aaaa", size=4)
+    cache.set("b", "bbbb", size=4)
+
+    evicted = cache.set("c", "cccccccc", size=8)
+
+    assert evicted == [("a", "aaaa"), ("b", "bbbb")]
+    assert cache.size == 8
+
+
+def test_does_not_store_value_larger_than_max_size() -> None:
+    cache: LRUCache[str, str] = LRUCache(4)
+
+    assert cache.set("a", "aaaaa", size=5) == []
+
+    assert cache.get("a") is None
+    assert cache.size == 0
+
+
+def test_replacing_entry_returns_previous_value() -> None:
+    cache: LRUCache[str, int] = LRUCache(10)
+    cache.set("a", 1, size=3)
+
+    evicted = cache.set("a", 2, size=2)
+
+    assert evicted == [("a", 1)]
+    assert cache.get("a") == 2
+    assert cache.size == 2
+
+
+def test_replacing_entry_with_same_value_is_not_evicted() -> None:
+    cache: LRUCache[str, str] = LRUCache(10)
+    value = "value"
+    cache.set("a", value)
+
+    assert cache.set("a", value) == []
+
+
+def test_entry_expires_after_ttl() -> None:
+    clock = FakeClock()
+    cache: LRUCache[str, int] = LRUCache(10, clock)
+    cache.set("a", 1, ttl=5)
+
+    clock.now = 4.9
+    assert cache.get("a") == 1
+
+    clock.now = 5
+    assert "a" not in cache
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_items_skips_expired_entries() -> None:
+    clock = FakeClock()
+    cache: LRUCache[str, int] = LRUCache(10, clock)
+    cache.set("a", 1, ttl=1)
+    cache.set("b", 2)
+
+    clock.now = 1
+
+    assert cache.items() == [("b", 2)]
+
+
+def test_pop() -> None:
+    cache: LRUCache[str, int] = LRUCache(10)
+    cache.set("a", 1)
+
+    assert cache.pop("a") == 1
+    assert cache.pop("a") is None
+    assert cache.size == 0
+
+
+def test_pop_expired() -> None:
+    clock = FakeClock()
+    cache: LRUCache[str, int] = LRUCache(10, clock)
+    cache.set("a", 1, ttl=1)
+    cache.set("b", 2, ttl=10)
+    cache.set("c", 3)
+
+    clock.now = 5
+
+    assert cache.pop_expired() == [("a", 1)]
+    assert len(cache) == 2
+
+
+def test_pop_if_expired() -> None:
+    clock = FakeClock()
+    cache: LRUCache[str, int] = LRUCache(10, clock)
+    cache.set("a", 1, ttl=1)
+    cache.set("b", 2, ttl=1)
+    cache.set("c", 3)
+
+    clock.now = 5
+
+    assert cache.pop_if_expired("a") == 1
+    assert cache.pop_if_expired("c") is None
+    assert cache.pop_if_expired("d") is None
+    assert len(cache) == 2
+    assert cache.size == 2
+
+
+def test_clear() -> None:
+    cache: LRUCache[str, int] = LRUCache(10)
+    cache.set("a", 1)
+
+    cache.clear()
+
+    assert len(cache) == 0
+    assert cache.size == 0
+
+
+def test_cache_metrics() -> None:
+    metrics = CacheMetrics()
+
+    assert metrics.hit_ratio == 0.0
+
+    metrics.record(True)
+    metrics.record(True)
+    metrics.record(False)
+
+    assert metrics == CacheMetrics(hits=2, misses=1)
+    assert metrics.hit_ratio == pytest.approx(2 / 3)
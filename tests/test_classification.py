@@ -1,11 +1,27 @@
 from unittest.mock import AsyncMock, Mock
 
+import anyio
 import pytest
 
-from meldingen_core.classification import BaseClassifierAdapter, ClassificationNotFoundException, Classifier
+from meldingen_core.cache import CacheMetrics
+from meldingen_core.classification import (
+    BaseClassifierAdapter,
+    CachingClassifierAdapter,
+    CircuitBreaker,
+    CircuitState,
+    ClassificationCatalog,
+    ClassificationNameCache,
+    ClassificationNotFoundException,
+    Classifier,
+    KeywordClassifierAdapter,
+    ResilientClassifierAdapter,
+    normalize_text,
+)
 from meldingen_core.exceptions import NotFoundException
 from meldingen_core.models import Classification
+from meldingen_core.pagination import Cursor
 from meldingen_core.repositories import BaseClassificationRepository
+from tests.test_cache import FakeClock
 
 
 @pytest.mark.anyio
@@ -43,3 +59,531 @@ async def test_classifier_classification_not_found() -> None:
 
     with pytest.raises(ClassificationNotFoundException):
         await classify("text")
+
+
+def test_normalize_text() -> None:
+    assert normalize_text("  De lantaarnpaal\nis  KAPOT ") == "de lantaarnpaal is kapot"
+
+
+@pytest.mark.anyio
+async def test_caching_classifier_adapter() -> None:
+    adapter = AsyncMock(BaseClassifierAdapter, return_value="streetlight")
+    classify = CachingClassifierAdapter(adapter)
+
+    assert await classify("De lantaarnpaal is kapot") == "streetlight"
+    assert await classify("de lantaarnpaal  is kapot ") == "streetlight"
+
+    adapter.assert_awaited_once_with("De lantaarnpaal is kapot")
+    assert classify.metrics == CacheMetrics(hits=1, misses=1)
+
+
+@pytest.mark.anyio
+async def test_caching_classifier_adapter_caches_missing_classification() -> None:
+    adapter = AsyncMock(BaseClassifierAdapter, return_value=None)
+    classify = CachingClassifierAdapter(adapter)
+
+    assert await classify("text") is None
+    assert await classify("text") is None
+
+    adapter.assert_awaited_once()
+
+
+@pytest.mark.anyio
+async def test_caching_classifier_adapter_expires_missing_classification_early() -> None:
+    clock = FakeClock()
+    adapter = AsyncMock(BaseClassifierAdapter, side_effect=[None, "streetlight"])
+    classify = CachingClassifierAdapter(adapter, ttl=3600, clock=clock, missing_ttl=60)
+
+    assert await classify("text") is None
+    clock.now = 60
+    assert await classify("text") == "streetlight"
+    clock.now = 120
+    assert await classify("text") == "streetlight"
+
+    assert adapter.await_count == 2
+
+
+@pytest.mark.anyio
+async def test_caching_classifier_adapter_does_not_cache_missing_classification_without_missing_ttl() -> None:
+    adapter = AsyncMock(BaseClassifierAdapter, return_value=None)
+    adapter.classify_many = AsyncMock(return_value=[None])
+    classify = CachingClassifierAdapter(adapter, missing_ttl=0)
+
+    assert await classify("text") is None
+    assert await classify.classify_many(["text"]) == [None]
+    assert await classify("text") is None
+
+    assert adapter.await_count == 2
+    adapter.classify_many.assert_awaited_once()
+
+
+@pytest.mark.anyio
+async def test_caching_classifier_adapter_expires_and_clears() -> None:
+    clock = FakeClock()
+    adapter = AsyncMock(BaseClassifierAdapter, return_value="streetlight")
+    classify = CachingClassifierAdapter(adapter, ttl=10, clock=clock)
+
+    await classify("text")
+    clock.now = 10
+    await classify("text")
+    classify.clear()
+    await classify("text")
+
+    assert adapter.await_count == 3
+    assert classify.metrics == CacheMetrics(hits=0, misses=3)
+
+
+@pytest.mark.anyio
+async def test_classifier_with_name_cache() -> None:
+    adapter = AsyncMock(BaseClassifierAdapter, return_value="classification_name")
+    repository = Mock(BaseClassificationRepository)
+    repository.find_by_name = AsyncMock(return_value=Classification(name="classification_name"))
+    name_cache: ClassificationNameCache[Classification] = ClassificationNameCache()
+    classify: Classifier[Classification] = Classifier(adapter, repository, name_cache)
+
+    first = await classify("text")
+    second = await classify("other text")
+
+    assert first is second
+    repository.find_by_name.assert_awaited_once_with("classification_name")
+    assert name_cache.metrics == CacheMetrics(hits=1, misses=1)
+
+
+@pytest.mark.anyio
+async def test_classifier_name_cache_clear() -> None:
+    adapter = AsyncMock(BaseClassifierAdapter, return_value="classification_name")
+    repository = Mock(BaseClassificationRepository)
+    repository.find_by_name = AsyncMock(return_value=Classification(name="classification_name"))
+    name_cache: ClassificationNameCache[Classification] = ClassificationNameCache()
+    classify: Classifier[Classification] = Classifier(adapter, repository, name_cache)
+
+    await classify("text")
+    name_cache.clear()
+    await classify("text")
+
+    assert repository.find_by_name.await_count == 2
+
+
+def _catalog_repository(*classifications: Classification) -> Mock:
+    repository = Mock(BaseClassificationRepository)
+    repository.list = AsyncMock(return_value=list(classifications))
+    repository.get_pk = Mock(side_effect=lambda classification: int(classification.name[-1]))
+    repository.get_cursor = Mock(return_value=Cursor(None, 1, 1))
+
+    return repository
+
+
+@pytest.mark.anyio
+async def test_classification_catalog_lookups_are_served_from_memory() -> None:
+    first, second = Classification("classification 1"), Classification("classification 2")
+    repository = _catalog_repository(first, second)
+    catalog: ClassificationCatalog[Classification] = ClassificationCatalog(repository)
+
+    assert await catalog.find_by_name("classification 2") is second
+    assert await catalog.retrieve(1) is first
+    assert await catalog.retrieve(3) is None
+
+    with pytest.raises(NotFoundException):
+        await catalog.find_by_name("unknown")
+
+    repository.list.assert_awaited_once_with(include=("asset_type",))
+    repository.find_by_name.assert_not_called()
+    repository.retrieve.assert_not_called()
+
+
+@pytest.mark.anyio
+async def test_classification_catalog_reloads_after_invalidation_and_ttl() -> None:
+    clock = FakeClock()
+    repository = _catalog_repository(Classification("classification 1"))
+    catalog: ClassificationCatalog[Classification] = ClassificationCatalog(repository, ttl=10, clock=clock)
+
+    await catalog.find_by_name("classification 1")
+    catalog.invalidate()
+    await catalog.find_by_name("classification 1")
+    assert repository.list.await_count == 2
+
+    clock.now += 5
+    await catalog.find_by_name("classification 1")
+    assert repository.list.await_count == 2
+
+    clock.now += 10
+    await catalog.find_by_name("classification 1")
+    assert repository.list.await_count == 3
+
+
+@pytest.mark.anyio
+async def test_classification_catalog_without_ttl() -> None:
+    clock = FakeClock()
+    repository = _catalog_repository(Classification("classification 1"))
+    catalog: ClassificationCatalog[Classification] = ClassificationCatalog(repository, ttl=None, clock=clock)
+
+    await catalog.retrieve(1)
+    clock.now += 1_000_000
+    await catalog.retrieve(1)
+
+    repository.list.assert_awaited_once()
+
+
+@pytest.mark.anyio
+async def test_classification_catalog_invalidation_during_load() -> None:
+    repository = _catalog_repository(Classification("classification 1"))
+    catalog: ClassificationCatalog[Classification] = ClassificationCatalog(repository)
+
+    async def list_and_change(**_: object) -> list[Classification]:
+        catalog.invalidate()
+        return [Classification("classification 1")]
+
+    repository.list.side_effect = list_and_change
+    await catalog.find_by_name("classification 1")
+    await catalog.find_by_name("classification 1")
+
+    assert repository.list.await_count == 2
+
+
+@pytest.mark.anyio
+async def test_classification_catalog_concurrent_lookups_load_once() -> None:
+    repository = _catalog_repository()
+    catalog: ClassificationCatalog[Classification] = ClassificationCatalog(repository)
+
+    async def slow_list(**_: object) -> list[Classification]:
+        await anyio.sleep(0.01)
+        return [Classification("classification 1")]
+
+    repository.list.side_effect = slow_list
+    async with anyio.create_task_group() as task_group:
+        for _ in range(5):
+            task_group.start_soon(catalog.find_by_name, "classification 1")
+
+    repository.list.assert_awaited_once()
+
+
+@pytest.mark.anyio
+async def test_classification_catalog_writes_invalidate() -> None:
+    classification = Classification("classification 1")
+    repository = _catalog_repository(classification)
+    catalog: ClassificationCatalog[Classification] = ClassificationCatalog(repository)
+
+    await catalog.find_by_name("classification 1")
+    await catalog.save(classification)
+    await catalog.find_by_name("classification 1")
+    await catalog.delete(1)
+    await catalog.find_by_name("classification 1")
+
+    repository.save.assert_awaited_once_with(classification)
+    repository.delete.assert_awaited_once_with(1)
+    assert repository.list.await_count == 3
+
+
+@pytest.mark.anyio
+async def test_classification_catalog_delegates_list_and_cursor() -> None:
+    classification = Classification("classification 1")
+    repository = _catalog_repository(classification)
+    catalog: ClassificationCatalog[Classification] = ClassificationCatalog(repository)
+
+    assert await catalog.list(limit=10, offset=0) == [classification]
+    assert catalog.get_cursor(classification) == Cursor(None, 1, 1)
+    assert catalog.get_pk(classification) == 1
+
+    repository.list.assert_awaited_once_with(
+        limit=10,
+        offset=0,
+        sort_attribute_name=None,
+        sort_direction=None,
+        filters=None,
+        cursor=None,
+        include=None,
+    )
+    repository.get_cursor.assert_called_once_with(classification, None)
+
+
+@pytest.mark.anyio
+async def test_classifier_with_catalog() -> None:
+    adapter = AsyncMock(BaseClassifierAdapter, return_value="classification 1")
+    repository = _catalog_repository(Classification("classification 1"))
+    classify: Classifier[Classification] = Classifier(adapter, ClassificationCatalog(repository))
+
+    for _ in range(3):
+        assert (await classify("text")).name == "classification 1"
+
+    repository.list.assert_awaited_once()
+    repository.find_by_name.assert_not_called()
+
+
+@pytest.mark.anyio
+async def test_keyword_classifier_adapter() -> None:
+    classify = KeywordClassifierAdapter(
+        {
+            "straatverlichting": ["lantaarnpaal", "lamp kapot"],
+            "afval": ["vuilnis", "grofvuil", "lamp"],
+        }
+    )
+
+    assert await classify("De lantaarnpaal op de hoek is kapot") == "straatverlichting"
+    assert await classify("Er staat GROFVUIL naast de container") == "afval"
+    assert await classify("Afval: een lamp") == "afval"
+    assert await classify("Melding: lamp kapot") == "straatverlichting"
+    assert await classify("Er ligt een boom op de weg") is None
+
+
+@pytest.mark.anyio
+async def test_keyword_classifier_adapter_from_classifications() -> None:
+    classify = KeywordClassifierAdapter.from_classifications(
+        [Classification("straatverlichting"), Classification("openbaar groen")],
+        {"straatverlichting": ["lantaarnpaal"], "unknown": ["boom"]},
+    )
+
+    assert await classify("lantaarnpaal") == "straatverlichting"
+    assert await classify("Het openbaar groen is niet gemaaid") == "openbaar groen"
+    assert await classify("boom") is None
+
+
+def test_circuit_breaker_opens() -> None:
+    breaker = CircuitBreaker(failure_threshold=2)
+
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+
+    assert breaker.state == CircuitState.OPEN
+    assert not breaker.allow()
+
+
+def test_circuit_breaker_half_open_allows_one_trial() -> None:
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    clock.now += 10
+
+    assert breaker.state == CircuitState.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_circuit_breaker_failed_trial_opens() -> None:
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=10, clock=clock)
+    for _ in range(5):
+        breaker.record_failure()
+    clock.now += 10
+
+    assert breaker.allow()
+    breaker.record_failure()
+
+    assert breaker.state == CircuitState.OPEN
+
+
+def test_circuit_breaker_cancelled_trial_is_released() -> None:
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    clock.now += 10
+
+    assert breaker.allow()
+    breaker.record_cancelled()
+
+    assert breaker.state == CircuitState.HALF_OPEN
+    assert breaker.allow()
+
+
+def test_circuit_breaker_successful_trial_closes() -> None:
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    clock.now += 10
+
+    assert breaker.allow()
+    breaker.record_success()
+
+    assert breaker.state == CircuitState.CLOSED
+    assert breaker.allow()
+
+
+def test_circuit_breaker_success_resets_failures() -> None:
+    breaker = CircuitBreaker(failure_threshold=2)
+
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+
+    assert breaker.state == CircuitState.CLOSED
+
+
+@pytest.mark.anyio
+async def test_resilient_classifier_adapter() -> None:
+    adapter = AsyncMock(BaseClassifierAdapter, return_value="classification_name")
+    fallback = AsyncMock(BaseClassifierAdapter)
+    classify = ResilientClassifierAdapter(adapter, fallback)
+
+    assert await classify("text") == "classification_name"
+    fallback.assert_not_called()
+    assert classify.breaker.state == CircuitState.CLOSED
+
+
+@pytest.mark.anyio
+async def test_resilient_classifier_adapter_times_out() -> None:
+    async def slow(text: str) -> str:
+        await anyio.sleep(1)
+        return "slow"
+
+    fallback = AsyncMock(BaseClassifierAdapter, return_value="fallback")
+    classify = ResilientClassifierAdapter(AsyncMock(BaseClassifierAdapter, side_effect=slow), fallback, timeout=0.01)
+
+    with anyio.fail_after(0.5):
+        assert await classify("text") == "fallback"
+
+    fallback.assert_awaited_once_with("text")
+
+
+@pytest.mark.anyio
+async def test_resilient_classifier_adapter_releases_cancelled_trial() -> None:
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    clock.now += 10
+
+    async def slow(text: str) -> str:
+        await anyio.sleep(1)
+        return "slow"
+
+    adapter = AsyncMock(BaseClassifierAdapter, side_effect=slow)
+    classify = ResilientClassifierAdapter(adapter, breaker=breaker, timeout=5)
+
+    with anyio.move_on_after(0.01):
+        await classify("text")
+
+    adapter.side_effect = None
+    adapter.return_value = "classification_name"
+    assert await classify("text") == "classification_name"
+    assert breaker.state == CircuitState.CLOSED
+
+
+@pytest.mark.anyio
+async def test_resilient_classifier_adapter_opens_circuit() -> None:
+    adapter = AsyncMock(BaseClassifierAdapter, side_effect=ConnectionError())
+    classify = ResilientClassifierAdapter(adapter, breaker=CircuitBreaker(failure_threshold=2))
+
+    for _ in range(4):
+        assert await classify("text") is None
+
+    assert adapter.await_count == 2
+    assert classify.breaker.state == CircuitState.OPEN
+
+
+@pytest.mark.anyio
+async def test_resilient_classifier_adapter_does_not_cache_fallback() -> None:
+    adapter = AsyncMock(BaseClassifierAdapter, side_effect=ConnectionError())
+    fallback = AsyncMock(BaseClassifierAdapter, return_value="fallback")
+    classify = ResilientClassifierAdapter(CachingClassifierAdapter(adapter), fallback)
+
+    assert await classify("text") == "fallback"
+
+    adapter.side_effect = None
+    adapter.return_value = "classification_name"
+    assert await classify("text") == "classification_name"
+    assert await classify("text") == "classification_name"
+    assert adapter.await_count == 2
+
+
+def test_caching_classifier_adapter_rejects_resilient_adapter() -> None:
+    with pytest.raises(ValueError) as exception_info:
+        CachingClassifierAdapter(ResilientClassifierAdapter(AsyncMock(BaseClassifierAdapter)))
+
+    assert str(exception_info.value) == "The resilient adapter has to wrap the cache, not the other way around"
+
+
+@pytest.mark.anyio
+async def test_classifier_with_failing_resilient_adapter_raises_not_found() -> None:
+    adapter = ResilientClassifierAdapter(AsyncMock(BaseClassifierAdapter, side_effect=ConnectionError()))
+    classify: Classifier[Classification] = Classifier(adapter, Mock(BaseClassificationRepository))
+
+    with pytest.raises(ClassificationNotFoundException):
+        await classify("text")
+
+
+class CountingClassifierAdapter(BaseClassifierAdapter):
+    max_concurrency = 2
+
+    def __init__(self) -> None:
+        self.running = 0
+        self.max_running = 0
+
+    async def __call__(self, text: str) -> str | None:
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await anyio.sleep(0.001)
+        self.running -= 1
+
+        return text.upper() if text else None
+
+
+@pytest.mark.anyio
+async def test_classifier_adapter_classify_many_limits_concurrency() -> None:
+    adapter = CountingClassifierAdapter()
+
+    assert await adapter.classify_many(["a", "b", "", "c", "d"]) == ["A", "B", None, "C", "D"]
+    assert adapter.max_running == 2
+
+
+@pytest.mark.anyio
+async def test_caching_classifier_adapter_classify_many() -> None:
+    adapter = AsyncMock(BaseClassifierAdapter, return_value="cached")
+    adapter.classify_many = AsyncMock(return_value=["first", None])
+    classify = CachingClassifierAdapter(adapter)
+    await classify("cached text")
+
+    names = await classify.classify_many(["Cached  text", "first text", "FIRST text", "unknown"])
+
+    assert names == ["cached", "first", "first", None]
+    adapter.classify_many.assert_awaited_once_with(["first text", "unknown"])
+    assert await classify.classify_many(["unknown"]) == [None]
+    assert classify.metrics == CacheMetrics(hits=2, misses=3)
+
+
+@pytest.mark.anyio
+async def test_caching_classifier_adapter_classify_many_all_cached() -> None:
+    adapter = AsyncMock(BaseClassifierAdapter, return_value="cached")
+    classify = CachingClassifierAdapter(adapter)
+    await classify("text")
+
+    assert await classify.classify_many(["text"]) == ["cached"]
+    adapter.classify_many.assert_not_called()
+
+
+@pytest.mark.anyio
+async def test_resilient_classifier_adapter_classify_many() -> None:
+    adapter = Mock(BaseClassifierAdapter)
+    adapter.classify_many = AsyncMock(return_value=["a", None])
+    classify = ResilientClassifierAdapter(adapter)
+
+    assert await classify.classify_many(["a", "b"]) == ["a", None]
+
+
+@pytest.mark.anyio
+async def test_resilient_classifier_adapter_classify_many_falls_back() -> None:
+    adapter = Mock(BaseClassifierAdapter)
+    adapter.classify_many = AsyncMock(side_effect=ConnectionError())
+    fallback = Mock(BaseClassifierAdapter)
+    fallback.classify_many = AsyncMock(return_value=["fallback", None])
+
+    assert await ResilientClassifierAdapter(adapter).classify_many(["a", "b"]) == [None, None]
+    assert await ResilientClassifierAdapter(adapter, fallback).classify_many(["a", "b"]) == ["fallback", None]
+
+
+@pytest.mark.anyio
+async def test_classifier_classify_many() -> None:
+    adapter = Mock(BaseClassifierAdapter)
+    adapter.classify_many = AsyncMock(return_value=["known", None, "unknown", "known"])
+    repository = Mock(BaseClassificationRepository)
+    known = Classification("known")
+
+    async def find_by_name(name: str) -> Classification:
+        if name == "known":
+            return known
+        raise NotFoundException()
+
+    repository.find_by_name = AsyncMock(side_effect=find_by_name)
+    classify: Classifier[Classification] = Classifier(adapter, repository)
+
+    assert await classify.classify_many(["a", "b", "c", "d"]) == [known, None, None, known]
+    assert repository.find_by_name.await_count == 2
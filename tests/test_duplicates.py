@@ -0,0 +1,119 @@
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+import pytest
+
+from meldingen_core.duplicates import DuplicateCandidateIndex
+from meldingen_core.models import Classification, Melding
+from meldingen_core.spatial import Point
+from tests.test_repositories import InMemoryMeldingRepository
+
+NOW = datetime(2026, 10, 17, 12)
+STREETLIGHT = Classification("streetlight")
+
+
+@dataclass
+class LocatedMelding(Melding):
+    location: Point | None = None
+    created_at: datetime = field(default=NOW)
+
+
+class FakeClock:
+    now: datetime
+
+    def __init__(self) -> None:
+        self.now = NOW
+
+    def __call__(self) -> datetime:
+        return self.now
+
+
+def create_index(clock: FakeClock | None = None) -> DuplicateCandidateIndex[Melding]:
+    return DuplicateCandidateIndex(
+        lambda melding: getattr(melding, "location"),
+        lambda melding: getattr(melding, "created_at"),
+        radius=50,
+        window=timedelta(hours=1),
+        clock=clock or FakeClock(),
+    )
+
+
+def test_find_returns_nearby_meldingen_nearest_first() -> None:
+    index = create_index()
+    far = LocatedMelding("far", STREETLIGHT, location=(4.9, 52.3704))
+    near = LocatedMelding("near", STREETLIGHT, location=(4.9, 52.3701))
+    index.add(1, far)
+    index.add(2, near)
+    index.add(3, LocatedMelding("too far", STREETLIGHT, location=(4.9, 52.371)))
+    index.add(4, LocatedMelding("other classification", Classification("waste"), location=(4.9, 52.37)))
+    index.add(5, LocatedMelding("too old", STREETLIGHT, location=(4.9, 52.37), created_at=NOW - timedelta(hours=2)))
+    melding = LocatedMelding("new", STREETLIGHT, location=(4.9, 52.37))
+    index.add(6, melding)
+
+    candidates = index.find(6, melding)
+
+    assert [pk for pk, _ in candidates] == [2, 1]
+    assert candidates[0][1] == pytest.approx(11.1, abs=0.1)
+
+
+def test_find_without_location_or_indexed_classification() -> None:
+    index = create_index()
+    index.add(1, LocatedMelding("text", STREETLIGHT, location=(4.9, 52.37)))
+
+    assert index.find(2, LocatedMelding("text", STREETLIGHT)) == []
+    assert index.find(2, LocatedMelding("text", location=(4.9, 52.37))) == []
+
+
+def test_add_updates_and_skips_meldingen_without_location() -> None:
+    index = create_index()
+    melding = LocatedMelding("text", STREETLIGHT, location=(4.9, 52.37))
+    index.add(1, melding)
+    index.add(2, LocatedMelding("text", STREETLIGHT, location=(4.9, 52.37)))
+
+    assert 1 in index
+
+    melding.location = None
+    index.add(1, melding)
+
+    assert 1 not in index
+    assert len(index) == 1
+
+
+def test_add_prunes_once_per_window() -> None:
+    clock = FakeClock()
+    index = create_index(clock)
+    index.add(1, LocatedMelding("text", STREETLIGHT, location=(4.9, 52.37)))
+
+    clock.now = NOW + timedelta(minutes=59)
+    index.add(2, LocatedMelding("text", STREETLIGHT, location=(4.9, 52.37), created_at=clock.now))
+
+    assert len(index) == 2
+
+    clock.now = NOW + timedelta(hours=1, minutes=1)
+    index.add(3, LocatedMelding("text", STREETLIGHT, location=(4.9, 52.37), created_at=clock.now))
+
+    assert 1 not in index
+    assert len(index) == 2
+
+
+def test_clear() -> None:
+    index = create_index()
+    index.add(1, LocatedMelding("text", STREETLIGHT, location=(4.9, 52.37)))
+
+    index.clear()
+
+    assert len(index) == 0
+
+
+@pytest.mark.anyio
+async def test_rebuild() -> None:
+    index = create_index()
+    index.add(10, LocatedMelding("stale", STREETLIGHT, location=(4.9, 52.37)))
+    melding = LocatedMelding("text", STREETLIGHT, location=(4.9, 52.37))
+    repository = InMemoryMeldingRepository({1: melding, 2: LocatedMelding("text", STREETLIGHT, location=(4.9, 52.37))})
+
+    await index.rebuild(repository, batch_size=1)
+
+    assert 10 not in index
+    assert [pk for pk, _ in index.find(1, melding)] == [2]
+    assert repository.includes == [["classification"]] * 3
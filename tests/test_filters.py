@@ -0,0 +1,19 @@
+from datetime import datetime
+
+import pytest
+
+from meldingen_core.exceptions import InvalidInputException
+from meldingen_core.filters import MeldingListFilters
+
+
+def test_melding_list_filters_with_created_range() -> None:
+    filters = MeldingListFilters(created_after=datetime(2026, 1, 1), created_before=datetime(2026, 2, 1))
+
+    assert filters.created_after == datetime(2026, 1, 1)
+    assert filters.created_before == datetime(2026, 2, 1)
+
+
+@pytest.mark.parametrize("created_before", [datetime(2026, 1, 1), datetime(2025, 12, 31)])
+def test_melding_list_filters_rejects_empty_created_range(created_before: datetime) -> None:
+    with pytest.raises(InvalidInputException):
+        MeldingListFilters(created_after=datetime(2026, 1, 1), created_before=created_before)
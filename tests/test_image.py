@@ -0,0 +1,208 @@
+import asyncio
+import hashlib
+import logging
+from typing import AsyncIterator
+from unittest.mock import AsyncMock, Mock, call
+
+import pytest
+from _pytest.logging import LogCaptureFixture
+from plugfs import filesystem
+from plugfs.filesystem import Filesystem
+
+from meldingen_core.image import (
+    AttachmentIngestionPipeline,
+    BaseImageOptimizer,
+    BaseThumbnailGenerator,
+    ContentAddressedIngestionPipeline,
+)
+from meldingen_core.malware import BaseMalwareScanner, MalwareFoundException
+from meldingen_core.models import Attachment, AttachmentStatus, Melding
+from meldingen_core.repositories import BaseAttachmentRepository
+
+
+async def _iterator() -> AsyncIterator[bytes]:
+    yield b"image"
+
+
+IMAGE_DIGEST = hashlib.sha256(b"image").hexdigest()
+
+
+class SlowStage:
+    """Stage that takes a while and keeps track of how many stages run at the same time."""
+
+    running = 0
+    max_running = 0
+
+    def __init__(self, result: tuple[str, str] | None = None, delay: float = 0.05) -> None:
+        self._result = result
+        self._delay = delay
+
+    async def __call__(self, path: str) -> tuple[str, str] | None:
+        SlowStage.running += 1
+        SlowStage.max_running = max(SlowStage.max_running, SlowStage.running)
+        try:
+            await asyncio.sleep(self._delay)
+        finally:
+            SlowStage.running -= 1
+
+        return self._result
+
+
+@pytest.fixture(autouse=True)
+def reset_slow_stage() -> None:
+    SlowStage.running = 0
+    SlowStage.max_running = 0
+
+
+def _pipeline(
+    scanner: BaseMalwareScanner,
+    optimizer: BaseImageOptimizer,
+    thumbnail_generator: BaseThumbnailGenerator,
+    filesystem: Filesystem,
+    max_concurrent_stages: int = 8,
+) -> AttachmentIngestionPipeline[Attachment]:
+    return AttachmentIngestionPipeline(
+        scanner, optimizer, thumbnail_generator, filesystem, "/attachments/", max_concurrent_stages
+    )
+
+
+@pytest.mark.anyio
+async def test_pipeline_runs_stages_concurrently() -> None:
+    filesystem = Mock(Filesystem)
+    pipeline = _pipeline(
+        AsyncMock(BaseMalwareScanner, side_effect=SlowStage().__call__),
+        AsyncMock(BaseImageOptimizer, side_effect=SlowStage(("/optimized.webp", "image/webp")).__call__),
+        AsyncMock(BaseThumbnailGenerator, side_effect=SlowStage(("/thumbnail.webp", "image/webp")).__call__),
+        filesystem,
+    )
+    attachment = Attachment("../photo.JPG", "image/jpeg", Melding("text"))
+    data = _iterator()
+
+    await pipeline(attachment, data)
+
+    assert attachment.file_path.startswith("/attachments/")
+    assert attachment.file_path.endswith(".JPG")
+    assert ".." not in attachment.file_path
+    assert attachment.created_at is not None
+    filesystem.write_iterator.assert_awaited_once_with(attachment.file_path, data)
+    assert (attachment.optimized_path, attachment.optimized_media_type) == ("/optimized.webp", "image/webp")
+    assert (attachment.thumbnail_path, attachment.thumbnail_media_type) == ("/thumbnail.webp", "image/webp")
+    assert SlowStage.max_running == 3
+
+
+@pytest.mark.anyio
+async def test_pipeline_limits_concurrent_stages() -> None:
+    pipeline = _pipeline(
+        AsyncMock(BaseMalwareScanner, side_effect=SlowStage(delay=0.01).__call__),
+        AsyncMock(BaseImageOptimizer, side_effect=SlowStage(("/optimized.webp", "image/webp"), 0.01).__call__),
+        AsyncMock(BaseThumbnailGenerator, side_effect=SlowStage(("/thumbnail.webp", "image/webp"), 0.01).__call__),
+        Mock(Filesystem),
+        max_concurrent_stages=1,
+    )
+
+    await pipeline(Attachment("photo.jpg", "image/jpeg", Melding("text")), _iterator())
+
+    assert SlowStage.max_running == 1
+
+
+@pytest.mark.anyio
+async def test_pipeline_keeps_original_when_a_stage_fails(caplog: LogCaptureFixture) -> None:
+    pipeline = _pipeline(
+        AsyncMock(BaseMalwareScanner),
+        AsyncMock(BaseImageOptimizer, side_effect=ValueError("Unsupported image")),
+        AsyncMock(BaseThumbnailGenerator, side_effect=ValueError("Unsupported image")),
+        Mock(Filesystem),
+    )
+    attachment = Attachment("photo.jpg", "image/jpeg", Melding("text"))
+
+    with caplog.at_level(logging.ERROR):
+        await pipeline(attachment, _iterator())
+
+    assert attachment.optimized_path is None
+    assert attachment.thumbnail_path is None
+    assert "Failed to optimize attachment" in caplog.text
+    assert "Failed to generate thumbnail for attachment" in caplog.text
+
+
+@pytest.mark.anyio
+async def test_pipeline_deletes_files_when_malware_is_found() -> None:
+    async def scan(path: str) -> None:
+        await asyncio.sleep(0.01)
+        raise MalwareFoundException()
+
+    filesystem_mock = Mock(Filesystem)
+    filesystem_mock.delete = AsyncMock(side_effect=[None, filesystem.NotFoundException()])
+    thumbnail_generator = SlowStage(("/thumbnail.webp", "image/webp"), delay=10)
+    pipeline = _pipeline(
+        AsyncMock(BaseMalwareScanner, side_effect=scan),
+        AsyncMock(BaseImageOptimizer, return_value=("/optimized.webp", "image/webp")),
+        AsyncMock(BaseThumbnailGenerator, side_effect=thumbnail_generator.__call__),
+        filesystem_mock,
+    )
+    attachment = Attachment("photo.jpg", "image/jpeg", Melding("text"))
+
+    with pytest.raises(MalwareFoundException):
+        await asyncio.wait_for(pipeline(attachment, _iterator()), 1)
+
+    assert attachment.optimized_path is None
+    assert attachment.thumbnail_path is None
+    assert filesystem_mock.delete.await_args_list == [call("/optimized.webp"), call(attachment.file_path)]
+
+
+async def _consume(path: str, data: AsyncIterator[bytes]) -> None:
+    async for _ in data:
+        pass
+
+
+@pytest.mark.anyio
+async def test_content_addressed_pipeline_stores_new_content() -> None:
+    filesystem = Mock(Filesystem)
+    filesystem.write_iterator = AsyncMock(side_effect=_consume)
+    attachment_repository = Mock(BaseAttachmentRepository)
+    attachment_repository.find_by_digest.return_value = None
+    scanner = AsyncMock(BaseMalwareScanner)
+    pipeline: ContentAddressedIngestionPipeline[Attachment] = ContentAddressedIngestionPipeline(
+        scanner,
+        AsyncMock(BaseImageOptimizer, return_value=("/optimized.webp", "image/webp")),
+        AsyncMock(BaseThumbnailGenerator, return_value=("/thumbnail.webp", "image/webp")),
+        filesystem,
+        "/attachments",
+        attachment_repository,
+    )
+    attachment = Attachment("photo.jpg", "image/jpeg", Melding("text"))
+
+    await pipeline(attachment, _iterator())
+
+    assert attachment.digest == IMAGE_DIGEST
+    attachment_repository.find_by_digest.assert_awaited_once_with(IMAGE_DIGEST)
+    scanner.assert_awaited_once_with(attachment.file_path)
+    assert attachment.optimized_path == "/optimized.webp"
+    filesystem.delete.assert_not_called()
+
+
+@pytest.mark.anyio
+async def test_content_addressed_pipeline_shares_existing_files() -> None:
+    existing = Attachment("other.jpg", "image/jpeg", Melding("other"), "/optimized.webp", "image/webp", "/thumb", "x")
+    existing.file_path = "/attachments/existing.jpg"
+    filesystem = Mock(Filesystem)
+    filesystem.write_iterator = AsyncMock(side_effect=_consume)
+    attachment_repository = Mock(BaseAttachmentRepository)
+    attachment_repository.find_by_digest.return_value = existing
+    scanner = AsyncMock(BaseMalwareScanner)
+    optimizer = AsyncMock(BaseImageOptimizer)
+    pipeline: ContentAddressedIngestionPipeline[Attachment] = ContentAddressedIngestionPipeline(
+        scanner, optimizer, AsyncMock(BaseThumbnailGenerator), filesystem, "/attachments", attachment_repository
+    )
+    attachment = Attachment("photo.jpg", "image/jpeg", Melding("text"), status=AttachmentStatus.PROCESSING)
+
+    await pipeline(attachment, _iterator())
+
+    uploaded_path = filesystem.write_iterator.await_args.args[0]
+    filesystem.delete.assert_awaited_once_with(uploaded_path)
+    assert attachment.file_path == "/attachments/existing.jpg"
+    assert (attachment.optimized_path, attachment.optimized_media_type) == ("/optimized.webp", "image/webp")
+    assert (attachment.thumbnail_path, attachment.thumbnail_media_type) == ("/thumb", "x")
+    assert attachment.status == AttachmentStatus.READY
+    assert attachment.digest == IMAGE_DIGEST
+    scanner.assert_not_called()
+    optimizer.assert_not_called()
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+
+import pytest
+from _pytest.logging import LogCaptureFixture
+
+from meldingen_core.jobs import AsyncioJobQueue, BaseJob
+
+
+class RecordingJob(BaseJob):
+    def __init__(self, failures: int = 0, delay: float = 0.0) -> None:
+        self.failures = failures
+        self.delay = delay
+        self.attempts = 0
+        self.failed_with: Exception | None = None
+
+    async def __call__(self) -> None:
+        self.attempts += 1
+        await asyncio.sleep(self.delay)
+        if self.attempts <= self.failures:
+            raise ValueError(f"Attempt {self.attempts} failed")
+
+    async def failed(self, exception: Exception) -> None:
+        self.failed_with = exception
+
+
+@pytest.mark.anyio
+async def test_job_queue_runs_jobs_concurrently() -> None:
+    queue = AsyncioJobQueue(workers=3)
+    queue.start()
+    queue.start()
+    jobs = [RecordingJob(delay=0.05) for _ in range(3)]
+
+    for job in jobs:
+        await queue.enqueue(job)
+    await asyncio.wait_for(queue.join(), 0.12)
+    await queue.stop()
+
+    assert [job.attempts for job in jobs] == [1, 1, 1]
+    assert not queue.running
+
+
+@pytest.mark.anyio
+async def test_job_queue_retries_failed_jobs() -> None:
+    queue = AsyncioJobQueue(workers=1, max_attempts=3, retry_delay=0.001)
+    queue.start()
+    job = RecordingJob(failures=2)
+
+    await queue.enqueue(job)
+    await queue.join()
+    await queue.stop()
+
+    assert job.attempts == 3
+    assert job.failed_with is None
+
+
+@pytest.mark.anyio
+async def test_job_queue_gives_up_after_max_attempts(caplog: LogCaptureFixture) -> None:
+    queue = AsyncioJobQueue(workers=1, max_attempts=2, retry_delay=0.001)
+    queue.start()
+    job = RecordingJob(failures=5)
+
+    with caplog.at_level(logging.WARNING):
+        await queue.enqueue(job)
+        await queue.join()
+    await queue.stop()
+
+    assert job.attempts == 2
+    assert str(job.failed_with) == "Attempt 2 failed"
+    assert "failed on attempt 1, retrying" in caplog.text
+    assert "failed after 2 attempts" in caplog.text
+
+
+@pytest.mark.anyio
+async def test_job_queue_logs_failing_failure_handler(caplog: LogCaptureFixture) -> None:
+    class BrokenJob(RecordingJob):
+        async def failed(self, exception: Exception) -> None:
+            raise RuntimeError()
+
+    queue = AsyncioJobQueue(workers=1, max_attempts=1)
+    queue.start()
+
+    with caplog.at_level(logging.ERROR):
+        await queue.enqueue(BrokenJob(failures=1))
+        await queue.join()
+    await queue.stop()
+
+    assert "Failure handler of job" in caplog.text
+
+
+@pytest.mark.anyio
+async def test_job_queue_stop_cancels_pending_retries() -> None:
+    queue = AsyncioJobQueue(workers=1, retry_delay=10)
+    queue.start()
+    job = RecordingJob(failures=1)
+
+    await queue.enqueue(job)
+    await asyncio.sleep(0.01)
+    await asyncio.wait_for(queue.stop(), 1)
+
+    assert job.attempts == 1
+
+
+@pytest.mark.anyio
+async def test_job_without_failure_handler() -> None:
+    class Job(BaseJob):
+        async def __call__(self) -> None:
+            raise ValueError()
+
+    queue = AsyncioJobQueue(workers=1, max_attempts=1)
+    queue.start()
+
+    await queue.enqueue(Job())
+    await queue.join()
+    await queue.stop()
@@ -0,0 +1,122 @@
+from collections.abc import AsyncIterator
+from datetime import datetime
+
+import pytest
+
+from meldingen_core import SortingDirection
+from meldingen_core.exceptions import InvalidInputException
+from meldingen_core.pagination import (
+    Cursor,
+    InvalidCursorException,
+    Page,
+    chunk,
+    create_page,
+    decode_cursor,
+    encode_cursor,
+    parse_cursor,
+)
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        Cursor(None, 10, 10),
+        Cursor("state", "submitted", 3),
+        Cursor("created_at", datetime(2025, 1, 2, 3, 4, 5), 7),
+        Cursor("urgency", None, 1),
+        Cursor("created_at", datetime(2025, 1, 2, 3, 4, 5), 7, SortingDirection.DESC),
+    ],
+)
+def test_encode_and_decode_cursor(cursor: Cursor) -> None:
+    encoded = encode_cursor(cursor)
+
+    assert "=" not in encoded
+    assert decode_cursor(encoded) == cursor
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        "not a cursor",
+        "bm90IGpzb24",  # "not json"
+        "WzEsMl0",  # [1,2]
+        "WyJpZCIsMSwiMSIsbnVsbF0",  # ["id",1,"1",null]
+        "WzEsMSwxLG51bGxd",  # [1,1,1,null]
+        "WyJpZCIseyJmb28iOjF9LDEsbnVsbF0",  # ["id",{"foo":1},1,null]
+        "WyJpZCIsMSwxLCJVUCJd",  # ["id",1,1,"UP"]
+        "WyJpZCIsMSwxXQ",  # ["id",1,1]
+        "gA",
+    ],
+)
+def test_decode_invalid_cursor(value: str) -> None:
+    with pytest.raises(InvalidCursorException):
+        decode_cursor(value)
+
+
+def test_parse_cursor() -> None:
+    cursor = Cursor("state", "submitted", 3)
+
+    assert parse_cursor(None, "state") is None
+    assert parse_cursor(encode_cursor(cursor), "state") == cursor
+
+    with pytest.raises(InvalidCursorException) as exception_info:
+        parse_cursor(encode_cursor(cursor), "urgency")
+
+    assert str(exception_info.value) == "Cursor does not match the sort attribute"
+
+
+def test_parse_cursor_checks_sort_direction() -> None:
+    ascending = Cursor("state", "submitted", 3)
+    descending = Cursor("state", "submitted", 3, SortingDirection.DESC)
+
+    assert parse_cursor(encode_cursor(ascending), "state", SortingDirection.ASC) == ascending
+    assert parse_cursor(encode_cursor(descending), "state", SortingDirection.DESC) == descending
+
+    with pytest.raises(InvalidCursorException) as exception_info:
+        parse_cursor(encode_cursor(ascending), "state", SortingDirection.DESC)
+
+    assert str(exception_info.value) == "Cursor does not match the sort direction"
+
+    with pytest.raises(InvalidCursorException):
+        parse_cursor(encode_cursor(descending), "state")
+
+
+def test_create_page_without_next_page() -> None:
+    assert create_page([1, 2], 2, lambda item: Cursor(None, item, item)) == Page([1, 2])
+
+
+def test_create_page_with_next_page() -> None:
+    page = create_page([1, 2, 3], 2, lambda item: Cursor(None, item, item))
+
+    assert page.items == [1, 2]
+    assert page.next_cursor is not None
+    assert decode_cursor(page.next_cursor) == Cursor(None, 2, 2)
+
+
+def test_create_page_stores_sort_direction() -> None:
+    page = create_page([3, 2, 1], 2, lambda item: Cursor(None, item, item), SortingDirection.DESC)
+
+    assert page.next_cursor is not None
+    assert decode_cursor(page.next_cursor) == Cursor(None, 2, 2, SortingDirection.DESC)
+
+
+@pytest.mark.parametrize("limit", [0, -1])
+def test_create_page_rejects_limit_below_one(limit: int) -> None:
+    with pytest.raises(InvalidInputException) as exception_info:
+        create_page([1], limit, lambda item: Cursor(None, item, item))
+
+    assert str(exception_info.value) == "Limit must be at least 1"
+
+
+async def iterate(items: list[int]) -> AsyncIterator[int]:
+    for item in items:
+        yield item
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize(
+    "items,expected",
+    [([], []), ([1, 2], [[1, 2]]), ([1, 2, 3, 4], [[1, 2], [3, 4]]), ([1, 2, 3, 4, 5], [[1, 2], [3, 4], [5]])],
+)
+async def test_chunk(items: list[int], expected: list[list[int]]) -> None:
+    assert [items async for items in chunk(iterate(items), 2)] == expected
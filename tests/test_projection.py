@@ -0,0 +1,51 @@
+import pytest
+
+from meldingen_core.models import Classification, Melding, Source
+from meldingen_core.projection import InvalidProjectionException, parse_projection, project_melding
+
+
+def test_parse_projection_removes_duplicates() -> None:
+    assert parse_projection(["id", "state", "id"]) == ["id", "state"]
+
+
+@pytest.mark.parametrize("fields", [[], ["id", "token"]])
+def test_parse_projection_rejects_invalid_projection(fields: list[str]) -> None:
+    with pytest.raises(InvalidProjectionException):
+        parse_projection(fields)
+
+
+def test_parse_projection_names_unknown_fields() -> None:
+    with pytest.raises(InvalidProjectionException) as exception_info:
+        parse_projection(["id", "token", "email_address"])
+
+    assert str(exception_info.value) == "Unknown fields in projection: token, email_address"
+
+
+def test_project_melding() -> None:
+    melding = Melding(
+        "text",
+        classification=Classification("classification"),
+        state="submitted",
+        urgency=1,
+        street="Amstel",
+        source=Source("source"),
+    )
+
+    row = project_melding(
+        melding, ["id", "state", "classification", "urgency", "street", "source"], lambda projected: 123
+    )
+
+    assert row == {
+        "id": 123,
+        "state": "submitted",
+        "classification": "classification",
+        "urgency": 1,
+        "street": "Amstel",
+        "source": "source",
+    }
+
+
+def test_project_melding_without_relationships() -> None:
+    row = project_melding(Melding("text"), ["classification", "source"], lambda projected: 123)
+
+    assert row == {"classification": None, "source": None}
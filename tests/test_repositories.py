@@ -0,0 +1,217 @@
+from collections.abc import Sequence
+from unittest.mock import Mock
+
+import pytest
+
+from meldingen_core import SortingDirection
+from meldingen_core.filters import MeldingListFilters, NameListFilters
+from meldingen_core.models import Attachment, Classification, Melding
+from meldingen_core.pagination import Cursor
+from meldingen_core.repositories import BaseAttachmentRepository, BaseMeldingRepository, BaseRepository, Include
+
+
+class InMemoryMeldingRepository(BaseMeldingRepository[Melding]):
+    _meldingen: dict[int, Melding]
+    includes: list[Include | None]
+
+    def __init__(self, meldingen: dict[int, Melding] | None = None) -> None:
+        self._meldingen = meldingen if meldingen is not None else {}
+        self.includes = []
+
+    async def save(self, obj: Melding) -> None:
+        if obj not in self._meldingen.values():
+            self._meldingen[max(self._meldingen, default=0) + 1] = obj
+
+    async def list(
+        self,
+        *,
+        limit: int | None = None,
+        offset: int | None = None,
+        sort_attribute_name: str | None = None,
+        sort_direction: SortingDirection | None = None,
+        filters: NameListFilters | None = None,
+        cursor: Cursor | None = None,
+        include: Include | None = None,
+    ) -> Sequence[Melding]:
+        return await self.list_meldingen(limit=limit, offset=offset, cursor=cursor, include=include)
+
+    async def retrieve(self, pk: int, include: Include | None = None) -> Melding | None:
+        self.includes.append(include)
+        return self._meldingen.get(pk)
+
+    async def delete(self, pk: int) -> None:
+        del self._meldingen[pk]
+
+    async def list_meldingen(
+        self,
+        *,
+        limit: int | None = None,
+        offset: int | None = None,
+        sort_attribute_name: str | None = None,
+        sort_direction: SortingDirection | None = None,
+        filters: MeldingListFilters | None = None,
+        cursor: Cursor | None = None,
+        include: Include | None = None,
+    ) -> Sequence[Melding]:
+        self.includes.append(include)
+        if cursor is not None and cursor.sort_direction == SortingDirection.DESC:
+            pks = sorted((pk for pk in self._meldingen if pk < cursor.pk), reverse=True)
+        else:
+            pks = sorted(pk for pk in self._meldingen if cursor is None or pk > cursor.pk)
+            if sort_direction == SortingDirection.DESC:
+                pks.reverse()
+
+        return [self._meldingen[pk] for pk in pks][offset:][:limit]
+
+    def get_pk(self, obj: Melding) -> int:
+        return next(pk for pk, melding in self._meldingen.items() if melding is obj)
+
+    def get_cursor(self, obj: Melding, sort_attribute_name: str | None = None) -> Cursor:
+        pk = self.get_pk(obj)
+        return Cursor(sort_attribute_name, pk, pk)
+
+
+@pytest.mark.anyio
+async def test_find_by_id_and_token_digest() -> None:
+    melding = Melding("text", token_digest="digest")
+    repository = InMemoryMeldingRepository({1: melding, 2: Melding("text")})
+
+    assert await repository.find_by_id_and_token_digest(1, "digest") is melding
+    assert await repository.find_by_id_and_token_digest(1, "other") is None
+    assert await repository.find_by_id_and_token_digest(2, "digest") is None
+    assert await repository.find_by_id_and_token_digest(3, "digest") is None
+
+
+@pytest.mark.anyio
+async def test_retrieve_many_leaves_out_missing_objects() -> None:
+    first = Melding("first")
+    second = Melding("second")
+    repository = InMemoryMeldingRepository({1: first, 2: second})
+
+    assert await repository.retrieve_many([2, 3, 1]) == {2: second, 1: first}
+
+
+@pytest.mark.anyio
+async def test_save_many() -> None:
+    repository = InMemoryMeldingRepository()
+    first = Melding("first")
+    second = Melding("second")
+
+    await repository.save_many([first, second])
+
+    assert await repository.retrieve_many([1, 2]) == {1: first, 2: second}
+
+
+@pytest.mark.anyio
+async def test_delete_many() -> None:
+    third = Melding("third")
+    repository = InMemoryMeldingRepository({1: Melding("first"), 2: Melding("second"), 3: third})
+
+    await repository.delete_many([1, 2])
+
+    assert await repository.retrieve_many([1, 2, 3]) == {3: third}
+
+
+def test_get_cursor_reads_id_and_sort_attribute() -> None:
+    class Model:
+        id: int = 5
+        name: str = "name"
+
+    repository = Mock(BaseRepository)
+
+    repository.get_pk.side_effect = lambda obj: BaseRepository.get_pk(repository, obj)
+
+    assert BaseRepository.get_pk(repository, Model()) == 5
+    assert BaseRepository.get_cursor(repository, Model()) == Cursor(None, 5, 5)
+    assert BaseRepository.get_cursor(repository, Model(), "name") == Cursor("name", "name", 5)
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("batch_size", [1, 2, 3, 10])
+async def test_stream_meldingen(batch_size: int) -> None:
+    meldingen = {pk: Melding(f"melding {pk}") for pk in range(1, 7)}
+    repository = InMemoryMeldingRepository(meldingen)
+
+    streamed = [melding async for melding in repository.stream_meldingen(batch_size=batch_size)]
+
+    assert streamed == list(meldingen.values())
+
+
+@pytest.mark.anyio
+async def test_stream_meldingen_descending() -> None:
+    meldingen = {pk: Melding(f"melding {pk}") for pk in range(1, 7)}
+    repository = InMemoryMeldingRepository(meldingen)
+
+    streamed = [
+        melding async for melding in repository.stream_meldingen(sort_direction=SortingDirection.DESC, batch_size=2)
+    ]
+
+    assert streamed == list(reversed(meldingen.values()))
+
+
+@pytest.mark.anyio
+async def test_default_batch_methods_pass_include() -> None:
+    melding = Melding("text", token_digest="digest")
+    repository = InMemoryMeldingRepository({1: melding})
+
+    await repository.retrieve_many([1], include=("labels",))
+    await repository.find_by_id_and_token_digest(1, "digest", include=("assets",))
+    [melding async for melding in repository.stream_meldingen(include=("classification.asset_type",))]
+
+    assert repository.includes == [("labels",), ("assets",), ("classification.asset_type",)]
+
+
+@pytest.mark.anyio
+async def test_default_list_melding_rows_projects_meldingen() -> None:
+    repository = InMemoryMeldingRepository({1: Melding("text", state="new"), 2: Melding("other", state="submitted")})
+
+    rows = await repository.list_melding_rows(fields=["id", "state", "classification"], limit=1)
+
+    # The in-memory meldingen have no id attribute, the primary key comes from get_pk
+    assert rows == [{"id": 1, "state": "new", "classification": None}]
+    assert repository.includes == [["classification"]]
+
+
+@pytest.mark.anyio
+async def test_default_count_meldingen() -> None:
+    repository = InMemoryMeldingRepository({pk: Melding(f"melding {pk}") for pk in range(1, 4)})
+
+    assert await repository.count_meldingen() == 3
+
+
+@pytest.mark.anyio
+async def test_default_facet_meldingen() -> None:
+    classification = Classification("classification")
+    repository = InMemoryMeldingRepository(
+        {
+            1: Melding("text", classification=classification, state="new"),
+            2: Melding("text", classification=classification, state="submitted", urgency=1),
+            3: Melding("text", state="new"),
+        }
+    )
+
+    facets = await repository.facet_meldingen(facets=["state", "classification", "urgency"])
+
+    assert facets == {
+        "state": {"new": 2, "submitted": 1},
+        "classification": {"classification": 2, None: 1},
+        "urgency": {0: 2, 1: 1},
+    }
+    assert repository.includes == [["classification"]]
+
+
+@pytest.mark.anyio
+async def test_default_facet_meldingen_without_facets() -> None:
+    repository = InMemoryMeldingRepository({1: Melding("text")})
+
+    assert await repository.facet_meldingen() == {}
+    assert repository.includes == []
+
+
+@pytest.mark.anyio
+async def test_default_attachment_repository_does_not_share_files() -> None:
+    repository = Mock(BaseAttachmentRepository)
+
+    existing = await BaseAttachmentRepository[Attachment].find_by_digest(repository, "digest")
+    assert existing is None
+    assert await BaseAttachmentRepository.count_by_file_path(repository, "/path/to/file.ext") == 1
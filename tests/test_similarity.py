@@ -0,0 +1,168 @@
+from collections.abc import AsyncIterator
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from unittest.mock import Mock
+
+import pytest
+
+from meldingen_core.filters import MeldingListFilters
+from meldingen_core.models import Melding
+from meldingen_core.repositories import BaseMeldingRepository
+from meldingen_core.similarity import MinHasher, MinHashLSHIndex, estimate_similarity, jaccard, shingles
+from tests.test_cache import FakeClock
+from tests.test_repositories import InMemoryMeldingRepository
+
+STREETLIGHT = "De lantaarnpaal voor ons huis op de Amstel 1 is al drie dagen kapot en het is 's avonds erg donker."
+STREETLIGHT_COPY = (
+    "de lantaarnpaal voor ons huis op de Amstel 1 is al drie dagen kapot, en het is 's avonds erg donker!"
+)
+STREETLIGHT_EDIT = "De lantaarnpaal voor ons huis op de Amstel 1 is al vier dagen kapot en het is 's nachts erg donker."
+WASTE = "Er staat al een week grofvuil naast de container in de Kalverstraat, graag ophalen."
+
+NOW = datetime(2026, 10, 17, 12)
+
+
+@dataclass
+class DatedMelding(Melding):
+    created_at: datetime = field(default=NOW)
+
+
+def test_shingles_are_normalized() -> None:
+    assert shingles("Hello,  World!", 5) == shingles("hello world", 5)
+    assert shingles("Hi!", 5) == {"hi"}
+
+
+def test_jaccard() -> None:
+    assert jaccard({"a", "b"}, {"b", "c"}) == pytest.approx(1 / 3)
+    assert jaccard(set(), set()) == 1.0
+
+
+def test_min_hash_estimates_jaccard_similarity() -> None:
+    hasher = MinHasher(num_perm=256)
+
+    expected = jaccard(shingles(STREETLIGHT), shingles(STREETLIGHT_EDIT))
+    estimated = estimate_similarity(hasher(STREETLIGHT), hasher(STREETLIGHT_EDIT))
+
+    assert hasher.num_perm == 256
+    assert estimated == pytest.approx(expected, abs=0.1)
+    assert estimate_similarity(hasher(STREETLIGHT), hasher(STREETLIGHT_COPY)) == 1.0
+
+
+def test_index_rejects_bands_that_do_not_divide_the_signature() -> None:
+    with pytest.raises(ValueError):
+        MinHashLSHIndex(MinHasher(num_perm=128), bands=30)
+
+
+def test_index_query() -> None:
+    index: MinHashLSHIndex[int] = MinHashLSHIndex()
+    index.add(1, STREETLIGHT_COPY)
+    index.add(2, STREETLIGHT_EDIT)
+    index.add(3, WASTE)
+
+    results = index.query(STREETLIGHT)
+
+    assert [key for key, _ in results] == [1, 2]
+    assert results[0][1] == 1.0
+    assert index.query(STREETLIGHT, threshold=0.9) == [(1, 1.0)]
+
+
+def test_index_query_max_age() -> None:
+    clock = FakeClock()
+    index: MinHashLSHIndex[int] = MinHashLSHIndex(clock=clock)
+    index.add(1, STREETLIGHT)
+    clock.now = 100
+    index.add(2, STREETLIGHT)
+    # Updating a text keeps the time it was first added
+    index.add(1, STREETLIGHT_COPY)
+
+    assert [key for key, _ in index.query(STREETLIGHT, max_age=50)] == [2]
+
+
+def test_index_add_with_creation_time() -> None:
+    clock = FakeClock()
+    clock.now = 1000
+    index: MinHashLSHIndex[int] = MinHashLSHIndex(clock=clock)
+    index.add(1, STREETLIGHT, added_at=100)
+    index.add(2, STREETLIGHT)
+    index.add(2, STREETLIGHT_COPY, added_at=900)
+
+    assert [key for key, _ in index.query(STREETLIGHT, max_age=500)] == [2]
+
+
+def test_index_add_replaces_text() -> None:
+    index: MinHashLSHIndex[int] = MinHashLSHIndex()
+    index.add(1, STREETLIGHT)
+    index.add(1, WASTE)
+
+    assert len(index) == 1
+    assert index.query(STREETLIGHT) == []
+    assert index.query(WASTE) == [(1, 1.0)]
+
+
+def test_index_evicts_least_recently_added_texts() -> None:
+    index: MinHashLSHIndex[int] = MinHashLSHIndex(max_size=2)
+    index.add(1, STREETLIGHT)
+    index.add(2, WASTE)
+    index.add(1, STREETLIGHT_EDIT)
+    index.add(3, STREETLIGHT_COPY)
+
+    assert 2 not in index
+    assert 1 in index
+    assert 3 in index
+
+
+def test_index_remove_and_clear() -> None:
+    index: MinHashLSHIndex[int] = MinHashLSHIndex()
+    index.add(1, STREETLIGHT)
+    index.add(2, STREETLIGHT)
+
+    index.remove(1)
+    index.remove(3)
+
+    assert index.query(STREETLIGHT) == [(2, 1.0)]
+
+    index.clear()
+
+    assert len(index) == 0
+    assert index.query(STREETLIGHT) == []
+
+
+@pytest.mark.anyio
+async def test_index_rebuild() -> None:
+    clock = FakeClock()
+    clock.now = NOW.timestamp()
+    index: MinHashLSHIndex[int] = MinHashLSHIndex(clock=clock)
+    index.add(10, STREETLIGHT)
+    repository = InMemoryMeldingRepository(
+        {
+            1: DatedMelding(STREETLIGHT_COPY, created_at=NOW - timedelta(days=10)),
+            2: DatedMelding(STREETLIGHT_EDIT, created_at=NOW - timedelta(days=1)),
+            3: DatedMelding(WASTE),
+        }
+    )
+
+    await index.rebuild(repository, lambda melding: getattr(melding, "created_at"), batch_size=2)
+
+    assert 10 not in index
+    assert len(index) == 3
+    assert [key for key, _ in index.query(STREETLIGHT)] == [1, 2]
+    assert [key for key, _ in index.query(STREETLIGHT, max_age=timedelta(days=7).total_seconds())] == [2]
+
+
+@pytest.mark.anyio
+async def test_index_rebuild_only_streams_recent_meldingen() -> None:
+    async def meldingen() -> AsyncIterator[Melding]:
+        yield DatedMelding(WASTE)
+
+    clock = FakeClock()
+    clock.now = NOW.timestamp()
+    repository = Mock(BaseMeldingRepository)
+    repository.stream_meldingen = Mock(return_value=meldingen())
+    index: MinHashLSHIndex[int] = MinHashLSHIndex(clock=clock)
+
+    await index.rebuild(repository, lambda melding: NOW, max_age=timedelta(days=7).total_seconds())
+
+    repository.stream_meldingen.assert_called_once_with(
+        filters=MeldingListFilters(created_after=NOW - timedelta(days=7)), batch_size=500
+    )
+    assert index.query(WASTE) == [(repository.get_pk.return_value, 1.0)]
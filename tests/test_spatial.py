@@ -0,0 +1,142 @@
+import math
+from typing import Any
+
+import pytest
+
+from meldingen_core.spatial import (
+    BoundingBox,
+    InvalidSpatialFilterException,
+    Polygon,
+    Radius,
+    SpatialFilter,
+    SpatialGridIndex,
+    haversine,
+)
+
+SQUARE_WITH_HOLE = "POLYGON ((0 0, 10 0, 10 10, 0 10, 0 0), (4 4, 6 4, 6 6, 4 6, 4 4))"
+
+
+def test_bounding_box_contains() -> None:
+    bbox = BoundingBox(0, 0, 10, 10)
+
+    assert bbox.bbox() is bbox
+    assert bbox.contains((10, 5))
+    assert not bbox.contains((10.1, 5))
+
+
+def test_polygon_from_wkt() -> None:
+    polygon = Polygon.from_wkt(SQUARE_WITH_HOLE)
+
+    assert polygon.exterior == ((0, 0), (10, 0), (10, 10), (0, 10), (0, 0))
+    assert polygon.holes == (((4, 4), (6, 4), (6, 6), (4, 6), (4, 4)),)
+    assert polygon.bbox() == BoundingBox(0, 0, 10, 10)
+
+
+@pytest.mark.parametrize(
+    "wkt",
+    ["POINT (1 2)", "POLYGON ()", "POLYGON ((0 0, 1 1))", "POLYGON ((0 0, 1, 1 1))", "POLYGON ((0 0, a b, 1 1))"],
+)
+def test_polygon_from_invalid_wkt(wkt: str) -> None:
+    with pytest.raises(InvalidSpatialFilterException):
+        Polygon.from_wkt(wkt)
+
+
+def test_polygon_from_geojson() -> None:
+    geometry = '{"type": "Polygon", "coordinates": [[[0, 0], [10, 0], [10, 10], [0, 10], [0, 0]]]}'
+
+    assert Polygon.from_geojson(geometry) == Polygon(((0, 0), (10, 0), (10, 10), (0, 10), (0, 0)))
+
+
+@pytest.mark.parametrize(
+    "geometry",
+    [
+        "not json",
+        {"type": "Point", "coordinates": [1, 2]},
+        {"type": "Polygon"},
+        {"type": "Polygon", "coordinates": []},
+        {"type": "Polygon", "coordinates": [[[0, 0, 0], [1, 1], [1, 0]]]},
+        [],
+    ],
+)
+def test_polygon_from_invalid_geojson(geometry: Any) -> None:
+    with pytest.raises(InvalidSpatialFilterException):
+        Polygon.from_geojson(geometry)
+
+
+@pytest.mark.parametrize("point, expected", [((1, 1), True), ((5, 5), False), ((11, 5), False), ((-1, 5), False)])
+def test_polygon_contains(point: tuple[float, float], expected: bool) -> None:
+    assert Polygon.from_wkt(SQUARE_WITH_HOLE).contains(point) is expected
+
+
+def test_haversine() -> None:
+    # One degree of latitude is about 111 kilometers
+    assert haversine((4.9, 52.0), (4.9, 53.0)) == pytest.approx(111_195, rel=1e-3)
+
+
+def test_radius() -> None:
+    radius = Radius((4.9, 52.37), 1000)
+    bbox = radius.bbox()
+
+    assert radius.contains((4.9, 52.378))
+    assert not radius.contains((4.9, 52.38))
+    assert bbox.min_y == pytest.approx(52.37 - 1000 / 111_320)
+    assert bbox.max_x - 4.9 == pytest.approx(1000 / 111_320 / math.cos(math.radians(52.37)))
+
+
+def test_radius_rejects_negative_distance() -> None:
+    with pytest.raises(InvalidSpatialFilterException):
+        Radius((4.9, 52.37), -1)
+
+
+def test_grid_index_rejects_invalid_cell_size() -> None:
+    with pytest.raises(ValueError):
+        SpatialGridIndex(0)
+
+
+@pytest.mark.parametrize(
+    "spatial_filter, expected",
+    [
+        (BoundingBox(0, 0, 0.9, 0.9), [1]),
+        (BoundingBox(0, 0, 2, 2), [1, 2]),
+        (BoundingBox(-1000, -1000, 1000, 1000), [1, 2, 3, 4]),
+        (Polygon.from_wkt(SQUARE_WITH_HOLE), [1, 2, 3]),
+        (BoundingBox(50, 50, 60, 60), []),
+    ],
+)
+def test_grid_index_query(spatial_filter: SpatialFilter, expected: list[int]) -> None:
+    index: SpatialGridIndex[int] = SpatialGridIndex(1)
+    index.insert(1, (0.5, 0.5))
+    index.insert(2, (1.5, 1.5))
+    index.insert(3, (9.5, 9.5))
+    index.insert(4, (5, 5))
+    index.insert(5, (100, 100))
+    index.remove(5)
+
+    assert sorted(index.query(spatial_filter)) == expected
+
+
+def test_grid_index_insert_replaces_point() -> None:
+    index: SpatialGridIndex[str] = SpatialGridIndex(1)
+    index.insert("melding", (0.5, 0.5))
+    index.insert("melding", (3.5, 3.5))
+
+    assert len(index) == 1
+    assert "melding" in index
+    assert index.query(BoundingBox(0, 0, 1, 1)) == []
+    assert index.query(BoundingBox(3, 3, 4, 4)) == ["melding"]
+
+
+def test_grid_index_remove_and_clear() -> None:
+    index: SpatialGridIndex[int] = SpatialGridIndex(1)
+    index.insert(1, (0.5, 0.5))
+    index.insert(2, (0.6, 0.6))
+
+    index.remove(1)
+    index.remove(3)
+
+    assert index.query(BoundingBox(0, 0, 1, 1)) == [2]
+
+    index.clear()
+
+    assert len(index) == 0
+    assert index.query(BoundingBox(0, 0, 1, 1)) == []
@@ -1,20 +1,27 @@
 from datetime import datetime, timedelta
 from typing import override
-from unittest.mock import Mock
+from unittest.mock import AsyncMock, Mock, call
 
 import pytest
 
 from meldingen_core.exceptions import NotFoundException
+from meldingen_core.filters import MeldingListFilters
 from meldingen_core.models import Melding
+from meldingen_core.pagination import Cursor
 from meldingen_core.repositories import BaseMeldingRepository
 from meldingen_core.statemachine import MeldingStates
 from meldingen_core.token import (
     BaseTokenInvalidator,
     InvalidStateException,
     InvalidTokenException,
+    TokenDigester,
     TokenExpiredException,
     TokenVerifier,
+    VerifiedMeldingCache,
+    VerifiedMeldingCacheRepository,
 )
+from tests.test_cache import FakeClock
+from tests.test_repositories import InMemoryMeldingRepository
 
 
 @pytest.mark.anyio
@@ -98,3 +105,352 @@ async def test_invalidate_token_invalid_state() -> None:
 
     with pytest.raises(InvalidStateException):
         await invalidate_token(repo_melding)
+
+
+@pytest.mark.anyio
+async def test_token_verifier_reuses_cached_melding() -> None:
+    token = "123456"
+    repo_melding = Melding("text", token=token, token_expires=datetime.now() + timedelta(days=1))
+    repository = AsyncMock(BaseMeldingRepository)
+    repository.retrieve.return_value = repo_melding
+
+    verify_token: TokenVerifier[Melding] = TokenVerifier(repository, VerifiedMeldingCache())
+
+    assert await verify_token(123, token) is repo_melding
+    assert await verify_token(123, token) is repo_melding
+    repository.retrieve.assert_awaited_once_with(123, None)
+
+
+@pytest.mark.anyio
+async def test_token_verifier_only_reuses_cached_melding_with_requested_relationships() -> None:
+    token = "123456"
+    without_assets = Melding("text", token=token)
+    with_assets = Melding("text", token=token)
+    repository = AsyncMock(BaseMeldingRepository)
+    repository.retrieve.side_effect = [without_assets, with_assets]
+
+    verify_token: TokenVerifier[Melding] = TokenVerifier(repository, VerifiedMeldingCache())
+
+    assert await verify_token(123, token) is without_assets
+    assert await verify_token(123, token, ("assets",)) is with_assets
+    assert await verify_token(123, token, ("assets",)) is with_assets
+    assert await verify_token(123, token) is with_assets
+    assert repository.retrieve.await_args_list == [call(123, None), call(123, ("assets",))]
+
+
+@pytest.mark.anyio
+async def test_token_verifier_passes_include_to_repository() -> None:
+    repository = AsyncMock(BaseMeldingRepository)
+    repository.retrieve.return_value = Melding("text", token="123456")
+
+    verify_token: TokenVerifier[Melding] = TokenVerifier(repository)
+
+    await verify_token(123, "123456", ("assets", "classification.asset_type"))
+
+    repository.retrieve.assert_awaited_once_with(123, ("assets", "classification.asset_type"))
+
+
+@pytest.mark.anyio
+async def test_token_verifier_does_not_cache_invalid_token() -> None:
+    repository = AsyncMock(BaseMeldingRepository)
+    repository.retrieve.return_value = Melding("text", token="54321")
+
+    verify_token: TokenVerifier[Melding] = TokenVerifier(repository, VerifiedMeldingCache())
+
+    for _ in range(2):
+        with pytest.raises(InvalidTokenException):
+            await verify_token(123, "12345")
+
+    assert repository.retrieve.await_count == 2
+
+
+@pytest.mark.anyio
+async def test_token_verifier_checks_expiry_of_cached_melding() -> None:
+    token = "123456"
+    repo_melding = Melding("text", token=token, token_expires=datetime.now() + timedelta(days=1))
+    repository = AsyncMock(BaseMeldingRepository)
+    repository.retrieve.return_value = repo_melding
+
+    verify_token: TokenVerifier[Melding] = TokenVerifier(repository, VerifiedMeldingCache())
+    await verify_token(123, token)
+
+    repo_melding.token_expires = datetime.now() - timedelta(seconds=1)
+
+    with pytest.raises(TokenExpiredException):
+        await verify_token(123, token)
+    repository.retrieve.assert_awaited_once()
+
+
+@pytest.mark.anyio
+async def test_token_verifier_cache_expires() -> None:
+    token = "123456"
+    repository = AsyncMock(BaseMeldingRepository)
+    repository.retrieve.return_value = Melding("text", token=token)
+    clock = FakeClock()
+
+    verify_token: TokenVerifier[Melding] = TokenVerifier(repository, VerifiedMeldingCache(ttl=5, clock=clock))
+    await verify_token(123, token)
+    clock.now = 4
+    await verify_token(123, token)
+    clock.now = 5
+    await verify_token(123, token)
+
+    assert repository.retrieve.await_count == 2
+
+
+@pytest.mark.anyio
+async def test_token_verifier_invalidate() -> None:
+    token = "123456"
+    repository = AsyncMock(BaseMeldingRepository)
+    repository.retrieve.return_value = Melding("text", token=token)
+
+    verify_token: TokenVerifier[Melding] = TokenVerifier(repository, VerifiedMeldingCache())
+    await verify_token(123, token)
+    verify_token.invalidate(123)
+    await verify_token(123, token)
+
+    assert repository.retrieve.await_count == 2
+
+
+def test_token_verifier_invalidate_without_cache() -> None:
+    verify_token: TokenVerifier[Melding] = TokenVerifier(Mock(BaseMeldingRepository))
+
+    verify_token.invalidate(123)
+
+
+def test_verified_melding_cache_requires_same_token() -> None:
+    melding = Melding("text", token="123456")
+    cache: VerifiedMeldingCache[Melding] = VerifiedMeldingCache()
+    cache.set(123, "123456", melding)
+
+    assert cache.get(123, "123456") is melding
+    assert cache.get(123, "654321") is None
+    assert cache.get(456, "123456") is None
+
+
+@pytest.mark.anyio
+async def test_token_verifier_rejects_cached_melding_with_changed_token() -> None:
+    token = "123456"
+    repo_melding = Melding("text", token=token)
+    repository = AsyncMock(BaseMeldingRepository)
+    repository.retrieve.return_value = repo_melding
+
+    verify_token: TokenVerifier[Melding] = TokenVerifier(repository, VerifiedMeldingCache())
+    await verify_token(123, token)
+
+    repo_melding.token = None
+
+    with pytest.raises(InvalidTokenException):
+        await verify_token(123, token)
+
+
+@pytest.mark.anyio
+async def test_invalidate_token_invalidates_verified_melding_cache() -> None:
+    class TokenInvalidator(BaseTokenInvalidator[Melding]):
+
+        @property
+        def allowed_states(self) -> list[str]:
+            return [MeldingStates.SUBMITTED]
+
+    melding = Melding("text", token="123456", state=MeldingStates.SUBMITTED)
+    other = Melding("text", token="654321", state=MeldingStates.SUBMITTED)
+    cache: VerifiedMeldingCache[Melding] = VerifiedMeldingCache()
+    # The cached instance is not the instance the token is invalidated on, the melding is found by its primary key
+    cache.set(123, "123456", Melding("text", token="123456", state=MeldingStates.SUBMITTED))
+    cache.set(456, "654321", other)
+    repository = InMemoryMeldingRepository({123: melding, 456: other})
+
+    await TokenInvalidator(TokenVerifier(repository, cache))(melding)
+
+    assert cache.get(123, "123456") is None
+    assert cache.get(456, "654321") is other
+
+
+def test_token_verifier_invalidate_melding_without_cache() -> None:
+    melding = Melding("text")
+    verify_token: TokenVerifier[Melding] = TokenVerifier(InMemoryMeldingRepository({123: melding}))
+
+    verify_token.invalidate_melding(melding)
+
+
+def test_token_digester() -> None:
+    digest = TokenDigester()
+
+    assert digest("123456") == "8d969eef6ecad3c29a3a629280e686cf0c3f5d5a86aff3ca12020c923adc6c92"
+    assert TokenDigester(b"key")("123456") != digest("123456")
+    assert TokenDigester(b"key")("123456") == TokenDigester(b"key")("123456")
+
+
+@pytest.mark.anyio
+async def test_token_verifier_with_digest() -> None:
+    digest = TokenDigester()
+    repo_melding = Melding("text", token_digest=digest("123456"))
+    repository = AsyncMock(BaseMeldingRepository)
+    repository.find_by_id_and_token_digest.return_value = repo_melding
+
+    verify_token: TokenVerifier[Melding] = TokenVerifier(repository, token_digester=digest)
+
+    assert await verify_token(123, "123456") is repo_melding
+    repository.find_by_id_and_token_digest.assert_awaited_once_with(123, digest("123456"), None)
+    repository.retrieve.assert_not_awaited()
+
+
+@pytest.mark.anyio
+async def test_token_verifier_with_digest_raises_invalid_token_when_not_found() -> None:
+    repository = AsyncMock(BaseMeldingRepository)
+    repository.find_by_id_and_token_digest.return_value = None
+    repository.retrieve.return_value = None
+
+    verify_token: TokenVerifier[Melding] = TokenVerifier(repository, token_digester=TokenDigester())
+
+    with pytest.raises(InvalidTokenException):
+        await verify_token(123, "123456")
+
+
+@pytest.mark.anyio
+async def test_token_verifier_with_digest_verifies_plain_token_of_melding_without_digest() -> None:
+    # The melding was created before the token digester was configured
+    melding = Melding("text", token="123456")
+    repository = InMemoryMeldingRepository({123: melding})
+
+    verify_token: TokenVerifier[Melding] = TokenVerifier(repository, token_digester=TokenDigester())
+
+    assert await verify_token(123, "123456") is melding
+    with pytest.raises(InvalidTokenException):
+        await verify_token(123, "654321")
+
+
+@pytest.mark.anyio
+async def test_token_verifier_with_digest_rejects_plain_token_of_melding_with_digest() -> None:
+    digest = TokenDigester()
+    repository = InMemoryMeldingRepository({123: Melding("text", token="123456", token_digest=digest("654321"))})
+
+    verify_token: TokenVerifier[Melding] = TokenVerifier(repository, token_digester=digest)
+
+    with pytest.raises(InvalidTokenException):
+        await verify_token(123, "123456")
+
+
+@pytest.mark.anyio
+async def test_invalidate_token_removes_digest() -> None:
+    class TokenInvalidator(BaseTokenInvalidator[Melding]):
+
+        @property
+        def allowed_states(self) -> list[str]:
+            return [MeldingStates.SUBMITTED]
+
+    melding = Melding("text", token="123456", token_digest="digest", state=MeldingStates.SUBMITTED)
+
+    await TokenInvalidator()(melding)
+
+    assert melding.token_digest is None
+
+
+@pytest.mark.anyio
+async def test_verified_melding_cache_repository_invalidates_on_save() -> None:
+    token = "123456"
+    melding = Melding("text", token=token)
+    other = Melding("text", token=token)
+    cache: VerifiedMeldingCache[Melding] = VerifiedMeldingCache()
+    repository = VerifiedMeldingCacheRepository(InMemoryMeldingRepository({1: melding, 2: other}), cache)
+    cache.set(1, token, melding)
+    cache.set(2, token, other)
+
+    await repository.save(melding)
+
+    assert cache.get(1, token) is None
+    assert cache.get(2, token) is other
+
+
+@pytest.mark.anyio
+async def test_verified_melding_cache_repository_invalidates_when_save_fails() -> None:
+    token = "123456"
+    melding = Melding("text", token=token)
+    wrapped = Mock(BaseMeldingRepository)
+    wrapped.save.side_effect = RuntimeError
+    wrapped.get_pk.return_value = 1
+    cache: VerifiedMeldingCache[Melding] = VerifiedMeldingCache()
+    cache.set(1, token, melding)
+
+    with pytest.raises(RuntimeError):
+        await VerifiedMeldingCacheRepository(wrapped, cache).save(melding)
+
+    assert cache.get(1, token) is None
+
+
+@pytest.mark.anyio
+async def test_verified_melding_cache_repository_invalidates_on_save_many() -> None:
+    token = "123456"
+    first, second, third = Melding("first"), Melding("second"), Melding("third")
+    cache: VerifiedMeldingCache[Melding] = VerifiedMeldingCache()
+    repository = VerifiedMeldingCacheRepository(InMemoryMeldingRepository({1: first, 2: second, 3: third}), cache)
+    for pk, melding in [(1, first), (2, second), (3, third)]:
+        cache.set(pk, token, melding)
+
+    await repository.save_many([first, third])
+
+    assert cache.get(1, token) is None
+    assert cache.get(2, token) is second
+    assert cache.get(3, token) is None
+
+
+@pytest.mark.anyio
+async def test_verified_melding_cache_repository_invalidates_on_delete() -> None:
+    token = "123456"
+    first, second, third = Melding("first"), Melding("second"), Melding("third")
+    cache: VerifiedMeldingCache[Melding] = VerifiedMeldingCache()
+    repository = VerifiedMeldingCacheRepository(InMemoryMeldingRepository({1: first, 2: second, 3: third}), cache)
+    for pk, melding in [(1, first), (2, second), (3, third)]:
+        cache.set(pk, token, melding)
+
+    await repository.delete(1)
+    await repository.delete_many([3])
+
+    assert cache.get(1, token) is None
+    assert cache.get(2, token) is second
+    assert cache.get(3, token) is None
+    assert await repository.retrieve_many([1, 2, 3]) == {2: second}
+
+
+@pytest.mark.anyio
+async def test_verified_melding_cache_repository_passes_reads_to_wrapped_repository() -> None:
+    wrapped = Mock(BaseMeldingRepository)
+    repository: VerifiedMeldingCacheRepository[Melding] = VerifiedMeldingCacheRepository(
+        wrapped, VerifiedMeldingCache()
+    )
+    melding = Melding("text")
+    filters = MeldingListFilters(states=[MeldingStates.SUBMITTED])
+    cursor = Cursor(None, 1, 1)
+
+    assert await repository.retrieve(1, ["labels"]) is wrapped.retrieve.return_value
+    assert await repository.retrieve_many([1], ["labels"]) is wrapped.retrieve_many.return_value
+    assert (
+        await repository.find_by_id_and_token_digest(1, "digest", ["labels"])
+        is wrapped.find_by_id_and_token_digest.return_value
+    )
+    assert repository.get_pk(melding) is wrapped.get_pk.return_value
+    assert repository.get_cursor(melding, "created_at") is wrapped.get_cursor.return_value
+    assert await repository.list(limit=10, cursor=cursor) is wrapped.list.return_value
+    assert await repository.list_meldingen(limit=10, filters=filters) is wrapped.list_meldingen.return_value
+    assert (
+        await repository.list_melding_rows(fields=("text",), filters=filters) is wrapped.list_melding_rows.return_value
+    )
+    assert repository.stream_meldingen(filters=filters, batch_size=10) is wrapped.stream_meldingen.return_value
+    assert await repository.count_meldingen(filters) is wrapped.count_meldingen.return_value
+    assert await repository.facet_meldingen(filters, ["state"]) is wrapped.facet_meldingen.return_value
+
+    wrapped.retrieve.assert_awaited_once_with(1, ["labels"])
+    wrapped.get_cursor.assert_called_once_with(melding, "created_at")
+    wrapped.list_meldingen.assert_awaited_once_with(
+        limit=10,
+        offset=None,
+        sort_attribute_name=None,
+        sort_direction=None,
+        filters=filters,
+        cursor=None,
+        include=None,
+    )
+    wrapped.stream_meldingen.assert_called_once_with(
+        sort_attribute_name=None, sort_direction=None, filters=filters, batch_size=10, include=None
+    )
+    wrapped.facet_meldingen.assert_awaited_once_with(filters, ["state"])
@@ -1,15 +1,35 @@
-from typing import AsyncIterator, Literal, cast
+import asyncio
+import json
+from pathlib import Path
+from typing import AsyncIterator, Literal, Sequence, cast
+from unittest.mock import AsyncMock
 
 import pytest
+from plugfs.filesystem import Filesystem
+from plugfs.local import LocalAdapter
 
 from meldingen_core.models import AssetType, AssetTypeArguments
+from meldingen_core.spatial import BoundingBox
 from meldingen_core.wfs import (
     AssetTypeToWfsProviderConverter,
     BaseWfsProvider,
     BaseWfsProviderFactory,
     BaseWfsProviderValidator,
+    FilesystemWfsResponseCache,
+    InMemoryWfsResponseCache,
     InvalidWfsProviderException,
+    TieredWfsResponseCache,
+    WfsFeature,
+    WfsFetchCancelledException,
+    WfsRequestCoalescer,
+    WfsTileCache,
+    WfsTileGrid,
+    bbox_filter,
+    merge_wfs_features,
+    parse_wfs_features,
+    wfs_cache_key,
 )
+from tests.test_cache import FakeClock
 
 
 class InvalidWfsProvider:
@@ -200,3 +220,518 @@ async def test_validator_passes_for_valid_provider() -> None:
     await validator(
         AssetType("asset_type_name", "tests.test_wfs.ValidWfsProviderFactory", {"base_url": "www.example.com"}, 3)
     )
+
+
+def test_converter_reuses_cached_provider() -> None:
+    converter = AssetTypeToWfsProviderConverter()
+    asset_type = AssetType(
+        "asset_type_name", "tests.test_wfs.ValidWfsProviderFactory", {"base_url": "www.thisisabaseurl.com"}, 3
+    )
+
+    provider = converter(asset_type)
+
+    assert converter(asset_type) is provider
+
+
+def test_converter_cache_key_ignores_argument_order() -> None:
+    converter = AssetTypeToWfsProviderConverter()
+
+    provider = converter(
+        AssetType(
+            "asset_type_name",
+            "tests.test_wfs.ValidWfsProviderFactory",
+            {"base_url": "www.thisisabaseurl.com", "options": {"a": [1, 2], "b": {3}}},
+            3,
+        )
+    )
+    other = converter(
+        AssetType(
+            "other_name",
+            "tests.test_wfs.ValidWfsProviderFactory",
+            {"options": {"b": {3}, "a": [1, 2]}, "base_url": "www.thisisabaseurl.com"},
+            3,
+        )
+    )
+
+    assert other is provider
+
+
+def test_converter_creates_new_provider_for_different_arguments() -> None:
+    converter = AssetTypeToWfsProviderConverter()
+
+    provider = converter(
+        AssetType("asset_type_name", "tests.test_wfs.ValidWfsProviderFactory", {"base_url": "www.example.com"}, 3)
+    )
+    other = converter(
+        AssetType("asset_type_name", "tests.test_wfs.ValidWfsProviderFactory", {"base_url": "www.example.org"}, 3)
+    )
+
+    assert other is not provider
+
+
+def test_converter_evicts_least_recently_used_provider() -> None:
+    converter = AssetTypeToWfsProviderConverter(max_size=2)
+    first = AssetType("first", "tests.test_wfs.ValidWfsProviderFactory", {"base_url": "www.first.com"}, 3)
+    second = AssetType("second", "tests.test_wfs.ValidWfsProviderFactory", {"base_url": "www.second.com"}, 3)
+    third = AssetType("third", "tests.test_wfs.ValidWfsProviderFactory", {"base_url": "www.third.com"}, 3)
+
+    first_provider = converter(first)
+    second_provider = converter(second)
+    converter(first)
+    converter(third)
+
+    assert converter(first) is first_provider
+    assert converter(second) is not second_provider
+
+
+def test_converter_does_not_cache_when_max_size_is_zero() -> None:
+    converter = AssetTypeToWfsProviderConverter(max_size=0)
+    asset_type = AssetType("asset_type_name", "tests.test_wfs.ValidWfsProviderFactory", {"base_url": "www.a.com"}, 3)
+
+    assert converter(asset_type) is not converter(asset_type)
+
+
+def test_converter_invalidate_removes_cached_provider() -> None:
+    converter = AssetTypeToWfsProviderConverter()
+    asset_type = AssetType("asset_type_name", "tests.test_wfs.ValidWfsProviderFactory", {"base_url": "www.a.com"}, 3)
+
+    provider = converter(asset_type)
+    converter.invalidate(asset_type)
+
+    assert converter(asset_type) is not provider
+
+
+def test_converter_clear_removes_all_cached_providers() -> None:
+    converter = AssetTypeToWfsProviderConverter()
+    asset_type = AssetType("asset_type_name", "tests.test_wfs.ValidWfsProviderFactory", {"base_url": "www.a.com"}, 3)
+
+    provider = converter(asset_type)
+    converter.clear()
+
+    assert converter(asset_type) is not provider
+
+
+async def iterate(chunks: Sequence[bytes]) -> AsyncIterator[bytes]:
+    for chunk in chunks:
+        yield chunk
+
+
+async def collect(data: AsyncIterator[bytes] | None) -> list[bytes]:
+    assert data is not None
+    return [chunk async for chunk in data]
+
+
+def create_cache_key(asset_type: AssetType, type_names: str = "test", filter: str | None = None) -> str:
+    return wfs_cache_key(
+        asset_type,
+        type_names,
+        1000,
+        "urn:ogc:def:crs:EPSG::4326",
+        "application/json",
+        "WFS",
+        "2.0.0",
+        "GetFeature",
+        filter,
+    )
+
+
+def test_cache_key_normalizes_parameters() -> None:
+    asset_type = AssetType("name", "tests.test_wfs.ValidWfsProviderFactory", {"base_url": "www.a.com"}, 3)
+
+    assert create_cache_key(asset_type, "a, b", " <Filter/> ") == create_cache_key(asset_type, "a,b", "<Filter/>")
+    assert create_cache_key(asset_type, "a,b") != create_cache_key(asset_type, "b,a")
+    assert create_cache_key(asset_type, filter="<Filter/>") != create_cache_key(asset_type)
+
+
+def test_cache_key_changes_with_asset_type_configuration() -> None:
+    asset_type = AssetType("name", "tests.test_wfs.ValidWfsProviderFactory", {"base_url": "www.a.com"}, 3)
+    other = AssetType("name", "tests.test_wfs.ValidWfsProviderFactory", {"base_url": "www.b.com"}, 3)
+
+    assert create_cache_key(asset_type) != create_cache_key(other)
+
+
+@pytest.mark.anyio
+async def test_in_memory_response_cache_miss() -> None:
+    cache = InMemoryWfsResponseCache()
+
+    assert await cache.get("key") is None
+
+
+@pytest.mark.anyio
+async def test_in_memory_response_cache_tee_stores_response_once_consumed() -> None:
+    cache = InMemoryWfsResponseCache()
+
+    data = cache.tee("key", iterate([b"{", b"}"]), 60)
+
+    assert await cache.get("key") is None
+    assert await collect(data) == [b"{", b"}"]
+    assert await collect(await cache.get("key")) == [b"{", b"}"]
+
+
+@pytest.mark.anyio
+async def test_in_memory_response_cache_does_not_store_partially_consumed_response() -> None:
+    cache = InMemoryWfsResponseCache()
+
+    data = cache.tee("key", iterate([b"{", b"}"]), 60)
+    await anext(data)
+
+    assert await cache.get("key") is None
+
+
+@pytest.mark.anyio
+async def test_in_memory_response_cache_does_not_store_response_larger_than_max_entry_size() -> None:
+    cache = InMemoryWfsResponseCache(max_entry_size=3)
+
+    assert await collect(cache.tee("key", iterate([b"ab", b"cd", b"ef"]), 60)) == [b"ab", b"cd", b"ef"]
+    assert await cache.get("key") is None
+
+
+@pytest.mark.anyio
+async def test_in_memory_response_cache_expires_entries() -> None:
+    clock = FakeClock()
+    cache = InMemoryWfsResponseCache(clock=clock)
+    await cache.set("key", [b"data"], 10)
+
+    clock.now = 10
+
+    assert await cache.get("key") is None
+
+
+@pytest.mark.anyio
+async def test_in_memory_response_cache_evicts_on_size() -> None:
+    cache = InMemoryWfsResponseCache(max_size=6)
+    await cache.set("first", [b"abc"], 60)
+    await cache.set("second", [b"def"], 60)
+    await cache.set("third", [b"ghi"], 60)
+
+    assert await cache.get("first") is None
+    assert await collect(await cache.get("third")) == [b"ghi"]
+
+
+@pytest.mark.anyio
+async def test_filesystem_response_cache(tmp_path: Path) -> None:
+    cache = FilesystemWfsResponseCache(Filesystem(LocalAdapter()), str(tmp_path))
+
+    assert await collect(cache.tee("key", iterate([b"{", b"}"]), 60)) == [b"{", b"}"]
+
+    assert await collect(await cache.get("key")) == [b"{}"]
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+@pytest.mark.anyio
+async def test_filesystem_response_cache_miss(tmp_path: Path) -> None:
+    cache = FilesystemWfsResponseCache(Filesystem(LocalAdapter()), str(tmp_path))
+
+    assert await cache.get("key") is None
+
+
+@pytest.mark.anyio
+async def test_filesystem_response_cache_deletes_replaced_evicted_and_expired_files(tmp_path: Path) -> None:
+    clock = FakeClock()
+    cache = FilesystemWfsResponseCache(Filesystem(LocalAdapter()), str(tmp_path), max_size=6, clock=clock)
+
+    await cache.set("first", [b"abc"], 5)
+    await cache.set("first", [b"def"], 5)
+    assert len(list(tmp_path.iterdir())) == 1
+
+    await cache.set("second", [b"ghi"], 60)
+    await cache.set("third", [b"jkl"], 60)
+    assert await cache.get("first") is None
+    assert len(list(tmp_path.iterdir())) == 2
+
+    clock.now = 100
+    await cache.set("fourth", [b"m"], 60)
+    assert [path.read_bytes() for path in tmp_path.iterdir()] == [b"m"]
+
+
+@pytest.mark.anyio
+async def test_filesystem_response_cache_deletes_expired_file_on_get(tmp_path: Path) -> None:
+    clock = FakeClock()
+    cache = FilesystemWfsResponseCache(Filesystem(LocalAdapter()), str(tmp_path), clock=clock)
+    await cache.set("first", [b"abc"], 5)
+    await cache.set("second", [b"def"], 60)
+
+    clock.now = 10
+
+    assert await cache.get("first") is None
+    assert [path.read_bytes() for path in tmp_path.iterdir()] == [b"def"]
+
+
+@pytest.mark.anyio
+async def test_filesystem_response_cache_get_only_deletes_the_expired_file_it_looks_up(tmp_path: Path) -> None:
+    clock = FakeClock()
+    cache = FilesystemWfsResponseCache(Filesystem(LocalAdapter()), str(tmp_path), clock=clock)
+    await cache.set("first", [b"abc"], 5)
+    await cache.set("second", [b"def"], 60)
+
+    clock.now = 10
+
+    assert await collect(await cache.get("second")) == [b"def"]
+    assert len(list(tmp_path.iterdir())) == 2
+
+
+@pytest.mark.anyio
+async def test_filesystem_response_cache_handles_removed_files(tmp_path: Path) -> None:
+    cache = FilesystemWfsResponseCache(Filesystem(LocalAdapter()), str(tmp_path), max_size=3)
+    await cache.set("first", [b"abc"], 60)
+    for path in tmp_path.iterdir():
+        path.unlink()
+
+    assert await cache.get("first") is None
+
+    await cache.set("first", [b"abc"], 60)
+    for path in tmp_path.iterdir():
+        path.unlink()
+
+    await cache.set("second", [b"def"], 60)
+    assert await collect(await cache.get("second")) == [b"def"]
+
+
+@pytest.mark.anyio
+async def test_tiered_response_cache_returns_first_hit() -> None:
+    first = InMemoryWfsResponseCache()
+    second = InMemoryWfsResponseCache()
+    await second.set("key", [b"second"], 60)
+    cache = TieredWfsResponseCache([first, second])
+
+    assert await collect(await cache.get("key")) == [b"second"]
+
+    await first.set("key", [b"first"], 60)
+
+    assert await collect(await cache.get("key")) == [b"first"]
+
+
+@pytest.mark.anyio
+async def test_tiered_response_cache_promotes_hits_into_faster_tiers() -> None:
+    clock = FakeClock()
+    first = InMemoryWfsResponseCache(clock=clock)
+    second = InMemoryWfsResponseCache()
+    third = InMemoryWfsResponseCache()
+    await third.set("key", [b"third"], 60)
+    cache = TieredWfsResponseCache([first, second, third], promotion_ttl=10)
+
+    assert await collect(await cache.get("key")) == [b"third"]
+
+    assert await collect(await first.get("key")) == [b"third"]
+    assert await collect(await second.get("key")) == [b"third"]
+
+    clock.now = 10
+
+    assert await first.get("key") is None
+
+
+@pytest.mark.anyio
+async def test_tiered_response_cache_stores_in_all_tiers() -> None:
+    first = InMemoryWfsResponseCache()
+    second = InMemoryWfsResponseCache()
+    cache = TieredWfsResponseCache([first, second])
+
+    await collect(cache.tee("key", iterate([b"data"]), 60))
+
+    assert await collect(await first.get("key")) == [b"data"]
+    assert await collect(await second.get("key")) == [b"data"]
+    assert await cache.get("other") is None
+
+
+class ControlledStream:
+    """Upstream stream that only produces the next chunk after it has been released."""
+
+    fetches: int
+    _chunks: asyncio.Queue[bytes | None]
+
+    def __init__(self) -> None:
+        self.fetches = 0
+        self._chunks = asyncio.Queue()
+
+    async def fetch(self) -> AsyncIterator[bytes]:
+        self.fetches += 1
+        return self._iterate()
+
+    async def _iterate(self) -> AsyncIterator[bytes]:
+        while (chunk := await self._chunks.get()) is not None:
+            yield chunk
+
+    def release(self, chunk: bytes | None) -> None:
+        self._chunks.put_nowait(chunk)
+
+
+@pytest.mark.anyio
+async def test_coalescer_shares_single_fetch_between_concurrent_requests() -> None:
+    coalescer = WfsRequestCoalescer()
+    upstream = ControlledStream()
+
+    first = coalescer("key", upstream.fetch)
+    second = coalescer("key", upstream.fetch)
+    results = asyncio.gather(collect(first), collect(second))
+
+    upstream.release(b"{")
+    await asyncio.sleep(0)
+    third = coalescer("key", upstream.fetch)
+    upstream.release(b"}")
+    upstream.release(None)
+
+    assert list(await results) == [[b"{", b"}"], [b"{", b"}"]]
+    assert await collect(third) == [b"{", b"}"]
+    assert upstream.fetches == 1
+    assert len(coalescer) == 0
+
+
+@pytest.mark.anyio
+async def test_coalescer_does_not_share_different_keys() -> None:
+    coalescer = WfsRequestCoalescer()
+
+    first = coalescer("first", lambda: asyncio.sleep(0, iterate([b"first"])))
+    second = coalescer("second", lambda: asyncio.sleep(0, iterate([b"second"])))
+
+    assert await collect(first) == [b"first"]
+    assert await collect(second) == [b"second"]
+
+
+@pytest.mark.anyio
+async def test_coalescer_starts_new_fetch_after_completion() -> None:
+    coalescer = WfsRequestCoalescer()
+    fetch = AsyncMock(side_effect=lambda: iterate([b"data"]))
+
+    assert await collect(coalescer("key", fetch)) == [b"data"]
+    assert await collect(coalescer("key", fetch)) == [b"data"]
+
+    assert fetch.await_count == 2
+
+
+@pytest.mark.anyio
+async def test_coalescer_raises_upstream_error_to_all_requests() -> None:
+    coalescer = WfsRequestCoalescer()
+    fetch = AsyncMock(side_effect=ConnectionError("upstream unavailable"))
+
+    first = coalescer("key", fetch)
+    second = coalescer("key", fetch)
+
+    for data in (first, second):
+        with pytest.raises(ConnectionError):
+            await collect(data)
+
+    fetch.assert_awaited_once()
+
+
+@pytest.mark.anyio
+async def test_coalescer_cancels_fetch_when_all_requests_stop_reading() -> None:
+    coalescer = WfsRequestCoalescer()
+    upstream = ControlledStream()
+
+    first = coalescer("key", upstream.fetch)
+    second = coalescer("key", upstream.fetch)
+    upstream.release(b"{")
+    assert await anext(first) == b"{"
+    assert await anext(second) == b"{"
+
+    await first.aclose()  # type: ignore[attr-defined]
+    assert len(coalescer) == 1
+
+    await second.aclose()  # type: ignore[attr-defined]
+    assert len(coalescer) == 0
+
+    other = coalescer("key", upstream.fetch)
+    upstream.release(b"[]")
+    upstream.release(None)
+    assert await collect(other) == [b"[]"]
+    assert upstream.fetches == 2
+
+
+@pytest.mark.anyio
+async def test_coalescer_raises_when_fetch_is_cancelled() -> None:
+    coalescer = WfsRequestCoalescer()
+    upstream = ControlledStream()
+
+    data = coalescer("key", upstream.fetch)
+    upstream.release(b"{")
+    assert await anext(data) == b"{"
+
+    coalescer._in_flight["key"]._task.cancel()
+
+    with pytest.raises(WfsFetchCancelledException):
+        await anext(data)
+    assert len(coalescer) == 0
+
+
+def test_tile_grid_requires_positive_tile_size() -> None:
+    with pytest.raises(ValueError):
+        WfsTileGrid(0)
+
+
+def test_tile_grid_snaps_bbox_to_tiles() -> None:
+    grid = WfsTileGrid(0.01)
+
+    assert grid.tiles(BoundingBox(52.365, 4.895, 52.375, 4.905)) == [(5236, 489), (5237, 489), (5236, 490), (5237, 490)]
+
+
+def test_tile_grid_does_not_include_tile_after_boundary() -> None:
+    grid = WfsTileGrid(10, origin_x=5, origin_y=5)
+
+    assert grid.tiles(BoundingBox(5, 5, 25, 15)) == [(0, 0), (1, 0)]
+    assert grid.tiles(BoundingBox(7, 7, 7, 7)) == [(0, 0)]
+    assert grid.tiles(BoundingBox(-5, 5, 5, 15)) == [(-1, 0)]
+
+
+def test_tile_grid_bbox() -> None:
+    grid = WfsTileGrid(10, origin_x=5, origin_y=-5)
+
+    assert grid.bbox((1, -1)) == BoundingBox(15, -15, 25, -5)
+
+
+def test_bbox_filter() -> None:
+    assert bbox_filter(BoundingBox(1, 2, 3, 4), "EPSG:28992") == (
+        '<fes:Filter xmlns:fes="http://www.opengis.net/fes/2.0" xmlns:gml="http://www.opengis.net/gml/3.2">'
+        '<fes:BBOX><gml:Envelope srsName="EPSG:28992">'
+        "<gml:lowerCorner>1 2</gml:lowerCorner><gml:upperCorner>3 4</gml:upperCorner>"
+        "</gml:Envelope></fes:BBOX></fes:Filter>"
+    )
+
+
+@pytest.mark.anyio
+async def test_parse_wfs_features() -> None:
+    data = iterate(
+        [b'{"type": "FeatureCollection", "features": [{"id": 1, "type": "Feature"},', b' {"type": "Feature"}]}']
+    )
+
+    assert await parse_wfs_features(data) == [
+        WfsFeature("id:1", b'{"id":1,"type":"Feature"}'),
+        WfsFeature('feature:{"type":"Feature"}', b'{"type":"Feature"}'),
+    ]
+
+
+@pytest.mark.anyio
+async def test_parse_wfs_features_without_features() -> None:
+    assert await parse_wfs_features(iterate([b'{"type": "FeatureCollection"}'])) == []
+
+
+@pytest.mark.anyio
+async def test_merge_wfs_features_removes_duplicates() -> None:
+    first = [WfsFeature("id:1", b'{"id":1}'), WfsFeature("id:2", b'{"id":2}')]
+    second = [WfsFeature("id:2", b'{"id":2}'), WfsFeature("id:3", b'{"id":3}')]
+
+    merged = json.loads(b"".join(await collect(merge_wfs_features([first, second]))))
+
+    assert merged == {"type": "FeatureCollection", "features": [{"id": 1}, {"id": 2}, {"id": 3}]}
+
+
+@pytest.mark.anyio
+async def test_merge_wfs_features_without_features() -> None:
+    merged = json.loads(b"".join(await collect(merge_wfs_features([[], []]))))
+
+    assert merged == {"type": "FeatureCollection", "features": []}
+
+
+def test_tile_cache() -> None:
+    clock = FakeClock()
+    cache = WfsTileCache(clock=clock)
+    features = [WfsFeature("id:1", b'{"id":1}')]
+
+    cache.set("layer", (1, 2), features, 10)
+
+    assert cache.get("layer", (1, 2)) == tuple(features)
+    assert cache.get("layer", (2, 1)) is None
+    assert cache.get("other", (1, 2)) is None
+
+    clock.now = 10
+
+    assert cache.get("layer", (1, 2)) is None